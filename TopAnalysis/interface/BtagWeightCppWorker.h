@@ -0,0 +1,44 @@
+#ifndef TZWi_TopAnalysis_BtagWeightCppWorker_H
+#define TZWi_TopAnalysis_BtagWeightCppWorker_H
+
+#include <string>
+#include <vector>
+#include <TTree.h>
+#include "OutputBranch.h"
+
+class BtagWeightCppWorker {
+public:
+  // jetIndexName: branch of the selected jet indices in the output tree, all jets are used if empty
+  BtagWeightCppWorker(const std::string jetIndexName="");
+  ~BtagWeightCppWorker() = default;
+
+  // Per-jet SF branch (nominal first, then the variations) and the name of the output weight
+  void addSF(const std::string sfName, const std::string outName);
+  void initOutput(TTree* outTree);
+  // The SF leaves are taken from the output tree, which has them from the input or from the SF producer
+  void initReaders(TTree* outTree);
+
+  bool analyze();
+
+  unsigned getNSF() const { return sfNames_.size(); }
+  double get(const unsigned i) const { return out_weights[i]; }
+  double get_BtagWeight() const { return out_weights.empty() ? 1 : out_weights[0]; }
+
+private:
+  const std::string jetIndexName_;
+  std::vector<std::string> sfNames_, outNames_;
+
+  TLeaf* in_jetIndex = nullptr;
+  std::vector<TLeaf*> in_SFs;
+  std::vector<unsigned> jetIdxs_;
+  std::vector<bool> isFloatSF_;
+
+
+private:
+  bool _doCppOutput = false;
+
+  std::vector<double> out_weights;
+
+};
+
+#endif
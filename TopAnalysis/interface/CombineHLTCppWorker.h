@@ -6,10 +6,10 @@
 #include <vector>
 #include <array>
 #include <TTree.h>
+#include <TTreeReader.h>
 #include <TTreeReaderValue.h>
 #include <TTreeReaderArray.h>
 #include <TLorentzVector.h>
-#include <TFormula.h>
 
 class CombineHLTCppWorker {
 public:
@@ -17,23 +17,64 @@ public:
   typedef TTreeReaderValue<unsigned char>* TRUC;
   typedef TTreeReaderValue<unsigned int>* TRUI;
 
+  // formulaExpr is a boolean expression of ||, &&, ! and parentheses over the
+  // trigger indices [0], [1], ... which are in the order of addHLT() calls
   CombineHLTCppWorker(const std::string formulaExpr, const std::string outName="HLT");
   ~CombineHLTCppWorker() = default;
+  // False if the expression of the constructor cannot be parsed
+  bool isValid() const { return valid_; }
 
   void reset();
   void addHLT(TRB flag);
   void addHLT(TRUC flag);
   void addHLT(TRUI flag);
+  void addMissingHLT(); // Trigger path not in the input, always false
+
+  // Switch the formula by the run number, for the input mixing several eras.
+  // Runs outside of all the ranges fall back to the formula of the constructor.
+  // Returns false if the range is invalid or overlapping, or the expression cannot be parsed.
+  bool addRunRange(const unsigned runMin, const unsigned runMax, const std::string formulaExpr);
+  void setRun(TRUI run) { in_run = run; }
+
   bool analyze();
+  void analyzeBatch(TTreeReader* reader, const Long_t* entries, const unsigned n, int* results);
+
+  // Evaluate the expression on the given trigger decisions instead of the readers.
+  // nRead, if given, counts the number of triggers actually looked up.
+  bool evaluate(const unsigned char* values, unsigned* nRead=nullptr) const;
+  unsigned getNInstructions() const { return programs_[0].size(); }
+
+private:
+  // The expression is compiled to a short program on a single boolean register.
+  // Operands of || and && are skipped by the conditional jumps, so a trigger is
+  // read only when the result depends on it.
+  enum class OP : unsigned char { LOAD, NOT, JUMP_IF_TRUE, JUMP_IF_FALSE };
+  struct Instruction { OP op; unsigned arg; };
+  typedef std::vector<Instruction> Program;
+  std::vector<Program> programs_; // [0] is the default one
+  bool valid_;
+
+  bool compile(const std::string& expr, Program& program) const;
+  bool compileOr(const std::string& expr, size_t& pos, Program& program) const;
+  bool compileAnd(const std::string& expr, size_t& pos, Program& program) const;
+  bool compileUnary(const std::string& expr, size_t& pos, Program& program) const;
+  template<typename LOADER> bool run(const Program& program, LOADER load) const;
+
+  // Run ranges sorted by runMin. The interval of the last lookup is cached,
+  // so the binary search is done only when the run leaves it.
+  struct RunRange { unsigned runMin, runMax; size_t program; };
+  std::vector<RunRange> runRanges_;
+  unsigned cachedRunMin_ = 1, cachedRunMax_ = 0;
+  size_t cachedProgram_ = 0;
+  size_t findProgram(const unsigned run);
 
 private:
-  std::map<int, TRB> in_HLTFlags;
-  std::map<int, TRUC> in_HLTFlagsUC;
-  std::map<int, TRUI> in_HLTFlagsUI;
+  enum class TYPE : unsigned char { B, UC, UI, MISSING };
+  struct Reader { TYPE type; void* reader; };
+  std::vector<Reader> in_HLTFlags;
+  TRUI in_run = nullptr;
 
-  int nHLT_;
   const std::string outName_;
-  TFormula formula_;
 
 };
 
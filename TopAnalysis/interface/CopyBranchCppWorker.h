@@ -0,0 +1,74 @@
+#ifndef TZWi_TopAnalysis_CopyBranchCppWorker_H
+#define TZWi_TopAnalysis_CopyBranchCppWorker_H
+
+#include <string>
+#include <vector>
+#include <TTree.h>
+#include "OutputBranch.h"
+#include <TTreeReader.h>
+#include <TTreeReaderValue.h>
+#include <TTreeReaderArray.h>
+
+class CopyBranchCppWorker {
+public:
+  CopyBranchCppWorker() = default;
+  ~CopyBranchCppWorker() = default;
+
+  // Output branches are booked on each output tree, the readers are replaced for every new input file
+  void initOutput(TTree* outTree);
+  void resetReaders();
+
+  // Scalar branches, leafType is the ROOT leaf type code (F, I, i, ...)
+  void addBranch(const std::string name, const char leafType, TTreeReaderValue<Bool_t>* reader) { add<Bool_t>(name, leafType, "", reader, false); }
+  void addBranch(const std::string name, const char leafType, TTreeReaderValue<Float_t>* reader) { add<Float_t>(name, leafType, "", reader, false); }
+  void addBranch(const std::string name, const char leafType, TTreeReaderValue<Double_t>* reader) { add<Double_t>(name, leafType, "", reader, false); }
+  void addBranch(const std::string name, const char leafType, TTreeReaderValue<Int_t>* reader) { add<Int_t>(name, leafType, "", reader, false); }
+  void addBranch(const std::string name, const char leafType, TTreeReaderValue<UInt_t>* reader) { add<UInt_t>(name, leafType, "", reader, false); }
+  void addBranch(const std::string name, const char leafType, TTreeReaderValue<Short_t>* reader) { add<Short_t>(name, leafType, "", reader, false); }
+  void addBranch(const std::string name, const char leafType, TTreeReaderValue<UShort_t>* reader) { add<UShort_t>(name, leafType, "", reader, false); }
+  void addBranch(const std::string name, const char leafType, TTreeReaderValue<Long64_t>* reader) { add<Long64_t>(name, leafType, "", reader, false); }
+  void addBranch(const std::string name, const char leafType, TTreeReaderValue<ULong64_t>* reader) { add<ULong64_t>(name, leafType, "", reader, false); }
+  void addBranch(const std::string name, const char leafType, TTreeReaderValue<Char_t>* reader) { add<Char_t>(name, leafType, "", reader, false); }
+  void addBranch(const std::string name, const char leafType, TTreeReaderValue<UChar_t>* reader) { add<UChar_t>(name, leafType, "", reader, false); }
+
+  // Variable length arrays, the counter branch lenName has to be added before
+  void addArrayBranch(const std::string name, const char leafType, const std::string lenName, TTreeReaderArray<Bool_t>* reader) { add<Bool_t>(name, leafType, lenName, reader, true); }
+  void addArrayBranch(const std::string name, const char leafType, const std::string lenName, TTreeReaderArray<Float_t>* reader) { add<Float_t>(name, leafType, lenName, reader, true); }
+  void addArrayBranch(const std::string name, const char leafType, const std::string lenName, TTreeReaderArray<Double_t>* reader) { add<Double_t>(name, leafType, lenName, reader, true); }
+  void addArrayBranch(const std::string name, const char leafType, const std::string lenName, TTreeReaderArray<Int_t>* reader) { add<Int_t>(name, leafType, lenName, reader, true); }
+  void addArrayBranch(const std::string name, const char leafType, const std::string lenName, TTreeReaderArray<UInt_t>* reader) { add<UInt_t>(name, leafType, lenName, reader, true); }
+  void addArrayBranch(const std::string name, const char leafType, const std::string lenName, TTreeReaderArray<Short_t>* reader) { add<Short_t>(name, leafType, lenName, reader, true); }
+  void addArrayBranch(const std::string name, const char leafType, const std::string lenName, TTreeReaderArray<UShort_t>* reader) { add<UShort_t>(name, leafType, lenName, reader, true); }
+  void addArrayBranch(const std::string name, const char leafType, const std::string lenName, TTreeReaderArray<Long64_t>* reader) { add<Long64_t>(name, leafType, lenName, reader, true); }
+  void addArrayBranch(const std::string name, const char leafType, const std::string lenName, TTreeReaderArray<ULong64_t>* reader) { add<ULong64_t>(name, leafType, lenName, reader, true); }
+  void addArrayBranch(const std::string name, const char leafType, const std::string lenName, TTreeReaderArray<Char_t>* reader) { add<Char_t>(name, leafType, lenName, reader, true); }
+  void addArrayBranch(const std::string name, const char leafType, const std::string lenName, TTreeReaderArray<UChar_t>* reader) { add<UChar_t>(name, leafType, lenName, reader, true); }
+
+  bool analyze();
+
+  unsigned getNBranches() const { return outputs_.size(); }
+  unsigned long getNBytesCopied() const { return nBytesCopied_; }
+
+private:
+  // One output branch with its own buffer. Array buffers grow by need,
+  // and the branch address is updated when the buffer is moved.
+  struct Output {
+    std::string name, leafList;
+    void* reader;
+    void (CopyBranchCppWorker::*copy)(Output& out);
+    std::vector<char> buffer;
+    TBranch* branch;
+  };
+  std::vector<Output> outputs_;
+
+  template<typename T> void add(const std::string name, const char leafType, const std::string lenName, void* reader, const bool isArray);
+  template<typename T> void copyValue(Output& out);
+  template<typename T> void copyArray(Output& out);
+
+private:
+  TTree* outTree_ = nullptr;
+  unsigned long nBytesCopied_ = 0;
+
+};
+
+#endif
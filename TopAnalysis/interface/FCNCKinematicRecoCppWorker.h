@@ -0,0 +1,67 @@
+#ifndef TZWi_TopAnalysis_FCNCKinematicRecoCppWorker_H
+#define TZWi_TopAnalysis_FCNCKinematicRecoCppWorker_H
+
+#include <string>
+#include <vector>
+#include <memory>
+#include <TTree.h>
+#include "FCNCTriLeptonCppWorker.h"
+#include "OutputProfile.h"
+
+class FCNCKinematicRecoCppWorker {
+public:
+  FCNCKinematicRecoCppWorker(const bool doNonPromptLepton=false);
+  ~FCNCKinematicRecoCppWorker() = default;
+
+  // Objects are taken from the lepton selection worker which ran before for the same event.
+  // Its jet/MET variations are reconstructed as well, with the branch name suffix of the variation
+  void setLeptonWorker(const FCNCTriLeptonCppWorker* worker) { leptonWorker_ = worker; }
+  void setOutputProfile(const bool narrowInts, const unsigned floatBits) { profile_.configure(narrowInts, floatBits); }
+  void initOutput(TTree* outTree);
+
+  void resetValues();
+  bool analyze();
+
+  float get_KinTopWb_pt()   const { return out_KinTop.Wb_p4[0]; }
+  float get_KinTopWb_eta()  const { return out_KinTop.Wb_p4[1]; }
+  float get_KinTopWb_phi()  const { return out_KinTop.Wb_p4[2]; }
+  float get_KinTopWb_mass() const { return out_KinTop.Wb_p4[3]; }
+  float get_KinTopZq_pt()   const { return out_KinTop.Zq_p4[0]; }
+  float get_KinTopZq_eta()  const { return out_KinTop.Zq_p4[1]; }
+  float get_KinTopZq_phi()  const { return out_KinTop.Zq_p4[2]; }
+  float get_KinTopZq_mass() const { return out_KinTop.Zq_p4[3]; }
+  unsigned get_KinTop_status() const { return out_KinTop.status; }
+
+private:
+  const bool doNonPromptLepton_;
+  const double wMass_ = 80.4, topMass_ = 172.5; // Fixed W and top masses
+
+  const FCNCTriLeptonCppWorker* leptonWorker_ = nullptr;
+
+  // Reconstructed tops, for the nominal jets and for each jet/MET variation
+  struct KinTopOutput {
+    float Wb_p4[4], Zq_p4[4];
+    unsigned status;
+  };
+  void resetKinTop(KinTopOutput& out);
+  bool isSelected(const FCNCTriLeptonCppWorker& w) const;
+  void reconstruct(const FCNCTriLeptonCppWorker::JetOutput& jets, KinTopOutput& out);
+  void bookKinTop(TTree* outTree, KinTopOutput& out, const std::string suffix);
+
+  // px, py, pz, E from pt, eta, phi, mass
+  void setPxPyPzE(double p[], const double pt, const double eta, const double phi, const double mass) const;
+  // Solve the neutrino pz with the W mass constraint, returns false if there is no real solution
+  bool solveNeutrinoPz(const double lep[], const double metPx, const double metPy, double& posPz, double& negPz) const;
+  // pt, eta, phi, mass of the sum of px, py, pz, E
+  void setPtEtaPhiM(double out[], const double sum[]) const;
+
+private:
+  bool _doCppOutput = false;
+  OutputProfile profile_;
+
+  KinTopOutput out_KinTop;
+  std::vector<std::unique_ptr<KinTopOutput> > out_KinTopVariations;
+
+};
+
+#endif
@@ -0,0 +1,85 @@
+#ifndef TZWi_TopAnalysis_FCNCMVAinputCppWorker_H
+#define TZWi_TopAnalysis_FCNCMVAinputCppWorker_H
+
+#include <string>
+#include <vector>
+#include <memory>
+#include <TTree.h>
+#include <TLorentzVector.h>
+#include "FCNCTriLeptonCppWorker.h"
+#include "OutputProfile.h"
+
+class FCNCMVAinputCppWorker {
+public:
+  enum STATUS {NoCR=0, WZCR=1, TTCR=2};
+  // Index of the float MVA input variables, names are in varNames_ with the same order
+  enum VAR {
+    // Basic input variables
+    WLZL1_dPhi, WLZL1_dR, WLZL2_dPhi, WLZL2_dR, ZL1ZL2_dPhi, ZL1ZL2_dR,
+    Z_mass, W_mass, ZWL_dPhi, ZWL_dR, MET, MET_Phi, TLepton_mass,
+    // Inputs for WZCR
+    J1_DeepJetB, J1_pt, ZL1J1_dPhi, ZL1J1_dR, ZL2J1_dPhi, ZL2J1_dR, WLJ1_dPhi, WLJ1_dR,
+    // Inputs for TTCR
+    bJ_DeepJetB, qJ_DeepJetB, bJ_pt, qJ_pt, bJqJ_dPhi, bJqJ_dR,
+    WLbJ_dPhi, WLbJ_dR, WLqJ_dPhi, WLqJ_dR, ZL1bJ_dPhi, ZL1bJ_dR, ZL1qJ_dPhi, ZL1qJ_dR, ZL2bJ_dPhi, ZL2bJ_dR, ZL2qJ_dPhi, ZL2qJ_dR,
+    nVar
+  };
+
+  FCNCMVAinputCppWorker() = default;
+  ~FCNCMVAinputCppWorker() = default;
+
+  // Objects are taken from the lepton selection worker which ran before for the same event.
+  // Its jet/MET variations are evaluated as well, with the branch name suffix of the variation
+  void setLeptonWorker(const FCNCTriLeptonCppWorker* worker) { leptonWorker_ = worker; }
+  void setOutputProfile(const bool narrowInts, const unsigned floatBits) { profile_.configure(narrowInts, floatBits); }
+  // Corrected input definitions, not the ones of the trained MVA weights: Lepton3 as the second Z lepton,
+  // ZL1ZL2_dR with ZL2, b tag discriminators swapped with the jets, Status=2 for TTCR, all values reset every event
+  void setFixedInputs(const bool fixedInputs) { fixedInputs_ = fixedInputs; }
+  void initOutput(TTree* outTree);
+
+  void resetValues();
+  bool analyze();
+
+  unsigned get_Status() const { return out_MVA.Status; }
+  unsigned get_nGoodJet() const { return out_MVA.nGoodJet; }
+  unsigned get_nbJet() const { return out_MVA.nbJet; }
+  float get(const unsigned i) const { return out_MVA.vars[i]; }
+  const char* getName(const unsigned i) const { return varNames_[i]; }
+
+private:
+  static const char* varNames_[nVar];
+
+  // Objects used in the pairwise dPhi/dR
+  enum OBJ {WL, ZL1, ZL2, J1, bJ, qJ, nObj};
+  struct Pair { OBJ obj1, obj2; VAR dPhi; };
+  static const Pair basicPairs_[], wzcrPairs_[], ttcrPairs_[];
+  static const unsigned nBasicPairs_, nWZCRPairs_, nTTCRPairs_;
+
+  // MVA inputs, for the nominal jets and for each jet/MET variation
+  struct MVAOutput {
+    unsigned Status, nGoodJet, nbJet;
+    float vars[nVar];
+  };
+  void resetMVA(MVAOutput& out);
+  void evaluate(const FCNCTriLeptonCppWorker::JetOutput& jets, MVAOutput& out);
+  void bookMVA(TTree* outTree, MVAOutput& out, const std::string suffix);
+  void setJet(const FCNCTriLeptonCppWorker::JetOutput& jets, const OBJ obj, const unsigned i);
+
+  // dPhi and dR for each pair, the dR is stored right after the dPhi
+  void fillDeltas(float vars[], const Pair pairs[], const unsigned nPairs);
+
+private:
+  const FCNCTriLeptonCppWorker* leptonWorker_ = nullptr;
+  bool fixedInputs_ = false;
+  TLorentzVector objP4_[nObj], constZ_;
+
+private:
+  bool _doCppOutput = false;
+  OutputProfile profile_;
+
+  MVAOutput out_MVA;
+  std::vector<std::unique_ptr<MVAOutput> > out_MVAVariations;
+
+};
+
+#endif
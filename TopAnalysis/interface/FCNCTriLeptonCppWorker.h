@@ -5,9 +5,11 @@
 #include <string>
 #include <vector>
 #include <TTree.h>
+#include <TTreeReader.h>
 #include <TTreeReaderValue.h>
 #include <TTreeReaderArray.h>
 #include <TLorentzVector.h>
+#include "OutputProfile.h"
 
 class FCNCTriLeptonCppWorker {
 //190306 KST 15:49 : just copy frome TTbarDouble~.h, changed class name
@@ -18,6 +20,25 @@ public:
   typedef TTreeReaderArray<float>* TRAF;
   typedef TTreeReaderArray<int>* TRAI;
   typedef TTreeReaderArray<bool>* TRAB;
+  typedef TTreeReaderValue<float>* TRVF;
+
+  static const unsigned maxNGoodJet_ = 100; // Size of the jet output buffers
+
+  // Outputs depending on the jets and MET, for the nominal and for each jet/MET variation.
+  // The variations take the varied jet pt/mass and MET (e.g. from jetmetUncertainties),
+  // the other jet inputs and the selected leptons are shared with the nominal.
+  struct JetOutput {
+    std::string suffix; // Branch name suffix, "" for the nominal and "_jesUp" etc for the variations
+    TRAF in_pt = nullptr, in_mass = nullptr;
+    TRVF in_MET_pt = nullptr, in_MET_phi = nullptr;
+
+    float MET_pt, MET_phi;
+    float W_MT;
+    unsigned nGoodJet, nBjet;
+    float GoodJet_p4[4][maxNGoodJet_];
+    float GoodJet_DeepFlavB[maxNGoodJet_];
+    unsigned GoodJet_index[maxNGoodJet_];
+  };
 
   FCNCTriLeptonCppWorker(const std::string modeName, const bool doNonPromptLepton=false);
   ~FCNCTriLeptonCppWorker() = default;
@@ -28,10 +49,20 @@ public:
                     TRAF relIso, TRAI id, TRAF dEtaSC, TRAF eCorr, TRAI vidBitmap);
   void setJets(TRAF pt, TRAF eta, TRAF phi, TRAF mass,
                TRAI id, TRAF DeepFlavB);
-  void setMET(TTreeReaderValue<float>* pt, TTreeReaderValue<float>* phi);
+  void setMET(TRVF pt, TRVF phi);
+  // Jet/MET variations, to be added before initOutput(). The inputs are set for every new input file
+  unsigned addJetVariation(const std::string name);
+  void setJetVariation(const unsigned k, TRAF pt, TRAF mass, TRVF metPt, TRVF metPhi);
+
+  // Narrow integer types and rounded floats of the output branches, to be set before initOutput()
+  void setOutputProfile(const bool narrowInts, const unsigned floatBits) { profile_.configure(narrowInts, floatBits); }
+  void initOutput(TTree* outTree);
 
   void resetValues();
   bool analyze();
+  void analyzeBatch(TTreeReader* reader, const Long_t* entries, const unsigned n);
+  // Put back the outputs of the k-th entry of the last analyzeBatch() into the output buffers
+  void restoreBatch(const unsigned k);
 
   float get_LeadingMuon_pt() const { return out_LeadingMuon_p4[0]; }
   float get_LeadingMuon_eta() const { return out_LeadingMuon_p4[1]; }
@@ -43,7 +74,7 @@ public:
   float get_LeadingElectron_phi() const { return out_LeadingElectron_p4[2]; }
   float get_LeadingElectron_mass() const { return out_LeadingElectron_p4[3]; }
 
-  float get_LeadingLepton_pt() const { return std::max(out_LeadingMuon_p4[0],out_LeadingElectron_p4[0]); }
+  float get_LeadingLepton_pt() const { return out_LeadingLepton_pt; }
 
   float get_Lepton1_pt()   const { return out_Lepton1_p4[0]; }
   float get_Lepton1_eta()  const { return out_Lepton1_p4[1]; }
@@ -75,27 +106,43 @@ public:
   float get_Z_mass() const { return out_Z_p4[3]; }
   int get_Z_charge() const { return out_Z_charge; }
 
-  float get_MET_pt()  const { return out_MET_pt; }
-  float get_MET_phi() const { return out_MET_phi; }
+  float get_MET_pt()  const { return out_Jets.MET_pt; }
+  float get_MET_phi() const { return out_Jets.MET_phi; }
 
-  float get_W_MT() const { return out_W_MT; }
+  float get_W_MT() const { return out_Jets.W_MT; }
 
   unsigned get_nVetoElectron() const { return out_nVetoElectron; }
   unsigned get_nVetoMuon() const { return out_nVetoMuon; }
-  unsigned get_nVetoLepton() const { return out_nVetoElectron + out_nVetoMuon; }
+  unsigned get_nVetoLepton() const { return out_nVetoLepton; }
   unsigned get_nGoodElectron() const { return out_nGoodElectron; }
   unsigned get_nGoodMuon() const { return out_nGoodMuon; }
-  unsigned get_nGoodLepton() const { return out_nGoodElectron + out_nGoodMuon; }
-  short get_GoodLeptonCode() const { return out_GoodLeptonCode; }
+  unsigned get_nGoodLepton() const { return out_nGoodLepton; }
+  int get_GoodLeptonCode() const { return out_GoodLeptonCode; }
   
-  unsigned get_nGoodJet()   const { return out_nGoodJet; }
-  std::vector<float> get_GoodJet_pt()   const { return out_GoodJet_p4[0]; }
-  std::vector<float> get_GoodJet_eta()  const { return out_GoodJet_p4[1]; }
-  std::vector<float> get_GoodJet_phi()  const { return out_GoodJet_p4[2]; }
-  std::vector<float> get_GoodJet_mass() const { return out_GoodJet_p4[3]; }
-  std::vector<float> get_GoodJet_DeepFlavB() const { return out_GoodJet_DeepFlavB; }
-  std::vector<unsigned short> get_GoodJet_index() const { return out_GoodJet_index; }
-  unsigned get_nBjet() const { return out_nBjet; }
+  unsigned get_nGoodJet()   const { return out_Jets.nGoodJet; }
+  std::vector<float> get_GoodJet_pt()   const { return std::vector<float>(out_Jets.GoodJet_p4[0], out_Jets.GoodJet_p4[0]+out_Jets.nGoodJet); }
+  std::vector<float> get_GoodJet_eta()  const { return std::vector<float>(out_Jets.GoodJet_p4[1], out_Jets.GoodJet_p4[1]+out_Jets.nGoodJet); }
+  std::vector<float> get_GoodJet_phi()  const { return std::vector<float>(out_Jets.GoodJet_p4[2], out_Jets.GoodJet_p4[2]+out_Jets.nGoodJet); }
+  std::vector<float> get_GoodJet_mass() const { return std::vector<float>(out_Jets.GoodJet_p4[3], out_Jets.GoodJet_p4[3]+out_Jets.nGoodJet); }
+  std::vector<float> get_GoodJet_DeepFlavB() const { return std::vector<float>(out_Jets.GoodJet_DeepFlavB, out_Jets.GoodJet_DeepFlavB+out_Jets.nGoodJet); }
+  std::vector<unsigned> get_GoodJet_index() const { return std::vector<unsigned>(out_Jets.GoodJet_index, out_Jets.GoodJet_index+out_Jets.nGoodJet); }
+  unsigned get_nBjet() const { return out_Jets.nBjet; }
+
+  // Direct access to the jet buffers for the other C++ workers, without copying them
+  const float* goodJetP4(const unsigned i) const { return out_Jets.GoodJet_p4[i]; }
+  const float* goodJetDeepFlavB() const { return out_Jets.GoodJet_DeepFlavB; }
+  // Jet outputs of the nominal (k=0) and of the variations (k=1..), in the order of addJetVariation()
+  unsigned nJetOutputs() const { return 1+out_JetVariations.size(); }
+  const JetOutput& jetOutput(const unsigned k) const { return k == 0 ? out_Jets : *out_JetVariations[k-1]; }
+
+  // Per-entry columns of the last analyzeBatch() call, used by the cut flow
+  const std::vector<int>& get_batch_GoodLeptonCode() const { return batch_GoodLeptonCode; }
+  const std::vector<unsigned>& get_batch_nGoodLepton() const { return batch_nGoodLepton; }
+  const std::vector<unsigned>& get_batch_nVetoLepton() const { return batch_nVetoLepton; }
+  const std::vector<float>& get_batch_Z_mass() const { return batch_Z_mass; }
+  const std::vector<unsigned>& get_batch_nGoodJet() const { return batch_nGoodJet; }
+  const std::vector<float>& get_batch_W_MT() const { return batch_W_MT; }
+  const std::vector<unsigned>& get_batch_nBjet() const { return batch_nBjet; }
 
 private:
   const double minMuonPt_ = 20, maxMuonEta_ = 2.4; //Signal & veto reco. cuts are same
@@ -115,16 +162,19 @@ private:
   bool isGoodElectron(const unsigned i) const;
   bool isVetoElectron(const unsigned i) const;
   bool isNPElectron(const unsigned i) const;
-  bool isGoodJet(const unsigned i) const;
+  bool isGoodJet(const unsigned i, const TRAF jetPt) const;
 
 private:
   double computeMT(const TLorentzVector& lepP4, const double met_pt, const double met_phi) const;
+  // Jet selection and W_MT with the jet pt/mass and MET of the given output set
+  void analyzeJets(JetOutput& jets, const TLorentzVector lepP4s[]);
+  void resetJetOutput(JetOutput& jets);
+  void bookJetOutput(TTree* outTree, JetOutput& jets);
   inline TLorentzVector buildP4(const TRAF p4Arr[], const unsigned index) const;
   inline void setOutputP4(float outP4[], const float inP4[]);
   inline void setOutputP4(float outP4[], const TLorentzVector& p4);
 
 private:
-  TTreeReaderValue<float> *in_MET_pt = nullptr, *in_MET_phi = nullptr;
   TRAF in_Muons_p4[4];
   TRAI in_Muons_charge = nullptr;
   TRAF in_Muons_relIso = nullptr; //nanoAOD object : Muon_pfRelIso04_all
@@ -148,6 +198,7 @@ private:
 
 private:
   bool _doCppOutput = false;
+  OutputProfile profile_;
 
   float out_LeadingMuon_p4[4], out_LeadingElectron_p4[4];
   float out_Lepton_p4[4];
@@ -160,21 +211,44 @@ private:
   float out_Z_p4[4];
   int out_Z_charge;
 
-  float out_MET_pt, out_MET_phi;
-
-  float out_W_MT;
-
-  short out_GoodLeptonCode;
-  unsigned short out_GoodLepton;
-  unsigned short out_nGoodElectron;
-  unsigned short out_nGoodMuon;
-  unsigned short out_nVetoLepton;
-  unsigned short out_nVetoElectron;
-  unsigned short out_nVetoMuon;
-  unsigned short out_nGoodJet, out_nBjet;
-  std::vector<float> out_GoodJet_p4[4];
-  std::vector<float> out_GoodJet_DeepFlavB;
-  std::vector<unsigned short> out_GoodJet_index;
+  // Types of the output buffers follow the branch types, they are bound to the output tree by initOutput()
+  int out_GoodLeptonCode;
+  unsigned out_nGoodLepton;
+  unsigned out_nGoodElectron;
+  unsigned out_nGoodMuon;
+  unsigned out_nVetoLepton;
+  unsigned out_nVetoElectron;
+  unsigned out_nVetoMuon;
+  JetOutput out_Jets;
+  std::vector<std::unique_ptr<JetOutput> > out_JetVariations; // Kept by pointer for the fixed branch addresses
+
+private:
+  // Outputs of the entries of the last analyzeBatch(), the selected jets are kept
+  // in the flat arrays batch_Jet_* starting from jetOffset, nominal then the variations
+  struct BatchLeptons {
+    float p4[6][4]; // Lepton1-3, Z, LeadingMuon, LeadingElectron
+    int pdgId[3], Z_charge;
+    float LeadingLepton_pt, TriLepton_mass, TriLepton_pt, TriLepton_WleptonZdPhi, TriLepton_WleptonZdR;
+    unsigned nGoodElectron, nGoodMuon, nVetoElectron, nVetoMuon;
+    unsigned jetOffset;
+  };
+  struct BatchJets {
+    float MET_pt, MET_phi, W_MT;
+    unsigned nGoodJet, nBjet;
+  };
+  void saveBatch(const unsigned k);
+  void saveBatchJets(const JetOutput& jets, BatchJets& out);
+  void restoreBatchJets(JetOutput& jets, const BatchJets& in, unsigned& offset);
+
+  std::vector<BatchLeptons> batch_Leptons;
+  std::vector<BatchJets> batch_Jets; // (1+nVariations) per entry
+  std::vector<float> batch_Jet_p4[4], batch_Jet_DeepFlavB;
+  std::vector<unsigned> batch_Jet_index;
+
+  std::vector<int> batch_GoodLeptonCode;
+  std::vector<unsigned> batch_nGoodLepton, batch_nVetoLepton;
+  std::vector<float> batch_Z_mass, batch_W_MT;
+  std::vector<unsigned> batch_nGoodJet, batch_nBjet;
 
 };
 
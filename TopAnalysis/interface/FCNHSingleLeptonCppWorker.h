@@ -5,6 +5,7 @@
 #include <string>
 #include <vector>
 #include <TTree.h>
+#include "OutputBranch.h"
 #include <TTreeReaderValue.h>
 #include <TTreeReaderArray.h>
 #include <TLorentzVector.h>
@@ -29,6 +30,8 @@ public:
                TRAI id, TRAF DeepCSV);
   void setMET(TTreeReaderValue<float>* pt, TTreeReaderValue<float>* phi);
 
+  void initOutput(TTree* outTree);
+
   void resetValues();
   bool analyze();
 
@@ -45,12 +48,12 @@ public:
 
   unsigned get_nVetoLepton() const { return out_nVetoLepton; }
   unsigned get_nGoodJet()   const { return out_nGoodJet; }
-  std::vector<float> get_GoodJet_pt()   const { return out_GoodJet_p4[0]; }
-  std::vector<float> get_GoodJet_eta()  const { return out_GoodJet_p4[1]; }
-  std::vector<float> get_GoodJet_phi()  const { return out_GoodJet_p4[2]; }
-  std::vector<float> get_GoodJet_mass() const { return out_GoodJet_p4[3]; }
-  std::vector<float> get_GoodJet_DeepCSV() const { return out_GoodJet_DeepCSV; }
-  std::vector<unsigned short> get_GoodJet_index() const { return out_GoodJet_index; }
+  std::vector<float> get_GoodJet_pt()   const { return std::vector<float>(out_GoodJet_p4[0], out_GoodJet_p4[0]+out_nGoodJet); }
+  std::vector<float> get_GoodJet_eta()  const { return std::vector<float>(out_GoodJet_p4[1], out_GoodJet_p4[1]+out_nGoodJet); }
+  std::vector<float> get_GoodJet_phi()  const { return std::vector<float>(out_GoodJet_p4[2], out_GoodJet_p4[2]+out_nGoodJet); }
+  std::vector<float> get_GoodJet_mass() const { return std::vector<float>(out_GoodJet_p4[3], out_GoodJet_p4[3]+out_nGoodJet); }
+  std::vector<float> get_GoodJet_DeepCSV() const { return std::vector<float>(out_GoodJet_DeepCSV, out_GoodJet_DeepCSV+out_nGoodJet); }
+  std::vector<unsigned> get_GoodJet_index() const { return std::vector<unsigned>(out_GoodJet_index, out_GoodJet_index+out_nGoodJet); }
   unsigned get_nBjet()   const { return out_nBjet; }
 
 private:
@@ -61,6 +64,8 @@ private:
   const double maxMuonRelIso_ = 0.15;
   const double maxVetoMuonRelIso_ = 0.25;
 
+  static const unsigned maxNGoodJet_ = 100; // Size of the jet output buffers
+
   bool isGoodMuon(const unsigned i) const;
   bool isVetoMuon(const unsigned i) const;
   bool isGoodElectron(const unsigned i) const;
@@ -103,11 +108,12 @@ private:
 
   float out_W_MT;
 
-  unsigned short out_nVetoLepton;
-  unsigned short out_nGoodJet, out_nBjet;
-  std::vector<float> out_GoodJet_p4[4];
-  std::vector<float> out_GoodJet_DeepCSV;
-  std::vector<unsigned short> out_GoodJet_index;
+  // Types of the output buffers follow the branch types, they are bound to the output tree by initOutput()
+  unsigned out_nVetoLepton;
+  unsigned out_nGoodJet, out_nBjet;
+  float out_GoodJet_p4[4][maxNGoodJet_];
+  float out_GoodJet_DeepCSV[maxNGoodJet_];
+  unsigned out_GoodJet_index[maxNGoodJet_];
 
 };
 
@@ -0,0 +1,36 @@
+#ifndef TZWi_TopAnalysis_ObjectCountCppWorker_H
+#define TZWi_TopAnalysis_ObjectCountCppWorker_H
+
+#include <vector>
+#include <TTree.h>
+#include <TTreeReader.h>
+#include <TTreeReaderValue.h>
+
+// Preselection on the object multiplicities (nMuon, nElectron...), reading only the counter branches.
+// Each cut is a minimum on the sum of its counters, the event passes if all the cuts are satisfied.
+class ObjectCountCppWorker {
+public:
+  typedef TTreeReaderValue<unsigned int>* TRUI;
+
+  ObjectCountCppWorker() = default;
+  ~ObjectCountCppWorker() = default;
+
+  void reset(); // Drop the readers, keeping the cuts
+  void addCut(const unsigned minimum); // Start a new cut, the counters are added by addCount()
+  void addCount(const unsigned cut, TRUI count);
+
+  bool analyze();
+  void analyzeBatch(TTreeReader* reader, const Long_t* entries, const unsigned n, int* results);
+
+  unsigned getNCuts() const { return cuts_.size(); }
+
+private:
+  struct Cut {
+    unsigned minimum;
+    std::vector<TRUI> counts;
+  };
+  std::vector<Cut> cuts_;
+
+};
+
+#endif
@@ -0,0 +1,16 @@
+#ifndef TZWi_TopAnalysis_OutputBranch_H
+#define TZWi_TopAnalysis_OutputBranch_H
+
+#include <string>
+#include <TTree.h>
+
+// Bind a worker buffer to an output branch, leafType is appended to the name (e.g. "/F", "[nGoodJet]/F").
+// Reuse the branch if it is already there (e.g. cloned from the input tree), same as the NanoAODTools OutputBranch
+inline TBranch* bookOutputBranch(TTree* tree, const std::string name, void* address, const std::string leafType) {
+  TBranch* branch = tree->GetBranch(name.c_str());
+  if ( branch ) branch->SetAddress(address);
+  else branch = tree->Branch(name.c_str(), address, (name+leafType).c_str());
+  return branch;
+}
+
+#endif
@@ -0,0 +1,123 @@
+#ifndef TZWi_TopAnalysis_OutputProfile_H
+#define TZWi_TopAnalysis_OutputProfile_H
+
+#include <string>
+#include <vector>
+#include <memory>
+#include <limits>
+#include <algorithm>
+#include <cstring>
+#include <cstdint>
+#include <TTree.h>
+#include "OutputBranch.h"
+
+// Output branches of a worker booked with the output profile (see python/postprocessing/outputProfile.py).
+//
+// With the default profile the branches are bound to the worker buffers as before and pack() does nothing.
+// The compact profile books the integer codes and counters with a narrow type ('B' Char_t, 'b' UChar_t,
+// 'S' Short_t, 's' UShort_t), and can round the floats to floatBits bits of mantissa, which compress better.
+// The values are copied from the worker buffers by pack() at the end of the worker's analyze(),
+// so the worker and the modules after it still see the full values.
+class OutputProfile {
+public:
+  OutputProfile() = default;
+  ~OutputProfile() = default;
+
+  // To be called before booking the outputs of each output file
+  void configure(const bool narrowInts, const unsigned floatBits) {
+    items_.clear();
+    narrowInts_ = narrowInts;
+    floatBits_ = floatBits < 23 ? floatBits : 0;
+  }
+  bool isDefault() const { return !narrowInts_ and floatBits_ == 0; }
+
+  // Scalar if n is null, otherwise an array of up to maxN values counted by the counter branch
+  void book(TTree* tree, const std::string name, float* src,
+            const unsigned* n=nullptr, const unsigned maxN=1, const std::string counter="") {
+    if ( floatBits_ == 0 ) return bookDirect(tree, name, src, leafType(n, counter, 'F'));
+    book(tree, name, src, 'F', 'F', n, maxN, counter);
+  }
+  void book(TTree* tree, const std::string name, int* src, const char narrowType,
+            const unsigned* n=nullptr, const unsigned maxN=1, const std::string counter="") {
+    book(tree, name, src, 'I', narrowType, n, maxN, counter);
+  }
+  void book(TTree* tree, const std::string name, unsigned* src, const char narrowType,
+            const unsigned* n=nullptr, const unsigned maxN=1, const std::string counter="") {
+    book(tree, name, src, 'i', narrowType, n, maxN, counter);
+  }
+
+  // Copy the values of this entry to the narrow buffers, to be called once the worker filled its outputs
+  void pack() {
+    for ( auto& item : items_ ) {
+      const unsigned n = item.n ? std::min(*item.n, item.maxN) : 1;
+      for ( unsigned k=0; k<n; ++k ) {
+        switch ( item.srcType ) {
+          case 'F': packFloat(item, k); break;
+          case 'I': packInt(item, static_cast<const int*>(item.src)[k], k); break;
+          case 'i': packInt(item, static_cast<long long>(static_cast<const unsigned*>(item.src)[k]), k); break;
+        }
+      }
+    }
+  }
+
+private:
+  bool narrowInts_ = false;
+  unsigned floatBits_ = 0;
+
+  struct Item {
+    char srcType, type;
+    const void* src;
+    const unsigned* n;
+    unsigned maxN;
+    std::unique_ptr<char[]> buffer; // Kept by pointer for the fixed branch addresses
+  };
+  std::vector<Item> items_;
+
+  static std::string leafType(const unsigned* n, const std::string counter, const char type) {
+    return (n ? "["+counter+"]/" : "/")+std::string(1, type);
+  }
+  static unsigned typeSize(const char type) {
+    switch ( type ) {
+      case 'B': case 'b': return 1;
+      case 'S': case 's': return 2;
+    }
+    return 4;
+  }
+  void bookDirect(TTree* tree, const std::string name, void* address, const std::string type) {
+    bookOutputBranch(tree, name, address, type);
+  }
+  void book(TTree* tree, const std::string name, void* src, const char srcType, const char narrowType,
+            const unsigned* n, const unsigned maxN, const std::string counter) {
+    const char type = srcType == 'F' ? 'F' : narrowInts_ ? narrowType : srcType;
+    if ( type == srcType and srcType != 'F' ) return bookDirect(tree, name, src, leafType(n, counter, type));
+    // An existing branch keeps its type and the worker buffer
+    if ( tree->GetBranch(name.c_str()) ) return bookDirect(tree, name, src, "");
+
+    const unsigned size = n ? maxN : 1;
+    items_.push_back({srcType, type, src, n, size, std::unique_ptr<char[]>(new char[typeSize(type)*size]())});
+    tree->Branch(name.c_str(), items_.back().buffer.get(), (name+leafType(n, counter, type)).c_str());
+  }
+  void packFloat(Item& item, const unsigned k) {
+    // Round to nearest keeping floatBits_ bits of the mantissa
+    uint32_t u;
+    std::memcpy(&u, static_cast<const float*>(item.src)+k, 4);
+    const unsigned drop = 23-floatBits_;
+    u = (u + (1u << (drop-1))) & ~((1u << drop)-1);
+    std::memcpy(item.buffer.get()+4*k, &u, 4);
+  }
+  template<typename T>
+  static void store(Item& item, const long long value, const unsigned k) {
+    const T v = static_cast<T>(std::max<long long>(std::numeric_limits<T>::min(), std::min<long long>(std::numeric_limits<T>::max(), value)));
+    std::memcpy(item.buffer.get()+sizeof(T)*k, &v, sizeof(T));
+  }
+  void packInt(Item& item, const long long value, const unsigned k) {
+    switch ( item.type ) {
+      case 'B': store<Char_t>(item, value, k); break;
+      case 'b': store<UChar_t>(item, value, k); break;
+      case 'S': store<Short_t>(item, value, k); break;
+      case 's': store<UShort_t>(item, value, k); break;
+    }
+  }
+};
+
+#endif
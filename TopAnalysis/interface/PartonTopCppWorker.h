@@ -32,8 +32,19 @@ public:
   std::vector<short> get_mother() const { return out_mothers; }
 
 private:
-  bool hasSpecificAncestor(const unsigned i, const unsigned ancId) const;
-  int findFirst(const int i) const;
+  // Ancestry of all the particles is resolved once per event, walking up the mother
+  // chain only until a particle already known. Buffers are kept between events.
+  void resolveAncestry(const unsigned nGenPart);
+  int findFirst(const int i) const { return i < 0 ? -1 : firstCopy_[i]; }
+  void addParton(const unsigned i, const int mother);
+
+  enum CATEGORY : char { NONE, TOP, BOSON, QUARK, TAU, LEPTON, NEUTRINO };
+  enum ANCESTOR : char { UNKNOWN, NOT_FROM_BOSON, FROM_BOSON };
+  std::vector<int> firstCopy_;    // First copy of the same particle, for each GenPart
+  std::vector<char> category_;    // CATEGORY of the first copies passing the selection
+  std::vector<char> fromBoson_;   // ANCESTOR, if one of the selected bosons is an ancestor
+  std::vector<int> partonIdx_;    // GenPart index -> index in the output, -1 if not there
+  std::vector<unsigned> chain_;   // Work space for the mother chain
 
 private:
   TTreeReaderValue<unsigned> *in_nGenPart = nullptr;
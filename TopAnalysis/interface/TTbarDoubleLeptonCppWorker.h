@@ -5,6 +5,7 @@
 #include <string>
 #include <vector>
 #include <TTree.h>
+#include "OutputBranch.h"
 #include <TTreeReaderValue.h>
 #include <TTreeReaderArray.h>
 #include <TLorentzVector.h>
@@ -28,6 +29,8 @@ public:
                TRAI id, TRAF CSVv2);
   void setMET(TTreeReaderValue<float>* pt, TTreeReaderValue<float>* phi);
 
+  void initOutput(TTree* outTree);
+
   void resetValues();
   bool analyze();
 
@@ -53,12 +56,12 @@ public:
   float get_MET_phi() const { return out_MET_phi; }
 
   unsigned get_nGoodJet() const { return out_nGoodJet; }
-  std::vector<float> get_GoodJet_pt()   const { return out_GoodJet_p4[0]; }
-  std::vector<float> get_GoodJet_eta()  const { return out_GoodJet_p4[1]; }
-  std::vector<float> get_GoodJet_phi()  const { return out_GoodJet_p4[2]; }
-  std::vector<float> get_GoodJet_mass() const { return out_GoodJet_p4[3]; }
-  std::vector<float> get_GoodJet_CSVv2() const { return out_GoodJet_CSVv2; }
-  std::vector<unsigned> get_GoodJet_index() const { return out_GoodJet_index; }
+  std::vector<float> get_GoodJet_pt()   const { return std::vector<float>(out_GoodJet_p4[0], out_GoodJet_p4[0]+out_nGoodJet); }
+  std::vector<float> get_GoodJet_eta()  const { return std::vector<float>(out_GoodJet_p4[1], out_GoodJet_p4[1]+out_nGoodJet); }
+  std::vector<float> get_GoodJet_phi()  const { return std::vector<float>(out_GoodJet_p4[2], out_GoodJet_p4[2]+out_nGoodJet); }
+  std::vector<float> get_GoodJet_mass() const { return std::vector<float>(out_GoodJet_p4[3], out_GoodJet_p4[3]+out_nGoodJet); }
+  std::vector<float> get_GoodJet_CSVv2() const { return std::vector<float>(out_GoodJet_CSVv2, out_GoodJet_CSVv2+out_nGoodJet); }
+  std::vector<unsigned> get_GoodJet_index() const { return std::vector<unsigned>(out_GoodJet_index, out_GoodJet_index+out_nGoodJet); }
 
   unsigned get_nBjet() const { return out_nBjet; }
 
@@ -69,6 +72,8 @@ private:
   const double minBjetBDiscr_ = 0.8484; // FIXME: give updated number
   const double maxMuonRelIso_ = 0.15;
 
+  static const unsigned maxNGoodJet_ = 100; // Size of the jet output buffers
+
   bool isGoodMuon(const unsigned i) const;
   bool isGoodElectron(const unsigned i) const;
   bool isGoodJet(const unsigned i) const;
@@ -105,10 +110,11 @@ private:
 
   float out_MET_pt, out_MET_phi;
 
-  unsigned short out_nGoodJet, out_nBjet;
-  std::vector<float> out_GoodJet_p4[4];
-  std::vector<float> out_GoodJet_CSVv2;
-  std::vector<unsigned> out_GoodJet_index;
+  // Types of the output buffers follow the branch types, they are bound to the output tree by initOutput()
+  unsigned out_nGoodJet, out_nBjet;
+  float out_GoodJet_p4[4][maxNGoodJet_];
+  float out_GoodJet_CSVv2[maxNGoodJet_];
+  unsigned out_GoodJet_index[maxNGoodJet_];
 
 };
 
@@ -2,8 +2,10 @@ import ROOT
 ROOT.PyConfig.IgnoreCommandLineOptions = True
 
 import os
+from array import array
 from PhysicsTools.NanoAODTools.postprocessing.framework.datamodel import Collection
 from PhysicsTools.NanoAODTools.postprocessing.framework.eventloop import Module
+import TZWi.TopAnalysis.postprocessing.workerLibrary as workerLibrary
 
 class CombineHLT(Module, object):
     def __init__(self, *args, **kwargs):
@@ -13,61 +15,76 @@ class CombineHLT(Module, object):
         self.outName = kwargs.get("outName") if "outName" in kwargs else "HLT"
         self.doFilter = kwargs.get("doFilter") if "doFilter" in kwargs else False
 
-        if "/CombineHLTCppWorker_cc.so" not in  ROOT.gSystem.GetLibraries():
-            print "Load C++ CombineHLT worker module"
-            base = os.getenv("NANOAODTOOLS_BASE")
-            if base:
-                ROOT.gROOT.ProcessLine(".L %s/src/CombineHLTCppWorker.cc+O" % base)
-            else:
-                base = "%s/src/TZWi/TopAnalysis"%os.getenv("CMSSW_BASE")
-                ROOT.gSystem.Load("libPhysicsToolsNanoAODTools.so")
-                ROOT.gSystem.Load("libTZWiTopAnalysis.so")
-                ROOT.gROOT.ProcessLine(".L %s/interface/CombineHLTCppWorker.h" % base)
+        workerLibrary.load("CombineHLTCppWorker")
 
         fName = kwargs.get("fileName")
         setName = kwargs.get("hltSet")
         base = "%s/src/TZWi/TopAnalysis"%os.getenv("CMSSW_BASE")
         d = yaml.load(open(base+"/data/combineHLT/"+fName))
 
-        formula = d[setName].replace('\n', '')
+        self.names = []
+        self.runRanges = []
+        if isinstance(d[setName], list):
+            ## Run-range map for the input mixing several eras, [first run, last run, set name or formula].
+            ## The formula is switched by the run number, events outside of the ranges are rejected
+            self.shortFormula = ""
+            for runMin, runMax, expr in d[setName]:
+                formula = d[expr] if expr in d else expr
+                self.runRanges.append((int(runMin), int(runMax), self.shortenFormula(formula)))
+        else:
+            self.shortFormula = self.shortenFormula(d[setName])
+
+        pass
+    def shortenFormula(self, formula):
+        ## Replace the trigger names to the indices [0], [1]... of self.names, shared by all the formulas
+        formula = formula.replace('\n', '')
         oprs = ["(", ")", "||", "&&", "!"]
         for opr in oprs: formula = formula.replace(opr, " %s " % opr)
         formula = formula.strip()
 
-        self.names = []
-        self.shortFormula = []
+        shortFormula = []
         for tok in formula.split():
             if tok in oprs:
-                self.shortFormula.append(tok)
+                shortFormula.append(tok)
                 continue
 
-            idx = -1
-            if tok in self.names:
-                idx = self.names.index(tok)
-            else:
-                idx = len(self.names)
-                self.names.append(tok)
-            self.shortFormula.append("[%d]" % idx)
-        self.shortFormula = ''.join(self.shortFormula)
-
-        pass
+            if tok not in self.names: self.names.append(tok)
+            shortFormula.append("[%d]" % self.names.index(tok))
+        return ''.join(shortFormula)
     def beginJob(self):
         self.worker = ROOT.CombineHLTCppWorker(str(self.shortFormula), self.outName)
+        if not self.worker.isValid():
+            raise RuntimeError("Cannot compile the trigger expression %s of %s" % (self.shortFormula, self.outName))
+        for runMin, runMax, shortFormula in self.runRanges:
+            if not self.worker.addRunRange(runMin, runMax, str(shortFormula)):
+                raise RuntimeError("Cannot add the run range %d-%d with the trigger expression %s of %s" % (runMin, runMax, shortFormula, self.outName))
         pass
     def endJob(self):
         pass
     def beginFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
         self.out = wrappedOutputTree
+        self.inputTree = inputTree
         self.out.branch(self.outName, "O")
         self.initReaders(inputTree)
         pass
     def endFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
         pass
     def initReaders(self,tree):
-        self.worker.reset();
+        self.worker.reset()
+        ## Branches to be read in the filter phase of the batchEventLoop
+        self.filterBranches = []
         for i, name in enumerate(self.names):
+            if self.runRanges and not tree.GetBranch(name):
+                ## Paths of the other eras can be absent in this file
+                self.worker.addMissingHLT()
+                continue
             setattr(self, "b_"+name, tree.valueReader(name))
             self.worker.addHLT(getattr(self, "b_"+name))
+            self.filterBranches.append(name)
+        if self.runRanges:
+            self.b_run = tree.valueReader("run")
+            self.worker.setRun(self.b_run)
+            self.filterBranches.append("run")
 
         self._ttreereaderversion = tree._ttreereaderversion
 
@@ -82,3 +99,16 @@ class CombineHLT(Module, object):
 
         if self.doFilter: return res
         return True
+    def analyzeBatch(self, entries):
+        """process a block of entries, return the keep mask (see batchEventLoop)"""
+        tree = self.inputTree
+        if tree._ttreereaderversion > self._ttreereaderversion:
+            self.initReaders(tree)
+
+        self.batchResults = array('i', [0])*len(entries)
+        self.worker.analyzeBatch(tree._ttreereader, entries, len(entries), self.batchResults)
+
+        if self.doFilter: return self.batchResults
+        return None
+    def fillBatch(self, event, k):
+        self.out.fillBranch(self.outName, self.batchResults[k])
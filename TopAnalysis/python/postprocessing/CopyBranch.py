@@ -3,14 +3,20 @@ ROOT.PyConfig.IgnoreCommandLineOptions = True
 
 from PhysicsTools.NanoAODTools.postprocessing.framework.datamodel import Collection
 from PhysicsTools.NanoAODTools.postprocessing.framework.eventloop import Module
+import TZWi.TopAnalysis.postprocessing.workerLibrary as workerLibrary
 
-import sys
+import sys, os
 
 class CopyBranch(Module, object):
     def __init__(self, *args, **kwargs):
         self.brNames = []
         self.arrNames = {}
-        if '--friend' not in sys.argv: return ## No need to run this module
+        self.doCppCopy = kwargs.get("doCppCopy") if "doCppCopy" in kwargs else True
+        ## Without --friend the whole input tree is cloned by the framework, with the unchanged branches as they are
+        friend = kwargs.get("friend") if "friend" in kwargs else ('--friend' in sys.argv)
+        if not friend: ## No need to run this module
+            self.doCppCopy = False
+            return
 
         for brName in args[0]:
             if brName[-1] == ']': ## if this is given in an array
@@ -19,30 +25,59 @@ class CopyBranch(Module, object):
                 if brName2 not in self.brNames: self.brNames.append(brName2)
             else:
                 if brName not in self.brNames: self.brNames.append(brName)
+
+        if self.doCppCopy: workerLibrary.load("CopyBranchCppWorker")
         pass
     def beginJob(self):
+        if self.doCppCopy: self.worker = ROOT.CopyBranchCppWorker()
         pass
     def endJob(self):
         pass
     def beginFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
         self.out = wrappedOutputTree
+        self.inputTree = inputTree
         typeNameMap = {'Float_t':'F', 'Double_t':'D', 'Int_t':'I', 'UInt_t':'i', 'Short_t':'S', 'UShort_t':'s',
-                       'Long64_t':'L', 'ULong64_t':'l', 'Char_t':'C', 'UChar_t':'c'}
+                       'Long64_t':'L', 'ULong64_t':'l', 'Char_t':'C', 'UChar_t':'c', 'Bool_t':'O'}
         self.brNames, brNames = [], self.brNames
+        self.brTypes = {}
         for br in [x for x in inputTree.GetListOfBranches() if x.GetName() in brNames]:
             brName = br.GetName()
-            self.out.branch(brName, typeNameMap[br.GetLeaf(brName).GetTypeName()])
+            self.brTypes[brName] = typeNameMap[br.GetLeaf(brName).GetTypeName()]
+            if not self.doCppCopy: self.out.branch(brName, self.brTypes[brName])
             self.brNames.append(brName)
         self.arrNames, arrNames = {}, self.arrNames
         for br in [x for x in inputTree.GetListOfBranches() if x.GetName() in arrNames]:
             brName = br.GetName()
-            self.out.branch(brName, typeNameMap[br.GetLeaf(brName).GetTypeName()], lenVar=arrNames[brName])
+            self.brTypes[brName] = typeNameMap[br.GetLeaf(brName).GetTypeName()]
+            if not self.doCppCopy: self.out.branch(brName, self.brTypes[brName], lenVar=arrNames[brName])
             self.arrNames[brName] = arrNames[brName]
+
+        if self.doCppCopy:
+            self.worker.initOutput(self.out._tree)
+            self.initReaders(inputTree)
         pass
     def endFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
         pass
+    def initReaders(self, tree):
+        ## Scalars first, the array branches need their counters in the output tree
+        self.worker.resetReaders()
+        for brName in self.brNames:
+            setattr(self, "b_"+brName, tree.valueReader(brName))
+            self.worker.addBranch(brName, self.brTypes[brName], getattr(self, "b_"+brName))
+        for brName, lenName in self.arrNames.iteritems():
+            setattr(self, "b_"+brName, tree.arrayReader(brName))
+            self.worker.addArrayBranch(brName, self.brTypes[brName], lenName, getattr(self, "b_"+brName))
+
+        self._ttreereaderversion = tree._ttreereaderversion
+        pass
     def analyze(self, event):
         """process event, return True (go to next module) or False (fail, go to next event)"""
+        if not self.doCppCopy: return self.analyzePython(event)
+
+        if event._tree._ttreereaderversion > self._ttreereaderversion:
+            self.initReaders(event._tree)
+        return self.worker.analyze()
+    def analyzePython(self, event):
         for brName in self.brNames:
             self.out.fillBranch(brName, getattr(event, brName))
         for brName in self.arrNames:
@@ -51,7 +86,10 @@ class CopyBranch(Module, object):
             self.out.fillBranch(brName, vals)
         return True
 
-copyBranch = lambda: CopyBranch(["run", "event", "PV_npvsGood"])
-copyMCBranch = lambda: CopyBranch(["genWeight", "LHEWeight_originalXWGTUP", "LHEPdfWeight[nLHEPdfWeight]",
-                                   "LHEScaleWeight[nLHEScaleWeight]", "PSScaleWeight[nPSScaleWeight]"])
+branches = ["run", "event", "PV_npvsGood"]
+branchesMC = ["genWeight", "LHEWeight_originalXWGTUP", "LHEPdfWeight[nLHEPdfWeight]",
+              "LHEScaleWeight[nLHEScaleWeight]", "PSScaleWeight[nPSScaleWeight]"]
+
+copyBranch = lambda: CopyBranch(branches)
+copyMCBranch = lambda: CopyBranch(branchesMC)
 
@@ -0,0 +1,64 @@
+import ROOT
+ROOT.PyConfig.IgnoreCommandLineOptions = True
+
+import os
+from array import array
+from PhysicsTools.NanoAODTools.postprocessing.framework.eventloop import Module
+import TZWi.TopAnalysis.postprocessing.workerLibrary as workerLibrary
+
+class ObjectCountFilter(Module, object):
+    def __init__(self, *args, **kwargs):
+        #super(ObjectCountFilter, self).__init__(*args, **kwargs)
+        ## List of (counter branches, minimum of their sum), e.g. [(["nMuon", "nElectron"], 3)]
+        self.cuts = kwargs.get("cuts") if "cuts" in kwargs else []
+
+        workerLibrary.load("ObjectCountCppWorker")
+
+        ## Branches to be read in the filter phase of the batchEventLoop
+        self.filterBranches = []
+        for names, minimum in self.cuts:
+            self.filterBranches.extend(n for n in names if n not in self.filterBranches)
+        pass
+    def beginJob(self):
+        self.worker = ROOT.ObjectCountCppWorker()
+        for names, minimum in self.cuts:
+            self.worker.addCut(minimum)
+        pass
+    def endJob(self):
+        pass
+    def beginFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
+        self.inputTree = inputTree
+        self.initReaders(inputTree)
+        pass
+    def endFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
+        pass
+    def initReaders(self,tree):
+        self.worker.reset()
+        for i, (names, minimum) in enumerate(self.cuts):
+            for name in names:
+                setattr(self, "b_"+name, tree.valueReader(name))
+                self.worker.addCount(i, getattr(self, "b_"+name))
+
+        self._ttreereaderversion = tree._ttreereaderversion
+
+        pass
+    def analyze(self, event):
+        """process event, return True (go to next module) or False (fail, go to next event)"""
+        if event._tree._ttreereaderversion > self._ttreereaderversion:
+            self.initReaders(event._tree)
+
+        return self.worker.analyze()
+    def analyzeBatch(self, entries):
+        """process a block of entries, return the keep mask (see batchEventLoop)"""
+        tree = self.inputTree
+        if tree._ttreereaderversion > self._ttreereaderversion:
+            self.initReaders(tree)
+
+        self.batchResults = array('i', [0])*len(entries)
+        self.worker.analyzeBatch(tree._ttreereader, entries, len(entries), self.batchResults)
+
+        return self.batchResults
+
+## Necessary condition of the GoodLeptonCode=111 in the FCNCTriLeptonCutFlow, three leptons
+## are taken from the Muon and Electron collections including the non-prompt one of the NPL modes
+presel_TriLepton = lambda : ObjectCountFilter(cuts=[(["nMuon", "nElectron"], 3)])
@@ -0,0 +1,19 @@
+## Read-only view of the outputs of a C++ worker, by the name of the output branch.
+##
+## The selection workers fill their output branches in C++ (see initOutput()),
+## so nothing is copied to python per event. The modules running after them
+## read only what they need through this view, which is put at event._tree.b_out
+##   event._tree.b_out.nGoodJet -> worker.get_nGoodJet()
+## The getters are looked up once and cached, the values are read at each access.
+
+class WorkerOutput(object):
+    def __init__(self, worker):
+        self._worker = worker
+        self._getters = {}
+    def __getattr__(self, name):
+        if name.startswith('_'): raise AttributeError(name)
+        getter = self._getters.get(name)
+        if getter is None:
+            getter = getattr(self._worker, 'get_%s' % name)
+            self._getters[name] = getter
+        return getter()
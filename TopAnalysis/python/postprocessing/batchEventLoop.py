@@ -0,0 +1,213 @@
+import ROOT
+ROOT.PyConfig.IgnoreCommandLineOptions = True
+
+import sys, time
+from array import array
+from bisect import bisect_left
+from PhysicsTools.NanoAODTools.postprocessing.framework.datamodel import Event
+from PhysicsTools.NanoAODTools.postprocessing.framework.treeReaderArrayTools import clearExtraBranches
+from TZWi.TopAnalysis.postprocessing.outputProfile import tuneBaskets
+
+## Batched event loop, a drop-in replacement of the NanoAODTools eventLoop.
+##
+## A module can optionally implement the batch protocol:
+##   analyzeBatch(self, entries)
+##     entries is an array('l') of the entry numbers still alive in this block.
+##     Process all of them at once and return the keep mask, a sequence of
+##     booleans aligned with entries. Returning None means "keep all".
+##   fillBatch(self, event, k)
+##     Called for every entry which survived the whole chain, in the entry order,
+##     with k being the position of the entry in the array given to analyzeBatch.
+##     Fill the output branches of this entry here. A module keeping its outputs
+##     in the buffers bound to the output tree has to keep them for every entry
+##     of the batch and put back the ones of the entry k, not redo the entry.
+##
+## The leading modules of the chain implementing analyzeBatch run block by block,
+## the first module without it and all the following ones run in the usual
+## per-event way on the surviving entries only.
+##
+## Predicate pushdown: the leading batch modules which declare the input branches
+## they need in the attribute filterBranches (flags, HLT, object counts) form the
+## filter phase. They run over the whole block first, and the other branches are
+## read only for the entries passing them since the readers are loaded lazily.
+## The TTreeCache holds the filter branches only, so the baskets of the other
+## branches without any entry passing the filter phase are not read at all,
+## their fraction is reported at the end of each file.
+##
+## Modules without analyzeBatch which only accumulate over all the entries (e.g. the
+## histograms of countHistogramsModule, put first in the MC chain) would end the leading
+## batch modules right away. The known ones are run by PerEntryBatch entry by entry on
+## every entry of the block, as filter modules reading the branches listed below.
+##
+## perf enables the instrumentation of the modules (see instrumentation.py),
+## e.g. perf="json,hist" for the JSON sidecar and the histograms in the output file.
+## The basket sizes of the output follow the output profile (see outputProfile.py).
+
+## Class name of the module, input branches it reads
+perEntryBatchModules = {'countHistogramsProducer':['genWeight']}
+
+class PerEntryBatch(object):
+    ## Batch adapter calling analyze() of the module for each entry, everything else is taken from the module
+    def __init__(self, module, branches):
+        object.__setattr__(self, '_module', module)
+        self.filterBranches = branches
+    def __getattr__(self, name):
+        if name == '_module': raise AttributeError(name)
+        return getattr(self._module, name)
+    def beginFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
+        self.inputTree = inputTree
+        return self._module.beginFile(inputFile, outputFile, inputTree, wrappedOutputTree)
+    def analyzeBatch(self, entries):
+        keep = [bool(self._module.analyze(Event(self.inputTree, i))) for i in entries]
+        return None if all(keep) else keep
+
+def wrapPerEntryModules(modules):
+    return [PerEntryBatch(m, perEntryBatchModules[m.__class__.__name__])
+            if not hasattr(m, 'analyzeBatch') and m.__class__.__name__ in perEntryBatchModules else m
+            for m in modules]
+
+def splitBatchModules(modules):
+    nBatch = 0
+    for m in modules:
+        if not hasattr(m, 'analyzeBatch'): break
+        nBatch += 1
+    return modules[:nBatch], modules[nBatch:]
+
+def splitFilterModules(batchModules):
+    nFilter = 0
+    for m in batchModules:
+        if not hasattr(m, 'filterBranches'): break
+        nFilter += 1
+    return batchModules[:nFilter], batchModules[nFilter:]
+
+def runBatchModules(modules, alive, calls):
+    for m in modules:
+        if len(alive) == 0: break
+        mask = m.analyzeBatch(alive)
+        calls.append((m, alive))
+        if mask is None: continue
+        alive = array('l', [e for e, keep in zip(alive, mask) if keep])
+    return alive
+
+def countSkippedBaskets(tree, filterBranches, entries, passed):
+    ## Count the baskets of the active non-filter branches overlapping with the processed entries,
+    ## and the ones without any entry passing the filter phase. Both lists are in the entry order
+    nTotal, nSkipped = 0, 0
+    for branch in tree.GetListOfBranches():
+        name = branch.GetName()
+        if name in filterBranches or not tree.GetBranchStatus(name): continue
+        nBaskets = branch.GetWriteBasket()
+        basketEntry = branch.GetBasketEntry()
+        for i in range(nBaskets):
+            begin = basketEntry[i]
+            end = basketEntry[i+1] if i+1 < nBaskets else branch.GetEntries()
+            k = bisect_left(entries, begin)
+            if k == len(entries) or entries[k] >= end: continue
+            nTotal += 1
+            k = bisect_left(passed, begin)
+            if k == len(passed) or passed[k] >= end: nSkipped += 1
+    return nSkipped, nTotal
+
+def initFilterPhase(inputTree, filterModules):
+    ## filterBranches can depend on the input file (e.g. the trigger paths in this file),
+    ## so this is done after beginFile
+    filterBranches = set()
+    for m in filterModules: filterBranches.update(m.filterBranches)
+    if len(filterModules) > 0 and inputTree.GetCacheSize() > 0:
+        ## Only the filter branches go to the cache, a cache with all the branches would prefetch
+        ## the baskets of the other branches without any entry passing the filter phase as well.
+        ## The survivors read the other branches basket by basket through their readers
+        inputTree.DropBranchFromCache("*", True)
+        for name in sorted(filterBranches):
+            if inputTree.GetBranch(name): inputTree.AddBranchToCache(name, True)
+        inputTree.StopCacheLearningPhase()
+    return filterBranches
+
+def reportFilterPhase(out, inputTree, filterModules, filterBranches, eventRange, filterPassed):
+    if len(eventRange) == 0: return
+    nSkipped, nBaskets = countSkippedBaskets(inputTree, filterBranches, sorted(eventRange), sorted(filterPassed))
+    out.write("Filter phase (%d modules on %d branches): %d/%d entries passed (%5.2f%%), skipped %d/%d baskets of the other branches (%5.2f%%)\n" % (
+        len(filterModules), len(filterBranches), len(filterPassed), len(eventRange), len(filterPassed) / (0.01 * len(eventRange)),
+        nSkipped, nBaskets, nSkipped / (0.01 * max(nBaskets, 1))))
+
+def batchEventLoop(modules, inputFile, outputFile, inputTree, wrappedOutputTree,
+                   maxEvents=-1, eventRange=None, progress=(10000, sys.stdout),
+                   filterOutput=True, firstEntry=0, batchSize=1000, perf=None):
+    modules = wrapPerEntryModules(modules)
+    stats = None
+    if perf:
+        from TZWi.TopAnalysis.postprocessing.instrumentation import PerfStats
+        stats = PerfStats(perf)
+        stats.begin(inputFile)
+        modules = stats.instrument(modules)
+    batchModules, eventModules = splitBatchModules(modules)
+    if batchSize <= 0: batchModules, eventModules = [], modules
+
+    for m in modules:
+        m.beginFile(inputFile, outputFile, inputTree, wrappedOutputTree)
+    filterModules, otherBatchModules = splitFilterModules(batchModules)
+    filterBranches = initFilterPhase(inputTree, filterModules)
+
+    if eventRange is None: eventRange = xrange(firstEntry, inputTree.entries)
+    eventRange = list(eventRange)
+    if maxEvents > 0: eventRange = eventRange[:maxEvents]
+    entries = len(eventRange)
+    if wrappedOutputTree != None: tuneBaskets(wrappedOutputTree._tree, entries)
+
+    t0 = time.time()
+    tlast, nlast = t0, 0
+    doneEvents, acceptedEvents = 0, 0
+    filterPassed = array('l')
+    for first in range(0, entries, max(batchSize, 1)):
+        block = eventRange[first:first+max(batchSize, 1)]
+
+        ## Batch phase: run the leading batch-capable modules over the whole block
+        alive = array('l', block)
+        calls = []
+        inputTree._ttreereader._isClean = False
+        alive = runBatchModules(filterModules, alive, calls)
+        filterPassed.extend(alive)
+        alive = runBatchModules(otherBatchModules, alive, calls)
+        ## The readers were moved behind the back of the python layer, let it know where they are
+        ## so that the readers made later and gotoEntry of the first survivor start from the right entry
+        inputTree.entry = inputTree._ttreereader.GetCurrentEntry()
+
+        ## Per-event phase for the survivors
+        doneEvents += len(block)
+        survivors = alive if len(batchModules) > 0 else block
+        positions = [dict((e, k) for k, e in enumerate(entries_)) for m, entries_ in calls]
+        for i in survivors:
+            if stats: tEvent = time.time()
+            e = Event(inputTree, i)
+            clearExtraBranches(inputTree)
+            for (m, entries_), pos in zip(calls, positions):
+                if hasattr(m, 'fillBatch'): m.fillBatch(e, pos[i])
+            ret = True
+            for m in eventModules:
+                ret = m.analyze(e)
+                if not ret: break
+            if ret: acceptedEvents += 1
+            if (ret or not filterOutput) and wrappedOutputTree != None:
+                wrappedOutputTree.fill()
+            if stats: stats.fillLatency(time.time()-tEvent)
+
+        if progress and doneEvents - nlast >= progress[0]:
+            t1 = time.time()
+            progress[1].write("Processed %8d/%8d entries, %5.2f%% (elapsed time %7.1fs, curr speed %8.3f kHz, avg speed %8.3f kHz), accepted %8d/%8d events (%5.2f%%)\n" % (
+                doneEvents, entries, doneEvents / (0.01 * entries),
+                t1 - t0, (doneEvents - nlast) / (1000. * (t1 - tlast)), doneEvents / (1000. * (t1 - t0)),
+                acceptedEvents, doneEvents, acceptedEvents / (0.01 * doneEvents)))
+            tlast, nlast = t1, doneEvents
+
+    for m in modules:
+        m.endFile(inputFile, outputFile, inputTree, wrappedOutputTree)
+
+    tTot = time.time() - t0
+    if progress and tTot > 0:
+        progress[1].write("Batched event loop (batch size %d, %d batch / %d per-event modules): %d entries in %.1fs, %.1f events/s\n" % (
+            batchSize, len(batchModules), len(eventModules), doneEvents, tTot, doneEvents/tTot))
+    if progress and len(filterModules) > 0:
+        reportFilterPhase(progress[1], inputTree, filterModules, filterBranches, eventRange, filterPassed)
+    if stats:
+        stats.write(inputFile, outputFile, inputTree, doneEvents, tTot, filterBranches, eventRange, filterPassed)
+    return (doneEvents, acceptedEvents, tTot)
@@ -6,26 +6,33 @@ import os
 from ROOT import TLorentzVector
 from PhysicsTools.NanoAODTools.postprocessing.framework.datamodel import Collection
 from PhysicsTools.NanoAODTools.postprocessing.framework.eventloop import Module
+import TZWi.TopAnalysis.postprocessing.workerLibrary as workerLibrary
+import TZWi.TopAnalysis.postprocessing.outputProfile as outputProfile
 
 class FCNCKinematicReco(Module, object):
     def __init__(self, *args, **kwargs):
         self.mode = kwargs.get("mode")
+        ## Run the python version as well and compare the outputs event by event
+        self.crossCheck = kwargs.get("crossCheck") if "crossCheck" in kwargs else False
+
+        workerLibrary.load("FCNCKinematicRecoCppWorker")
         pass
     def beginJob(self):
+        self.worker = ROOT.FCNCKinematicRecoCppWorker('NPL' in self.mode)
+        self.varNames = ["KinTopWb_pt", "KinTopWb_eta", "KinTopWb_phi", "KinTopWb_mass",
+                         "KinTopZq_pt", "KinTopZq_eta", "KinTopZq_phi", "KinTopZq_mass"]
+        self.nChecked, self.nMismatch = 0, 0
         pass
     def endJob(self):
+        if self.crossCheck:
+            print "FCNCKinematicReco cross-check: %d/%d events differ between C++ and python" % (self.nMismatch, self.nChecked)
         pass
     def beginFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
         self.out = wrappedOutputTree
-        self.out.branch("KinTopWb_pt", "F")
-        self.out.branch("KinTopWb_eta", "F")
-        self.out.branch("KinTopWb_phi", "F")
-        self.out.branch("KinTopWb_mass", "F")
-        self.out.branch("KinTopZq_pt", "F")
-        self.out.branch("KinTopZq_eta", "F")
-        self.out.branch("KinTopZq_phi", "F")
-        self.out.branch("KinTopZq_mass", "F")
-        self.out.branch("KinTop_status", "i")
+        ## Inputs are the objects selected by the FCNCTriLepton worker, which runs before in the same chain
+        self.worker.setLeptonWorker(inputTree._fcncTriLepton.worker)
+        outputProfile.configureWorker(self.worker)
+        self.worker.initOutput(self.out._tree)
 
         pass
     def endFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
@@ -81,6 +88,31 @@ class FCNCKinematicReco(Module, object):
         return TKinVar
 
     def analyze(self, event):
+        self.worker.analyze()
+        if self.crossCheck: self.compareWithPython(event)
+
+        return True
+    def compareWithPython(self, event):
+        self.nChecked += 1
+        varNames = ["KinTop_status"]+self.varNames
+        out = [getattr(self.worker, "get_%s" % varName)() for varName in varNames]
+        try:
+            ref = self.analyzePython(event)
+        except ValueError:
+            ## The python version stops at sqrt(negative mass^2) where the C++ one gives NaN
+            if any(x != x for x in out): return
+            ref = [float('nan')]*len(varNames)
+        for varName, x, y in zip(varNames, out, ref):
+            if x != x and y != y: continue
+            if abs(x-y) <= 1e-4*max(1, abs(y)): continue
+            ## phi can differ by 2pi
+            if varName.endswith("_phi") and abs(abs(x-y)-2*math.pi) <= 1e-4: continue
+            if self.nMismatch < 10:
+                print "FCNCKinematicReco cross-check: entry %d %s C++=%g python=%g" % (event._entry, varName, x, y)
+            self.nMismatch += 1
+            break
+    def analyzePython(self, event):
+        """python reference of the C++ worker, returns [status, KinTopWb pt/eta/phi/mass, KinTopZq pt/eta/phi/mass]"""
         Wmass = 80.4 # Fixed W mass
         OriginTmass = 172.5 # Fixed T mass
 
@@ -92,50 +124,40 @@ class FCNCKinematicReco(Module, object):
         # For NPL Selecton
         NPLflag = 1
         if 'NPL' in self.mode:
-            if (event._tree.b_out_nGoodLepton != 2 and event._tree.b_out_nVetoLepton > 0):
+            if (event._tree.b_out.nGoodLepton != 2 and event._tree.b_out.nVetoLepton > 0):
                 NPLflag = 0
             else: NPLflag = 1
         else:
-            if (event._tree.b_out_nGoodLepton != 3):
+            if (event._tree.b_out.nGoodLepton != 3):
                 NPLflag = 0
             else: NPLflag = 1
 
         # Check basic event selection
-        if event._tree.b_out_GoodLeptonCode != 111 or\
-           not( 2 <= event._tree.b_out_nGoodJet <= 3 ) or\
-           event._tree.b_out_nBjet < 1 or\
+        if event._tree.b_out.GoodLeptonCode != 111 or\
+           not( 2 <= event._tree.b_out.nGoodJet <= 3 ) or\
+           event._tree.b_out.nBjet < 1 or\
            NPLflag == 0:
 
-            self.out.fillBranch("KinTop_status", 0)
-            self.out.fillBranch("KinTopWb_pt", 0)
-            self.out.fillBranch("KinTopWb_eta", 0)
-            self.out.fillBranch("KinTopWb_phi", 0)
-            self.out.fillBranch("KinTopWb_mass", 0)
-            self.out.fillBranch("KinTopZq_pt", 0)
-            self.out.fillBranch("KinTopZq_eta", 0)
-            self.out.fillBranch("KinTopZq_phi", 0)
-            self.out.fillBranch("KinTopZq_mass", 0)
-
-            return True
+            return [0]*9
         else:
             # Variable construct : Lepton vars = [pt, eta, phi, mass]
             Wlepvar = TLorentzVector()
             Zlep1var = TLorentzVector()
             Zlep2var = TLorentzVector()
-            Wlepvar.SetPtEtaPhiM(event._tree.b_out_Lepton1_pt, event._tree.b_out_Lepton1_eta, event._tree.b_out_Lepton1_phi, event._tree.b_out_Lepton1_mass)
-            Zlep1var.SetPtEtaPhiM(event._tree.b_out_Lepton2_pt, event._tree.b_out_Lepton2_eta, event._tree.b_out_Lepton2_phi, event._tree.b_out_Lepton2_mass)
-            Zlep2var.SetPtEtaPhiM(event._tree.b_out_Lepton3_pt, event._tree.b_out_Lepton3_eta, event._tree.b_out_Lepton3_phi, event._tree.b_out_Lepton3_mass)
+            Wlepvar.SetPtEtaPhiM(event._tree.b_out.Lepton1_pt, event._tree.b_out.Lepton1_eta, event._tree.b_out.Lepton1_phi, event._tree.b_out.Lepton1_mass)
+            Zlep1var.SetPtEtaPhiM(event._tree.b_out.Lepton2_pt, event._tree.b_out.Lepton2_eta, event._tree.b_out.Lepton2_phi, event._tree.b_out.Lepton2_mass)
+            Zlep2var.SetPtEtaPhiM(event._tree.b_out.Lepton3_pt, event._tree.b_out.Lepton3_eta, event._tree.b_out.Lepton3_phi, event._tree.b_out.Lepton3_mass)
             # Variable coonstruct : Jet vars = [pt, eta, phi, mass, CSVv2]
             #if event._tree._b_out_nGoodJet < 2: continue # nJet >= 2 for tZq reconstruction
             bvar = TLorentzVector()
             qvar = TLorentzVector()
-            bvar.SetPtEtaPhiM(event._tree.b_out_GoodJet_pt[0], event._tree.b_out_GoodJet_eta[0], event._tree.b_out_GoodJet_phi[0], event._tree.b_out_GoodJet_mass[0])
-            qvar.SetPtEtaPhiM(event._tree.b_out_GoodJet_pt[1], event._tree.b_out_GoodJet_eta[1], event._tree.b_out_GoodJet_phi[1], event._tree.b_out_GoodJet_mass[1])
-            #bjetCSV, qjetCSV = event._tree.b_out_GoodJet_CSVv2[0], event._tree.b_out_GoodJet_CSVv2[1]
-            bjetDeepFlavB, qjetDeepFlavB = event._tree.b_out_GoodJet_DeepFlavB[0], event._tree.b_out_GoodJet_DeepFlavB[1]
+            bvar.SetPtEtaPhiM(event._tree.b_out.GoodJet_pt[0], event._tree.b_out.GoodJet_eta[0], event._tree.b_out.GoodJet_phi[0], event._tree.b_out.GoodJet_mass[0])
+            qvar.SetPtEtaPhiM(event._tree.b_out.GoodJet_pt[1], event._tree.b_out.GoodJet_eta[1], event._tree.b_out.GoodJet_phi[1], event._tree.b_out.GoodJet_mass[1])
+            #bjetCSV, qjetCSV = event._tree.b_out.GoodJet_CSVv2[0], event._tree.b_out.GoodJet_CSVv2[1]
+            bjetDeepFlavB, qjetDeepFlavB = event._tree.b_out.GoodJet_DeepFlavB[0], event._tree.b_out.GoodJet_DeepFlavB[1]
             # Variable condtruct : Neutrino vars = [MET, phi]
             metvar = TLorentzVector()
-            metvar.SetPtEtaPhiM(event._tree.b_out_MET_pt, 0, event._tree.b_out_MET_phi, 0)
+            metvar.SetPtEtaPhiM(event._tree.b_out.MET_pt, 0, event._tree.b_out.MET_phi, 0)
 
             ## b jet assign by CSVv2 discriminator
             #if ( bjetCSV < qjetCSV ):
@@ -191,15 +213,7 @@ class FCNCKinematicReco(Module, object):
             FCNCEs = [qjet[3], Zlep1[3], Zlep2[3]]
             FCNCTKinVal = self.getTPEPM(FCNCpxs, FCNCpys, FCNCpzs, FCNCEs)
 
-            self.out.fillBranch("KinTop_status", consted)
-            self.out.fillBranch("KinTopWb_pt", SMTKinVal[0])
-            self.out.fillBranch("KinTopWb_eta", SMTKinVal[1])
-            self.out.fillBranch("KinTopWb_phi", SMTKinVal[2])
-            self.out.fillBranch("KinTopWb_mass", SMTKinVal[3])
-            self.out.fillBranch("KinTopZq_pt", FCNCTKinVal[0])
-            self.out.fillBranch("KinTopZq_eta", FCNCTKinVal[1])
-            self.out.fillBranch("KinTopZq_phi", FCNCTKinVal[2])
-            self.out.fillBranch("KinTopZq_mass", FCNCTKinVal[3])
+            return [consted]+SMTKinVal+FCNCTKinVal
 
         ## for debugging
         #print " Coefficients A/B/aterm/bterm/cterm : ", metpz[3], metpz[4], metpz[5], metpz[6], metpz[7]
@@ -213,8 +227,6 @@ class FCNCKinematicReco(Module, object):
         #print " Neu Z pos/neg solution : ", metpz[0], metpz[1]
         #print "neu pos/neg energy : ", posneuE, negneuE
 
-        return True
-
 fcncKinReco_ElElEl = lambda: FCNCKinematicReco(mode="ElElEl")
 fcncKinReco_ElMuMu = lambda: FCNCKinematicReco(mode="ElMuMu")
 fcncKinReco_MuElEl = lambda: FCNCKinematicReco(mode="MuElEl")
@@ -223,3 +235,12 @@ fcncKinReco_NPLElElEl = lambda: FCNCKinematicReco(mode="NPLElElEl")
 fcncKinReco_NPLElMuMu = lambda: FCNCKinematicReco(mode="NPLElMuMu")
 fcncKinReco_NPLMuElEl = lambda: FCNCKinematicReco(mode="NPLMuElEl")
 fcncKinReco_NPLMuMuMu = lambda: FCNCKinematicReco(mode="NPLMuMuMu")
+
+fcncKinRecoCheck_ElElEl = lambda: FCNCKinematicReco(mode="ElElEl", crossCheck=True)
+fcncKinRecoCheck_ElMuMu = lambda: FCNCKinematicReco(mode="ElMuMu", crossCheck=True)
+fcncKinRecoCheck_MuElEl = lambda: FCNCKinematicReco(mode="MuElEl", crossCheck=True)
+fcncKinRecoCheck_MuMuMu = lambda: FCNCKinematicReco(mode="MuMuMu", crossCheck=True)
+fcncKinRecoCheck_NPLElElEl = lambda: FCNCKinematicReco(mode="NPLElElEl", crossCheck=True)
+fcncKinRecoCheck_NPLElMuMu = lambda: FCNCKinematicReco(mode="NPLElMuMu", crossCheck=True)
+fcncKinRecoCheck_NPLMuElEl = lambda: FCNCKinematicReco(mode="NPLMuElEl", crossCheck=True)
+fcncKinRecoCheck_NPLMuMuMu = lambda: FCNCKinematicReco(mode="NPLMuMuMu", crossCheck=True)
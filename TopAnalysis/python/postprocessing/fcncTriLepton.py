@@ -4,6 +4,14 @@ ROOT.PyConfig.IgnoreCommandLineOptions = True
 import os
 from PhysicsTools.NanoAODTools.postprocessing.framework.datamodel import Collection
 from PhysicsTools.NanoAODTools.postprocessing.framework.eventloop import Module
+import TZWi.TopAnalysis.postprocessing.workerLibrary as workerLibrary
+import TZWi.TopAnalysis.postprocessing.outputProfile as outputProfile
+from TZWi.TopAnalysis.postprocessing.WorkerOutput import WorkerOutput
+
+## Jet/MET variations from the jetmetUncertainties columns, (output suffix, input column suffix).
+## The varied Jet_pt/Jet_mass/MET_pt/MET_phi are read in the same pass as the nominal ones,
+## and the jet dependent outputs are written with the suffix, e.g. nBjet_jerDown, GoodJet_pt_jesUp
+jetMETVariations = [("jesUp", "jesTotalUp"), ("jesDown", "jesTotalDown"), ("jerUp", "jerUp"), ("jerDown", "jerDown")]
 
 class FCNCTriLepton(Module, object):
     def __init__(self, *args, **kwargs):
@@ -12,50 +20,24 @@ class FCNCTriLepton(Module, object):
         self.eleIdName = kwargs.get("eleId") if "eleId" in kwargs else "cutBased"
         self.eleVidMap = kwargs.get("eleVidMap") if "eleVidMap" in kwargs else "vidNestedWPBitmap"
         self.doNonPromptLepton = kwargs.get("doNonPromptLepton") if "doNonPromptLepton" in kwargs else False
+        self.jetVariations = kwargs.get("jetVariations") if "jetVariations" in kwargs else []
 
-        if "/FCNCTriLeptonCppWorker_cc.so" not in  ROOT.gSystem.GetLibraries():
-            print "Load C++ FCNCTriLepton worker module"
-            base = os.getenv("NANOAODTOOLS_BASE")
-            if base:
-                ROOT.gROOT.ProcessLine(".L %s/src/FCNCTriLeptonCppWorker.cc+O" % base)
-            else:
-                base = "%s/src/TZWi/TopAnalysis"%os.getenv("CMSSW_BASE")
-                ROOT.gSystem.Load("libPhysicsToolsNanoAODTools.so")
-                ROOT.gSystem.Load("libTZWiTopAnalysis.so")
-                ROOT.gROOT.ProcessLine(".L %s/interface/FCNCTriLeptonCppWorker.h" % base)
+        workerLibrary.load("FCNCTriLeptonCppWorker")
         pass
     def beginJob(self):
         self.worker = ROOT.FCNCTriLeptonCppWorker(self.mode, self.doNonPromptLepton)
+        for name, column in self.jetVariations: self.worker.addJetVariation(name)
         pass
     def endJob(self):
         pass
     def beginFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
         self.out = wrappedOutputTree
-        for objName in ["Lepton1", "Lepton2", "Lepton3", "Z", "LeadingElectron", "LeadingMuon"]:
-            for varName in ["pt", "eta", "phi", "mass"]:
-                self.out.branch("%s_%s" % (objName, varName), "F")
-        self.out.branch("MET_pt", "F")
-        self.out.branch("MET_phi", "F")
-        self.out.branch("Lepton1_pdgId", "I")
-        self.out.branch("Lepton2_pdgId", "I")
-        self.out.branch("Lepton3_pdgId", "I")
-        self.out.branch("LeadingLepton_pt", "F")
-        self.out.branch("TriLepton_mass", "F")
-        self.out.branch("TriLepton_pt", "F")
-        self.out.branch("TriLepton_WleptonZdPhi", "F")
-        self.out.branch("TriLepton_WleptonZdR", "F")
-        self.out.branch("Z_charge", "I")
-        self.out.branch("nVetoLepton", "i")
-        self.out.branch("nGoodLepton", "i")
-        self.out.branch("GoodLeptonCode", "I")
-        self.out.branch("nGoodElectron", "i")
-        self.out.branch("nGoodMuon", "i")
-        #self.out.branch("nGoodJet", "i")
-        self.out.branch("GoodJet_index", "i", lenVar="nGoodJet")
-        for varName in ["pt", "eta", "phi", "mass", "DeepFlavB"]:
-            self.out.branch("GoodJet_%s" % varName, "F", lenVar="nGoodJet")
-        self.out.branch("nBjet", "i")
-        self.out.branch("W_MT", "F")
+        self.inputTree = inputTree
+        inputTree._fcncTriLepton = self ## The cut flow module picks up the batch results from here
+        ## The worker owns the output buffers and fills the branches by itself
+        outputProfile.configureWorker(self.worker)
+        self.worker.initOutput(self.out._tree)
+        inputTree.b_out = WorkerOutput(self.worker)
 
         self.initReaders(inputTree)
         pass
@@ -92,6 +74,16 @@ class FCNCTriLepton(Module, object):
                              self.b_Muon_pfRelIso04_all, self.b_Muon_tightId, self.b_Muon_isGlobal, self.b_Muon_isPFcand, self.b_Muon_isTracker)
         self.worker.setJets(self.b_Jet_pt, self.b_Jet_eta, self.b_Jet_phi, self.b_Jet_mass,
                             self.b_Jet_jetId, self.b_Jet_btagDeepFlavB)
+        for k, (name, column) in enumerate(self.jetVariations):
+            branchNames = ["Jet_pt_"+column, "Jet_mass_"+column, "MET_pt_"+column, "MET_phi_"+column]
+            missing = [x for x in branchNames if not tree.GetBranch(x)]
+            if len(missing) > 0:
+                ## Keep the same output branches, filled with the nominal values
+                print "Jet variation %s: %s not in the input tree, the nominal ones are used" % (name, ",".join(missing))
+                readers = [self.b_Jet_pt, self.b_Jet_mass, self.b_MET_pt, self.b_MET_phi]
+            else:
+                readers = [tree.arrayReader(x) for x in branchNames[:2]]+[tree.valueReader(x) for x in branchNames[2:]]
+            self.worker.setJetVariation(k+1, *readers)
         self._ttreereaderversion = tree._ttreereaderversion
 
         pass
@@ -101,22 +93,19 @@ class FCNCTriLepton(Module, object):
             self.initReaders(event._tree)
         self.worker.analyze()
 
-        for objName in ["Lepton1", "Lepton2", "Lepton3", "Z", "GoodJet", "LeadingElectron", "LeadingMuon"]:
-            for varName in ["pt", "eta", "phi", "mass"]:
-                setattr(event._tree, "b_out_%s_%s" % (objName, varName), getattr(self.worker, 'get_%s_%s' % (objName, varName))())
-                self.out.fillBranch("%s_%s" % (objName, varName), getattr(event._tree, 'b_out_%s_%s' % (objName, varName)))
-        for varName in ["MET_pt", "MET_phi", "Lepton1_pdgId", "Lepton2_pdgId", "Lepton3_pdgId", "LeadingLepton_pt",
-                        "TriLepton_mass", "TriLepton_pt", "TriLepton_WleptonZdPhi", "TriLepton_WleptonZdR",
-                        "nVetoLepton", "nGoodElectron", "nGoodMuon", "nGoodLepton", "GoodLeptonCode", "Z_charge", "W_MT",
-                        #"nGoodJet", #We do not keep nGoodJet here, it have to be done by the framework
-                        "GoodJet_index", "GoodJet_DeepFlavB",
-                        "nBjet",]:
-            setattr(event._tree, "b_out_%s" % (varName), getattr(self.worker, 'get_%s' % (varName))())
-            self.out.fillBranch(varName, getattr(event._tree, "b_out_%s" % varName))
-        ## Special care for nGoodJet
-        setattr(event._tree, "b_out_nGoodJet", self.worker.get_nGoodJet())
-
         return True
+    def analyzeBatch(self, entries):
+        """process a block of entries, return the keep mask (see batchEventLoop)"""
+        tree = self.inputTree
+        if tree._ttreereaderversion > self._ttreereaderversion:
+            self.initReaders(tree)
+        self.worker.analyzeBatch(tree._ttreereader, entries, len(entries))
+        self.batchEntries = entries
+
+        return None
+    def fillBatch(self, event, k):
+        ## The worker kept the outputs of every entry of the batch, put back the ones of this entry
+        self.worker.restoreBatch(k)
 
 fcnc_MuMuMu_2016 = lambda : FCNCTriLepton(mode="MuMuMu", eleId="cutBased_Sum16", eleVidMap="vidNestedWPBitmapSum16")
 fcnc_ElElEl_2016 = lambda : FCNCTriLepton(mode="ElElEl", eleId="cutBased_Sum16", eleVidMap="vidNestedWPBitmapSum16")
@@ -135,3 +124,14 @@ fcnc_NPLMuMuMu_2017 = lambda : FCNCTriLepton(mode="MuMuMu", eleId="cutBased_Fall
 fcnc_NPLElElEl_2017 = lambda : FCNCTriLepton(mode="ElElEl", eleId="cutBased_Fall17_V1", doNonPromptLepton=True)
 fcnc_NPLElMuMu_2017 = lambda : FCNCTriLepton(mode="ElMuMu", eleId="cutBased_Fall17_V1", doNonPromptLepton=True)
 fcnc_NPLMuElEl_2017 = lambda : FCNCTriLepton(mode="MuElEl", eleId="cutBased_Fall17_V1", doNonPromptLepton=True)
+
+## MC with the jetmetUncertainties columns, KinReco and MVAinput follow the variations of this module
+fcncJetVar_MuMuMu_2016 = lambda : FCNCTriLepton(mode="MuMuMu", eleId="cutBased_Sum16", eleVidMap="vidNestedWPBitmapSum16", jetVariations=jetMETVariations)
+fcncJetVar_ElElEl_2016 = lambda : FCNCTriLepton(mode="ElElEl", eleId="cutBased_Sum16", eleVidMap="vidNestedWPBitmapSum16", jetVariations=jetMETVariations)
+fcncJetVar_ElMuMu_2016 = lambda : FCNCTriLepton(mode="ElMuMu", eleId="cutBased_Sum16", eleVidMap="vidNestedWPBitmapSum16", jetVariations=jetMETVariations)
+fcncJetVar_MuElEl_2016 = lambda : FCNCTriLepton(mode="MuElEl", eleId="cutBased_Sum16", eleVidMap="vidNestedWPBitmapSum16", jetVariations=jetMETVariations)
+
+fcncJetVar_MuMuMu_2017 = lambda : FCNCTriLepton(mode="MuMuMu", eleId="cutBased_Fall17_V1", jetVariations=jetMETVariations)
+fcncJetVar_ElElEl_2017 = lambda : FCNCTriLepton(mode="ElElEl", eleId="cutBased_Fall17_V1", jetVariations=jetMETVariations)
+fcncJetVar_ElMuMu_2017 = lambda : FCNCTriLepton(mode="ElMuMu", eleId="cutBased_Fall17_V1", jetVariations=jetMETVariations)
+fcncJetVar_MuElEl_2017 = lambda : FCNCTriLepton(mode="MuElEl", eleId="cutBased_Fall17_V1", jetVariations=jetMETVariations)
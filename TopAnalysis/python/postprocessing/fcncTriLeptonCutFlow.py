@@ -4,6 +4,7 @@ ROOT.PyConfig.IgnoreCommandLineOptions = True
 import os
 from PhysicsTools.NanoAODTools.postprocessing.framework.datamodel import Collection
 from PhysicsTools.NanoAODTools.postprocessing.framework.eventloop import Module
+import TZWi.TopAnalysis.postprocessing.outputProfile as outputProfile
 
 class FCNCTriLeptonCutFlow(Module, object):
     def __init__(self, *args, **kwargs):
@@ -16,38 +17,58 @@ class FCNCTriLeptonCutFlow(Module, object):
         pass
     def beginFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
         self.out = wrappedOutputTree
-        self.out.branch("CutStep", "i")
+        self.inputTree = inputTree
+        self.out.branch("CutStep", outputProfile.intType("i", "b"))
 
         pass
     def endFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
         pass
-    def analyze(self, event):
+    def getCutStep(self, goodLeptonCode, nGoodLepton, nVetoLepton, Z_mass, nGoodJet, W_MT, nBjet):
         cutStep = 0
         while True:
-            if abs(event._tree.b_out_GoodLeptonCode) != 111: break
+            if abs(goodLeptonCode) != 111: break
             cutStep += 1
-            #if event._tree.b_out_GoodLeptonCode < 0: break
+            #if goodLeptonCode < 0: break
             if 'NPL' in self.mode:
-              if (event._tree.b_out_nGoodLepton != 2 and event._tree.b_out_nVetoLepton > 0): break
+              if (nGoodLepton != 2 and nVetoLepton > 0): break
             else:
-              if event._tree.b_out_nGoodLepton != 3: break
+              if nGoodLepton != 3: break
             cutStep += 1
-            #if event._tree.b_out_nVetoLepton > 0: break
-            if not (82.5 <= event._tree.b_out_Z_mass <= 97.5): break
+            #if nVetoLepton > 0: break
+            if not (82.5 <= Z_mass <= 97.5): break
             cutStep += 1
-            if not (1 <= event._tree.b_out_nGoodJet <= 3): break
+            if not (1 <= nGoodJet <= 3): break
             cutStep += 1
-            if event._tree.b_out_W_MT > 300: break
-            nBjet = event._tree.b_out_nBjet
+            if W_MT > 300: break
             if nBjet < 1: break
             cutStep += 1
             if nBjet < 2: break
             cutStep += 1
 
             break
+
+        return cutStep
+    def analyze(self, event):
+        cutStep = self.getCutStep(event._tree.b_out.GoodLeptonCode, event._tree.b_out.nGoodLepton, event._tree.b_out.nVetoLepton,
+                                  event._tree.b_out.Z_mass, event._tree.b_out.nGoodJet, event._tree.b_out.W_MT, event._tree.b_out.nBjet)
         self.out.fillBranch("CutStep", cutStep)
 
         return cutStep > 0
+    def analyzeBatch(self, entries):
+        """process a block of entries, return the keep mask (see batchEventLoop)"""
+        fcnc = self.inputTree._fcncTriLepton
+        w = fcnc.worker
+        columns = [list(w.get_batch_GoodLeptonCode()), list(w.get_batch_nGoodLepton()), list(w.get_batch_nVetoLepton()),
+                   list(w.get_batch_Z_mass()), list(w.get_batch_nGoodJet()), list(w.get_batch_W_MT()), list(w.get_batch_nBjet())]
+        if entries is not fcnc.batchEntries:
+            pos = dict((e, k) for k, e in enumerate(fcnc.batchEntries))
+            columns = [[col[pos[e]] for e in entries] for col in columns]
+
+        self.batchCutSteps = [self.getCutStep(*x) for x in zip(*columns)]
+
+        return [cutStep > 0 for cutStep in self.batchCutSteps]
+    def fillBatch(self, event, k):
+        self.out.fillBranch("CutStep", self.batchCutSteps[k])
 
 cutFlow_MuMuMu = lambda: FCNCTriLeptonCutFlow(mode="MuMuMu")
 cutFlow_ElElEl = lambda: FCNCTriLeptonCutFlow(mode="ElElEl")
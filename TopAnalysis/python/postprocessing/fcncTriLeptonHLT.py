@@ -13,6 +13,8 @@ for dataset in ['DoubleMuon', 'DoubleEG']:
     for e in "BCDEFG":
         vars()['hlt_Run2016%s_%s' % (e, dataset)] = lambda x=dataset, f=setFile: CombineHLT(fileName=f, hltSet="Run2016BG.%s" % x, doFilter=True)
     vars()['hlt_Run2016H_%s'  % dataset] = lambda x=dataset, f=setFile: CombineHLT(fileName=f, hltSet="Run2016H.%s"  % x, doFilter=True)
+    ## Any mixture of the eras, the trigger set is chosen by the run number
+    vars()['hlt_Run2016_%s'   % dataset] = lambda x=dataset, f=setFile: CombineHLT(fileName=f, hltSet="Run2016.%s"   % x, doFilter=True)
 
 ###2017
 setFile = "fcncTriLepton/2017.yaml"
@@ -22,3 +24,4 @@ for dataset in ['SingleMuon', 'SingleElectron',
     vars()['hlt_Run2017B_%s'  % dataset] = lambda x=dataset, f=setFile: CombineHLT(fileName=f, hltSet="Run2017B.%s"  % x, doFilter=True)
     for e in "CDEF":
         vars()['hlt_Run2017%s_%s' % (e, dataset)] = lambda x=dataset, f=setFile: CombineHLT(fileName=f, hltSet="Run2017CF.%s" % x, doFilter=True)
+    vars()['hlt_Run2017_%s'   % dataset] = lambda x=dataset, f=setFile: CombineHLT(fileName=f, hltSet="Run2017.%s"   % x, doFilter=True)
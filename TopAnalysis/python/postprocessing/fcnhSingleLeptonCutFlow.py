@@ -24,13 +24,13 @@ class FCNHSingleLeptonCutFlow(Module, object):
     def analyze(self, event):
         cutStep = 0
         while True:
-            if event._tree.b_out_Lepton1_pdgId == 0: break
+            if event._tree.b_out.Lepton1_pdgId == 0: break
             cutStep += 1
-            if event._tree.b_out_nGoodJet >= 3: break
+            if event._tree.b_out.nGoodJet >= 3: break
             cutStep += 1
-            if event._tree.b_out_nBjet >= 1: break
+            if event._tree.b_out.nBjet >= 1: break
             cutStep += 1
-            if event._tree.b_out_nBjet >= 2: break
+            if event._tree.b_out.nBjet >= 2: break
             cutStep += 1
 
             break
@@ -0,0 +1,316 @@
+#ifndef TZWi_TopAnalysis_HistogramEngine_h
+#define TZWi_TopAnalysis_HistogramEngine_h
+
+#include <iostream>
+#include <string>
+#include <vector>
+#include <map>
+#include <memory>
+#include <algorithm>
+#include <cstdint>
+#include <TTree.h>
+#include <TTreeFormula.h>
+#include <TH1.h>
+#include <TH2.h>
+
+// Fills many histograms of a tree in one pass over the entries, with the same contents as
+// TTree::Draw("x>>h", "(weight)*(cut)") or TTree::Draw("y:x>>h", ...) for each of them.
+//
+// Each distinct expression is compiled once as a TTreeFormula and evaluated at most once per entry,
+// the weights and the histogram expressions only for the entries passing the cut.
+// Array expressions give one fill per instance as in TTree::Draw: the number of instances is the
+// smallest one of the array formulas of the fill, the scalars are used for all the instances,
+// and nothing is filled if a formula has no instance (e.g. GoodJet_pt[2] with two jets).
+// The mask of a fill is the selection of its target (e.g. the process cut of a sample split by genTtbarId),
+// shared by all the histograms of the target: the fill is skipped where it is 0, same as "(mask)&&(cut)".
+//
+// The cuts and the masks are split at their top level "&&" into cut expressions, shared by all the steps,
+// histograms and targets using them (e.g. "LeadingLepton_pt>25" or "Z_charge == 0" of S3...S6).
+// Each of them is one bit of the entry, set when it is evaluated for the first fill needing it,
+// and the selection of a fill (its set of bits) is decided with bit operations once per entry for all
+// the fills sharing it. A cut or a mask with an array expression keeps its own formula as above.
+class HistogramEngine {
+public:
+  HistogramEngine(TTree* tree): tree_(tree) {}
+  ~HistogramEngine() = default;
+
+  // Fill h with x (and y if not empty, for TH2) weighted by cut*weight where mask != 0,
+  // the weight and the mask can be empty
+  bool add(TH1* h, const std::string x, const std::string y, const std::string cut, const std::string weight,
+           const std::string mask="");
+  // Loop over the entries, returns the number of entries processed
+  Long64_t process(const Long64_t maxEntries=-1);
+
+  unsigned getNFormulas() const { return formulas_.size(); }
+  unsigned getNFills() const { return fills_.size(); }
+  unsigned getNCuts() const { return cutBits_.size(); }
+  unsigned getNSelections() const { return selections_.size(); }
+
+private:
+  struct Formula {
+    std::unique_ptr<TTreeFormula> formula;
+    bool isArray = false;
+    Long64_t entry = -1; // Entry of the values below
+    int ndata = 0;
+    std::vector<double> values;
+    double value(const int i) const { return values[isArray ? i : 0]; }
+  };
+  struct Selection {
+    std::vector<int> bits; // Cut bits in the order of evaluation, the ones of the mask first
+    std::vector<uint64_t> words; // Same bits as a mask of the words of the entry
+    Long64_t entry = -1; // Entry of the result below
+    bool passed = false;
+  };
+  struct Fill {
+    TH1* h;
+    int x, y, cut, weight, mask; // Index of the formulas, -1 if not used
+    int selection; // Index of the selection, -1 if not used
+    int cutValue; // Formula of the cut used as a factor of the weight if it is a single expression, -1 if 1
+  };
+
+  TTree* tree_;
+  std::vector<Formula> formulas_;
+  std::map<std::string, int> formulaIndex_;
+  std::vector<Fill> fills_;
+
+  std::vector<int> cutBits_; // Formula of each cut bit
+  std::map<int, int> bitIndex_; // Cut bit of each formula
+  std::vector<Selection> selections_;
+  std::map<std::vector<int>, int> selectionIndex_;
+  Long64_t bitsEntry_ = -1; // Entry of the bits below
+  std::vector<uint64_t> known_, passed_; // Cuts evaluated in the entry, and the ones passed
+
+  int addFormula(const std::string expr);
+  // Append the cut bits of the expressions of cut to bits, false if one of them is an array
+  bool addCutBits(const std::string cut, std::vector<int>& bits);
+  int addSelection(const std::vector<int>& bits);
+  const Formula& eval(const int index, const Long64_t entry);
+  bool select(const int index, const Long64_t entry);
+
+  static std::string strip(const std::string expr);
+  static std::vector<std::string> splitCut(const std::string cut);
+};
+
+std::string HistogramEngine::strip(const std::string expr)
+{
+  // Without the spaces and the parentheses around the whole expression
+  const size_t begin = expr.find_first_not_of(" \t"), end = expr.find_last_not_of(" \t");
+  if ( begin == std::string::npos ) return "";
+  const std::string out = expr.substr(begin, end-begin+1);
+  if ( out.size() < 2 or out.front() != '(' or out.back() != ')' ) return out;
+  int depth = 0;
+  for ( size_t i=0; i<out.size()-1; ++i ) {
+    if ( out[i] == '(' ) ++depth;
+    else if ( out[i] == ')' ) --depth;
+    if ( depth == 0 ) return out; // "(A)&&(B)"
+  }
+  return strip(out.substr(1, out.size()-2));
+}
+
+std::vector<std::string> HistogramEngine::splitCut(const std::string cut)
+{
+  // Expressions of the top level "&&", e.g. A, B and C of "(A)&&(B&&C)". The ones with a top level "||"
+  // or "?" are not split, "&&" binds tighter than them. The expressions "1" are dropped
+  const std::string expr = strip(cut);
+  if ( expr.empty() or expr == "1" ) return {};
+
+  std::vector<size_t> splits;
+  int depth = 0;
+  for ( size_t i=0; i<expr.size(); ++i ) {
+    const char c = expr[i];
+    if ( c == '(' or c == '[' ) ++depth;
+    else if ( c == ')' or c == ']' ) --depth;
+    else if ( depth != 0 or i+1 == expr.size() ) continue;
+    else if ( c == '?' or (c == '|' and expr[i+1] == '|') ) return {expr};
+    else if ( c == '&' and expr[i+1] == '&' ) splits.push_back(i++);
+  }
+  if ( splits.empty() ) return {expr};
+
+  std::vector<std::string> exprs;
+  size_t begin = 0;
+  splits.push_back(expr.size());
+  for ( const size_t split : splits ) {
+    for ( const auto& x : splitCut(expr.substr(begin, split-begin)) ) exprs.push_back(x);
+    begin = split+2;
+  }
+  return exprs;
+}
+
+bool HistogramEngine::addCutBits(const std::string cut, std::vector<int>& bits)
+{
+  std::vector<int> indices;
+  for ( const auto& expr : splitCut(cut) ) {
+    const int index = addFormula(expr);
+    if ( index < 0 or formulas_[index].isArray ) return false;
+    indices.push_back(index);
+  }
+  for ( const int index : indices ) {
+    auto match = bitIndex_.find(index);
+    if ( match == bitIndex_.end() ) {
+      match = bitIndex_.emplace(index, cutBits_.size()).first;
+      cutBits_.push_back(index);
+    }
+    if ( std::find(bits.begin(), bits.end(), match->second) == bits.end() ) bits.push_back(match->second);
+  }
+  return true;
+}
+
+int HistogramEngine::addSelection(const std::vector<int>& bits)
+{
+  if ( bits.empty() ) return -1;
+  auto match = selectionIndex_.find(bits);
+  if ( match != selectionIndex_.end() ) return match->second;
+
+  selections_.emplace_back();
+  selections_.back().bits = bits;
+  for ( const int bit : bits ) {
+    if ( selections_.back().words.size() <= size_t(bit/64) ) selections_.back().words.resize(bit/64+1);
+    selections_.back().words[bit/64] |= uint64_t(1) << (bit%64);
+  }
+  selectionIndex_[bits] = selections_.size()-1;
+  return selections_.size()-1;
+}
+
+int HistogramEngine::addFormula(const std::string expr)
+{
+  if ( expr.empty() ) return -1;
+  auto match = formulaIndex_.find(expr);
+  if ( match != formulaIndex_.end() ) return match->second;
+
+  if ( !tree_->GetTree() ) tree_->LoadTree(0);
+  const std::string name = "hengine"+std::to_string(formulas_.size());
+  std::unique_ptr<TTreeFormula> formula(new TTreeFormula(name.c_str(), expr.c_str(), tree_));
+  if ( formula->GetNdim() == 0 ) {
+    std::cerr << "HistogramEngine: cannot compile the expression " << expr << std::endl;
+    return -2;
+  }
+
+  formulas_.emplace_back();
+  formulas_.back().isArray = formula->GetMultiplicity() != 0;
+  formulas_.back().formula = std::move(formula);
+  formulaIndex_[expr] = formulas_.size()-1;
+  return formulas_.size()-1;
+}
+
+bool HistogramEngine::add(TH1* h, const std::string x, const std::string y,
+                          const std::string cut, const std::string weight, const std::string mask)
+{
+  if ( !h or x.empty() or (h->GetDimension() == 2) != !y.empty() ) return false;
+  Fill fill = {h, addFormula(x), addFormula(y), -1, addFormula(weight), -1, -1, -1};
+  if ( fill.x < 0 or fill.y < -1 or fill.weight < -1 ) return false;
+
+  // Cut bits of the mask, then of the cut, or their formula if they have an array expression
+  std::vector<int> bits;
+  if ( !addCutBits(mask, bits) ) {
+    fill.mask = addFormula(mask == "1" ? "" : mask);
+    if ( fill.mask < -1 ) return false;
+  }
+  const size_t nMaskBits = bits.size();
+  if ( addCutBits(cut, bits) ) {
+    // The value of the cut weights the fill as in TTree::Draw if it is not a "&&" of several expressions
+    const auto exprs = splitCut(cut);
+    if ( exprs.size() == 1 and exprs[0] == strip(cut) ) fill.cutValue = addFormula(exprs[0]);
+  }
+  else {
+    bits.resize(nMaskBits);
+    fill.cut = addFormula(cut.empty() ? "1" : cut);
+    if ( fill.cut < 0 ) return false;
+  }
+  fill.selection = addSelection(bits);
+
+  fills_.push_back(fill);
+  return true;
+}
+
+const HistogramEngine::Formula& HistogramEngine::eval(const int index, const Long64_t entry)
+{
+  Formula& f = formulas_[index];
+  if ( f.entry == entry ) return f;
+  f.entry = entry;
+  f.ndata = f.formula->GetNdata();
+  f.values.resize(std::max(f.ndata, 1));
+  for ( int i=0; i<f.ndata; ++i ) f.values[i] = f.formula->EvalInstance(i);
+  return f;
+}
+
+bool HistogramEngine::select(const int index, const Long64_t entry)
+{
+  Selection& s = selections_[index];
+  if ( s.entry == entry ) return s.passed;
+  s.entry = entry;
+  if ( bitsEntry_ != entry ) {
+    bitsEntry_ = entry;
+    std::fill(known_.begin(), known_.end(), 0);
+    std::fill(passed_.begin(), passed_.end(), 0);
+  }
+
+  // Decided by the cuts already evaluated in the entry if one of them failed or if all of them passed
+  bool isKnown = true;
+  for ( size_t w=0; w<s.words.size(); ++w ) {
+    if ( s.words[w] & known_[w] & ~passed_[w] ) return s.passed = false;
+    if ( s.words[w] & ~known_[w] ) isKnown = false;
+  }
+  if ( isKnown ) return s.passed = true;
+
+  // Evaluate the others in order, up to the first one failing
+  for ( const int bit : s.bits ) {
+    const size_t w = bit/64;
+    const uint64_t b = uint64_t(1) << (bit%64);
+    if ( !(known_[w] & b) ) {
+      const Formula& f = eval(cutBits_[bit], entry);
+      known_[w] |= b;
+      if ( f.ndata > 0 and f.values[0] != 0 ) passed_[w] |= b;
+    }
+    if ( !(passed_[w] & b) ) return s.passed = false;
+  }
+  return s.passed = true;
+}
+
+Long64_t HistogramEngine::process(const Long64_t maxEntries)
+{
+  known_.assign(cutBits_.size()/64+1, 0);
+  passed_.assign(cutBits_.size()/64+1, 0);
+  bitsEntry_ = -1;
+  for ( auto& s : selections_ ) s.entry = -1;
+
+  int treeNumber = -1;
+  Long64_t entry = 0;
+  for ( ; maxEntries < 0 or entry < maxEntries; ++entry ) {
+    if ( tree_->LoadTree(entry) < 0 ) break;
+    if ( tree_->GetTreeNumber() != treeNumber ) {
+      // The leaves of the formulas change with the file of a chain
+      treeNumber = tree_->GetTreeNumber();
+      for ( auto& f : formulas_ ) f.formula->UpdateFormulaLeaves();
+    }
+
+    for ( const auto& fill : fills_ ) {
+      if ( fill.selection >= 0 and !select(fill.selection, entry) ) continue;
+      const Formula* mask = fill.mask >= 0 ? &eval(fill.mask, entry) : nullptr;
+      if ( mask and (mask->ndata == 0 or (!mask->isArray and mask->values[0] == 0)) ) continue;
+      const Formula* cut = fill.cut >= 0 ? &eval(fill.cut, entry) : nullptr;
+      if ( cut and (cut->ndata == 0 or (!cut->isArray and cut->values[0] == 0)) ) continue;
+      const double cutValue = fill.cutValue >= 0 ? formulas_[fill.cutValue].values[0] : 1.;
+
+      const Formula* fs[] = {cut, fill.weight >= 0 ? &eval(fill.weight, entry) : nullptr,
+                             &eval(fill.x, entry), fill.y >= 0 ? &eval(fill.y, entry) : nullptr, mask};
+      int n = -1;
+      for ( const Formula* f : fs ) {
+        if ( !f ) continue;
+        if ( f->ndata == 0 ) n = 0;
+        else if ( f->isArray ) n = n < 0 ? f->ndata : std::min(n, f->ndata);
+      }
+      if ( n < 0 ) n = 1;
+
+      for ( int i=0; i<n; ++i ) {
+        if ( mask and mask->value(i) == 0 ) continue;
+        const double w = (cut ? cut->value(i) : cutValue)*(fs[1] ? fs[1]->value(i) : 1.);
+        if ( w == 0 ) continue;
+        if ( fs[3] ) static_cast<TH2*>(fill.h)->Fill(fs[2]->value(i), fs[3]->value(i), w);
+        else fill.h->Fill(fs[2]->value(i), w);
+      }
+    }
+  }
+  return entry;
+}
+
+#endif
@@ -6,9 +6,14 @@
 #include <vector>
 #include <TH2.h>
 #include <TFile.h>
+#include <TTree.h>
+#include <TTreeReaderValue.h>
+#include <TTreeReaderArray.h>
 #include <cmath>
 
 #include "PhysicsTools/NanoAODTools/src/WeightCalculatorFromHistogram.cc"
+#include "SFTable.cc"
+#include "../../../interface/OutputBranch.h"
 
 class LeptonEfficiencyCorrector {
  public:
@@ -93,4 +98,124 @@ const std::vector<float> & LeptonEfficiencyCorrector::run() {
   return ret_;
 }
 
+// All the lepton SFs of an event in one call: per-object SF and error of every SF set,
+// the event product, written directly to the output branches.
+// Each SF set is one SFTable, with the eras (e.g. 2016BCDEF and 2016GH) already merged in it.
+class LeptonSFBatchCorrector {
+ public:
+  LeptonSFBatchCorrector() {}
+  ~LeptonSFBatchCorrector() {}
+
+  // The first muon SF set enters the event SF, the others are kept as Muon_effSF{suffix}
+  void addMuonSF(const std::string suffix, const SFTable* table);
+  void setElectronSF(const SFTable* table);
+
+  void setMuons(TTreeReaderValue<unsigned>* n, TTreeReaderArray<int>* pdgId, TTreeReaderArray<float>* pt, TTreeReaderArray<float>* eta);
+  void setElectrons(TTreeReaderValue<unsigned>* n, TTreeReaderArray<int>* pdgId, TTreeReaderArray<float>* pt, TTreeReaderArray<float>* eta);
+  void initOutput(TTree* outTree);
+
+  void analyze();
+
+  float get_LeptonSF() const { return out_LeptonSF_; }
+  float get_LeptonSFerr() const { return out_LeptonSFerr_; }
+
+ private:
+  struct SFSet {
+    std::string name;
+    const SFTable* table = nullptr;
+    std::vector<float> sf, sfErr;
+    TBranch* sfBranch = nullptr, * sfErrBranch = nullptr;
+  };
+  struct Objects {
+    TTreeReaderValue<unsigned>* n = nullptr;
+    TTreeReaderArray<int>* pdgId = nullptr;
+    TTreeReaderArray<float>* pt = nullptr, * eta = nullptr;
+    unsigned out_n = 0;
+  };
+  std::vector<SFSet> muonSFs_;
+  SFSet electronSF_;
+  Objects muons_, electrons_;
+
+  void evalSF(SFSet& sfSet, Objects& objs);
+
+  float out_LeptonSF_ = 1, out_LeptonSFerr_ = 0;
+};
+
+void LeptonSFBatchCorrector::addMuonSF(const std::string suffix, const SFTable* table) {
+  muonSFs_.emplace_back();
+  muonSFs_.back().name = "Muon_effSF"+suffix;
+  muonSFs_.back().table = table;
+}
+
+void LeptonSFBatchCorrector::setElectronSF(const SFTable* table) {
+  electronSF_.name = "Electron_effSF";
+  electronSF_.table = table;
+}
+
+void LeptonSFBatchCorrector::setMuons(TTreeReaderValue<unsigned>* n, TTreeReaderArray<int>* pdgId, TTreeReaderArray<float>* pt, TTreeReaderArray<float>* eta) {
+  muons_.n = n; muons_.pdgId = pdgId; muons_.pt = pt; muons_.eta = eta;
+}
+
+void LeptonSFBatchCorrector::setElectrons(TTreeReaderValue<unsigned>* n, TTreeReaderArray<int>* pdgId, TTreeReaderArray<float>* pt, TTreeReaderArray<float>* eta) {
+  electrons_.n = n; electrons_.pdgId = pdgId; electrons_.pt = pt; electrons_.eta = eta;
+}
+
+void LeptonSFBatchCorrector::initOutput(TTree* outTree) {
+  bookOutputBranch(outTree, "LeptonSF", &out_LeptonSF_, "/F");
+  bookOutputBranch(outTree, "LeptonSFerr", &out_LeptonSFerr_, "/F");
+
+  // The SF arrays use the nMuon/nElectron counters cloned from the input, which keep being filled from the input.
+  // Only an output tree without them (e.g. a friend tree) gets its own, filled from the counts of this event
+  if ( !outTree->GetBranch("nMuon") ) outTree->Branch("nMuon", &muons_.out_n, "nMuon/i");
+  if ( !outTree->GetBranch("nElectron") ) outTree->Branch("nElectron", &electrons_.out_n, "nElectron/i");
+  const size_t nMax = 64;
+  for ( auto& sfSet : muonSFs_ ) {
+    sfSet.sf.resize(nMax); sfSet.sfErr.resize(nMax);
+    const std::string errName = "Muon_effSFerr"+sfSet.name.substr(10);
+    sfSet.sfBranch = bookOutputBranch(outTree, sfSet.name, sfSet.sf.data(), "[nMuon]/F");
+    sfSet.sfErrBranch = bookOutputBranch(outTree, errName, sfSet.sfErr.data(), "[nMuon]/F");
+  }
+  electronSF_.sf.resize(nMax); electronSF_.sfErr.resize(nMax);
+  electronSF_.sfBranch = bookOutputBranch(outTree, "Electron_effSF", electronSF_.sf.data(), "[nElectron]/F");
+  electronSF_.sfErrBranch = bookOutputBranch(outTree, "Electron_effSFerr", electronSF_.sfErr.data(), "[nElectron]/F");
+}
+
+void LeptonSFBatchCorrector::evalSF(SFSet& sfSet, Objects& objs) {
+  const unsigned n = objs.out_n;
+  if ( sfSet.sf.size() < n ) {
+    // Grow the buffers and move the branch addresses with them
+    sfSet.sf.resize(2*n); sfSet.sfErr.resize(2*n);
+    if ( sfSet.sfBranch ) sfSet.sfBranch->SetAddress(sfSet.sf.data());
+    if ( sfSet.sfErrBranch ) sfSet.sfErrBranch->SetAddress(sfSet.sfErr.data());
+  }
+
+  for ( unsigned i=0; i<n; ++i ) {
+    if ( sfSet.table ) sfSet.table->lookup(objs.pdgId->At(i), objs.pt->At(i), objs.eta->At(i), sfSet.sf[i], sfSet.sfErr[i]);
+    else { sfSet.sf[i] = 1; sfSet.sfErr[i] = 0; }
+  }
+}
+
+void LeptonSFBatchCorrector::analyze() {
+  muons_.out_n = muons_.n ? **muons_.n : 0;
+  electrons_.out_n = electrons_.n ? **electrons_.n : 0;
+
+  for ( auto& sfSet : muonSFs_ ) evalSF(sfSet, muons_);
+  evalSF(electronSF_, electrons_);
+
+  // Event SF from the electrons and the first muon SF set
+  double sf = 1, err2 = 0;
+  for ( unsigned i=0; i<electrons_.out_n; ++i ) {
+    sf *= electronSF_.sf[i];
+    err2 += electronSF_.sfErr[i]*electronSF_.sfErr[i];
+  }
+  if ( !muonSFs_.empty() ) {
+    for ( unsigned i=0; i<muons_.out_n; ++i ) {
+      sf *= muonSFs_[0].sf[i];
+      err2 += muonSFs_[0].sfErr[i]*muonSFs_[0].sfErr[i];
+    }
+  }
+  out_LeptonSF_ = sf;
+  out_LeptonSFerr_ = std::sqrt(err2);
+}
+
 #endif
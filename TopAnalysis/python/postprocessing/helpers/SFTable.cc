@@ -0,0 +1,249 @@
+#ifndef TZWi_TopAnalysis_SFTable_h
+#define TZWi_TopAnalysis_SFTable_h
+
+#include <iostream>
+#include <fstream>
+#include <string>
+#include <vector>
+#include <algorithm>
+#include <cstring>
+#include <cmath>
+#include <TH2.h>
+#include <TFile.h>
+
+// Scale factor map merged over the data taking eras, as a dense 2D table.
+//
+// The SF of an era is the product of its histograms (e.g. Trig x ID x ISO) and the
+// eras are summed with their weights, the errors are combined in quadrature as in
+// LeptonEfficiencyCorrector. The merged map is built on the union of the bin edges
+// of all the histograms, so it gives exactly the same values as the separate lookups.
+// Out of range values are taken from the edge bins, same as WeightCalculatorFromHistogram.
+class SFTable {
+ public:
+  SFTable() {}
+  ~SFTable() { clearEras(); }
+
+  // Histograms of one era, and its weight (e.g. the luminosity fraction)
+  bool addEra(std::vector<std::string> files, std::vector<std::string> histos, const double weight);
+  // Merge the eras into the table, the histograms are released after this
+  bool build();
+
+  // Compiled table on disk, to skip the merging in the next jobs
+  bool save(const std::string fileName) const;
+  bool load(const std::string fileName);
+
+  // Same convention with LeptonEfficiencyCorrector: (pt, |eta|) for muons, (eta, pt) for electrons
+  void lookup(const int pdgid, const float pt, const float eta, float& sf, float& sfErr) const;
+  float getSF(const int pdgid, const float pt, const float eta) const;
+  float getSFErr(const int pdgid, const float pt, const float eta) const;
+
+  unsigned getNBinsX() const { return xAxis_.nBins(); }
+  unsigned getNBinsY() const { return yAxis_.nBins(); }
+
+ private:
+  // Bin edges with a lookup table on a uniform grid finer than the smallest bin,
+  // so that the bin is found with one table access and at most one comparison
+  struct Axis {
+    std::vector<double> edges;
+    std::vector<unsigned> lut;
+    double lutStep = 0;
+    void init(const std::vector<double>& binEdges);
+    unsigned nBins() const { return edges.empty() ? 0 : edges.size()-1; }
+    unsigned find(const double x) const;
+  };
+  Axis xAxis_, yAxis_;
+  std::vector<float> sf_, sfErr_; // [ix*nBinsY+iy]
+
+  struct Era { std::vector<TH2*> hists; double weight; };
+  std::vector<Era> eras_;
+  void clearEras();
+
+  static const unsigned maxLUT_ = 100000;
+};
+
+void SFTable::Axis::init(const std::vector<double>& binEdges) {
+  edges = binEdges;
+  lut.clear();
+  lutStep = 0;
+  if ( edges.size() < 2 ) return;
+
+  double minWidth = edges.back()-edges.front();
+  for ( size_t i=1; i<edges.size(); ++i ) minWidth = std::min(minWidth, edges[i]-edges[i-1]);
+  if ( minWidth <= 0 ) return;
+  const double nCells = std::ceil((edges.back()-edges.front())/minWidth);
+  if ( nCells > maxLUT_ ) return; // Too fine binning, binary search is used instead
+
+  lutStep = minWidth;
+  lut.resize(unsigned(nCells));
+  for ( unsigned c=0; c<lut.size(); ++c ) {
+    const double x = edges.front()+c*lutStep;
+    lut[c] = std::min<unsigned>(nBins()-1, std::upper_bound(edges.begin(), edges.end(), x)-edges.begin()-1);
+  }
+}
+
+unsigned SFTable::Axis::find(const double x) const {
+  const unsigned n = nBins();
+  if ( n == 0 or !(x >= edges.front()) ) return 0;
+  if ( x >= edges.back() ) return n-1;
+  if ( lut.empty() ) return std::upper_bound(edges.begin(), edges.end(), x)-edges.begin()-1;
+
+  const unsigned c = std::min<unsigned>(lut.size()-1, unsigned((x-edges.front())/lutStep));
+  unsigned i = lut[c];
+  // A grid cell contains at most one edge. The second check is for the rounding at the cell boundary
+  if ( i+1 < n and x >= edges[i+1] ) ++i;
+  else if ( i > 0 and x < edges[i] ) --i;
+  return i;
+}
+
+void SFTable::clearEras() {
+  for ( auto& era : eras_ ) {
+    for ( auto h : era.hists ) delete h;
+  }
+  eras_.clear();
+}
+
+bool SFTable::addEra(std::vector<std::string> files, std::vector<std::string> histos, const double weight) {
+  if ( files.size() != histos.size() ) {
+    std::cout << "ERROR! There should be one histogram per input file!" << std::endl;
+    return false;
+  }
+
+  Era era = {{}, weight};
+  for ( size_t i=0; i<files.size(); ++i ) {
+    TFile* f = TFile::Open(files[i].c_str(), "read");
+    if ( !f ) {
+      std::cout << "WARNING! File " << files[i] << " cannot be opened. Skipping this scale factor " << std::endl;
+      continue;
+    }
+    TH2* h = dynamic_cast<TH2*>(f->Get(histos[i].c_str()));
+    if ( !h ) {
+      std::cout << "ERROR! Histogram " << histos[i] << " not in file " << files[i] << ". Not considering this SF. " << std::endl;
+      f->Close();
+      continue;
+    }
+    h = static_cast<TH2*>(h->Clone());
+    h->SetDirectory(0);
+    era.hists.push_back(h);
+    f->Close();
+  }
+  eras_.push_back(era);
+  return true;
+}
+
+bool SFTable::build() {
+  // Union of the bin edges of all the histograms
+  std::vector<double> xEdges, yEdges;
+  for ( const auto& era : eras_ ) {
+    for ( const auto h : era.hists ) {
+      for ( int i=1, n=h->GetNbinsX(); i<=n+1; ++i ) xEdges.push_back(h->GetXaxis()->GetBinLowEdge(i));
+      for ( int i=1, n=h->GetNbinsY(); i<=n+1; ++i ) yEdges.push_back(h->GetYaxis()->GetBinLowEdge(i));
+    }
+  }
+  for ( auto edges : {&xEdges, &yEdges} ) {
+    std::sort(edges->begin(), edges->end());
+    edges->erase(std::unique(edges->begin(), edges->end()), edges->end());
+  }
+  if ( xEdges.size() < 2 or yEdges.size() < 2 ) {
+    // No histogram at all, SF=1 everywhere as in LeptonEfficiencyCorrector
+    xEdges = yEdges = {0, 1};
+  }
+  xAxis_.init(xEdges);
+  yAxis_.init(yEdges);
+
+  const unsigned nx = xAxis_.nBins(), ny = yAxis_.nBins();
+  sf_.assign(nx*ny, 0);
+  sfErr_.assign(nx*ny, 0);
+  for ( unsigned ix=0; ix<nx; ++ix ) {
+    const double x = (xEdges[ix]+xEdges[ix+1])/2;
+    for ( unsigned iy=0; iy<ny; ++iy ) {
+      const double y = (yEdges[iy]+yEdges[iy+1])/2;
+      double sf = 0, err2 = 0;
+      for ( const auto& era : eras_ ) {
+        double eraSF = 1, eraErr2 = 0;
+        for ( const auto h : era.hists ) {
+          const int bx = std::max(1, std::min(h->GetNbinsX(), h->GetXaxis()->FindFixBin(x)));
+          const int by = std::max(1, std::min(h->GetNbinsY(), h->GetYaxis()->FindFixBin(y)));
+          eraSF *= h->GetBinContent(bx, by);
+          eraErr2 += std::pow(h->GetBinError(bx, by), 2);
+        }
+        sf += era.weight*eraSF;
+        err2 += era.weight*era.weight*eraErr2;
+      }
+      if ( eras_.empty() ) sf = 1;
+      sf_[ix*ny+iy] = sf;
+      sfErr_[ix*ny+iy] = std::sqrt(err2);
+    }
+  }
+
+  clearEras();
+  return true;
+}
+
+bool SFTable::save(const std::string fileName) const {
+  std::ofstream fout(fileName, std::ios::binary);
+  if ( !fout ) return false;
+
+  const char magic[4] = {'S', 'F', 'T', '1'};
+  fout.write(magic, 4);
+  for ( const Axis* axis : {&xAxis_, &yAxis_} ) {
+    const unsigned n = axis->edges.size();
+    fout.write(reinterpret_cast<const char*>(&n), sizeof(n));
+    fout.write(reinterpret_cast<const char*>(axis->edges.data()), n*sizeof(double));
+  }
+  fout.write(reinterpret_cast<const char*>(sf_.data()), sf_.size()*sizeof(float));
+  fout.write(reinterpret_cast<const char*>(sfErr_.data()), sfErr_.size()*sizeof(float));
+  return bool(fout);
+}
+
+bool SFTable::load(const std::string fileName) {
+  std::ifstream fin(fileName, std::ios::binary);
+  if ( !fin ) return false;
+
+  char magic[4];
+  fin.read(magic, 4);
+  if ( !fin or std::strncmp(magic, "SFT1", 4) != 0 ) return false;
+  std::vector<double> edges[2];
+  for ( auto& e : edges ) {
+    unsigned n = 0;
+    fin.read(reinterpret_cast<char*>(&n), sizeof(n));
+    if ( !fin or n < 2 or n > 1000000 ) return false;
+    e.resize(n);
+    fin.read(reinterpret_cast<char*>(e.data()), n*sizeof(double));
+  }
+  const size_t nCells = (edges[0].size()-1)*(edges[1].size()-1);
+  std::vector<float> sf(nCells), sfErr(nCells);
+  fin.read(reinterpret_cast<char*>(sf.data()), nCells*sizeof(float));
+  fin.read(reinterpret_cast<char*>(sfErr.data()), nCells*sizeof(float));
+  if ( !fin ) return false;
+
+  xAxis_.init(edges[0]);
+  yAxis_.init(edges[1]);
+  sf_.swap(sf);
+  sfErr_.swap(sfErr);
+  clearEras();
+  return true;
+}
+
+void SFTable::lookup(const int pdgid, const float pt, const float eta, float& sf, float& sfErr) const {
+  if ( sf_.empty() ) { sf = 1; sfErr = 0; return; }
+  const bool isMuon = std::abs(pdgid) == 13;
+  const float x = isMuon ? pt : eta;
+  const float y = isMuon ? std::abs(eta) : pt;
+  const unsigned i = xAxis_.find(x)*yAxis_.nBins()+yAxis_.find(y);
+  sf = sf_[i];
+  sfErr = sfErr_[i];
+}
+
+float SFTable::getSF(const int pdgid, const float pt, const float eta) const {
+  float sf, sfErr;
+  lookup(pdgid, pt, eta, sf, sfErr);
+  return sf;
+}
+
+float SFTable::getSFErr(const int pdgid, const float pt, const float eta) const {
+  float sf, sfErr;
+  lookup(pdgid, pt, eta, sf, sfErr);
+  return sfErr;
+}
+
+#endif
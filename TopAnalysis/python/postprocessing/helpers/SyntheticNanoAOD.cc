@@ -0,0 +1,409 @@
+#ifndef TZWi_TopAnalysis_SyntheticNanoAOD_h
+#define TZWi_TopAnalysis_SyntheticNanoAOD_h
+
+#include <iostream>
+#include <string>
+#include <vector>
+#include <memory>
+#include <algorithm>
+#include <cmath>
+#include <TFile.h>
+#include <TTree.h>
+#include <TRandom3.h>
+
+// NanoAOD-shaped events for the benchmarks of the postprocessing modules without the real inputs.
+//
+// The branch names and types follow the NanoAOD: run/luminosityBlock/event, the generator weights,
+// Pileup/PV, MET, Electron_*, Muon_*, Jet_* (with the b tag and the Jet_btagSF_deepjet_shape
+// variations of btagSFProducer), HLT_*/Flag_* bits and GenPart with a ttbar decay chain.
+// The jetmetUncertainties columns (Jet_pt_jesTotalUp...) are added on request.
+// The physics content is not realistic, but the multiplicities and the selection efficiencies
+// can be tuned so that every module of the chain has work to do.
+class SyntheticNanoAOD {
+ public:
+  SyntheticNanoAOD() {}
+
+  // Mean multiplicities of the Poisson distributions
+  void setMultiplicities(const double nElectron, const double nMuon, const double nJet, const double nGenPart) {
+    meanElectron_ = nElectron; meanMuon_ = nMuon; meanJet_ = nJet; meanGenPart_ = nGenPart;
+  }
+  // Fraction of the events with three tight and isolated leptons, two of them from a Z
+  void setTriLeptonFraction(const double f) { triLeptonFraction_ = f; }
+  // Trigger or filter bit, fired with the given probability
+  void addBit(const std::string name, const double prob) { bits_.push_back({name, prob, 0}); }
+  void setJetVariations(const bool doJetVariations) { doJetVariations_ = doJetVariations; }
+  void setRun(const unsigned run) { run_ = run; }
+
+  // Write nEvents events in the Events tree of fileName, returns the number of bytes written
+  long long generate(const std::string fileName, const unsigned nEvents, const unsigned seed=12345, const int compression=209);
+
+ private:
+  static const unsigned maxLep_ = 16, maxJet_ = 64, maxGen_ = 256, nLHEPdf_ = 103;
+  static const char* btagSysts_[];
+
+  double meanElectron_ = 1.0, meanMuon_ = 1.0, meanJet_ = 5.0, meanGenPart_ = 60;
+  double triLeptonFraction_ = 0.3;
+  bool doJetVariations_ = false;
+  unsigned run_ = 1;
+
+  struct Bit { std::string name; double prob; Bool_t value; };
+  std::vector<Bit> bits_;
+
+  TRandom3 rnd_;
+
+  // Branch buffers
+  UInt_t run, luminosityBlock;
+  ULong64_t event;
+  Float_t genWeight, LHEWeight_originalXWGTUP;
+  UInt_t nLHEScaleWeight, nLHEPdfWeight, nPSWeight;
+  Float_t LHEScaleWeight[9], LHEPdfWeight[nLHEPdf_], PSWeight[4];
+  Float_t Pileup_nTrueInt;
+  Int_t Pileup_nPU, PV_npvs, PV_npvsGood;
+  Float_t MET_pt, MET_phi;
+
+  UInt_t nElectron;
+  Float_t Electron_pt[maxLep_], Electron_eta[maxLep_], Electron_phi[maxLep_], Electron_mass[maxLep_];
+  Int_t Electron_charge[maxLep_], Electron_pdgId[maxLep_], Electron_cutBased[maxLep_], Electron_vidNestedWPBitmap[maxLep_];
+  Float_t Electron_pfRelIso03_all[maxLep_], Electron_deltaEtaSC[maxLep_], Electron_eCorr[maxLep_];
+
+  UInt_t nMuon;
+  Float_t Muon_pt[maxLep_], Muon_eta[maxLep_], Muon_phi[maxLep_], Muon_mass[maxLep_], Muon_pfRelIso04_all[maxLep_];
+  Int_t Muon_charge[maxLep_], Muon_pdgId[maxLep_];
+  Bool_t Muon_tightId[maxLep_], Muon_mediumId[maxLep_], Muon_looseId[maxLep_];
+  Bool_t Muon_isGlobal[maxLep_], Muon_isPFcand[maxLep_], Muon_isTracker[maxLep_];
+
+  UInt_t nJet;
+  Float_t Jet_pt[maxJet_], Jet_eta[maxJet_], Jet_phi[maxJet_], Jet_mass[maxJet_];
+  Float_t Jet_btagDeepFlavB[maxJet_], Jet_btagDeepB[maxJet_], Jet_btagCSVV2[maxJet_];
+  Int_t Jet_jetId[maxJet_], Jet_puId[maxJet_], Jet_hadronFlavour[maxJet_], Jet_partonFlavour[maxJet_];
+  std::vector<std::unique_ptr<Float_t[]> > Jet_btagSF_;
+  std::vector<std::string> Jet_btagSFNames_;
+  // jetmetUncertainties: jesTotalUp, jesTotalDown, jerUp, jerDown
+  Float_t Jet_ptVar[4][maxJet_], Jet_massVar[4][maxJet_], MET_ptVar[4], MET_phiVar[4];
+
+  UInt_t nGenPart;
+  Float_t GenPart_pt[maxGen_], GenPart_eta[maxGen_], GenPart_phi[maxGen_], GenPart_mass[maxGen_];
+  Int_t GenPart_pdgId[maxGen_], GenPart_status[maxGen_], GenPart_statusFlags[maxGen_], GenPart_genPartIdxMother[maxGen_];
+
+  void book(TTree* tree);
+  void fillEvent(const unsigned long long iEvent);
+  void fillLeptons();
+  void fillJets();
+  void fillGenParticles();
+  unsigned addGenParticle(const int pdgId, const int status, const int mother, const double pt, const double mass);
+  double randomPt(const double minPt, const double slope) { return minPt+rnd_.Exp(slope); }
+  // Indices of the n objects by decreasing pt, and the reordering of a column of them with it
+  static std::vector<unsigned> ptOrder(const Float_t pt[], const unsigned n);
+  template<typename T> static void permute(T column[], const std::vector<unsigned>& order);
+};
+
+const char* SyntheticNanoAOD::btagSysts_[] = {"jes", "lf", "hf", "hfstats1", "hfstats2", "lfstats1", "lfstats2", "cferr1", "cferr2"};
+
+void SyntheticNanoAOD::book(TTree* tree) {
+  tree->Branch("run", &run, "run/i");
+  tree->Branch("luminosityBlock", &luminosityBlock, "luminosityBlock/i");
+  tree->Branch("event", &event, "event/l");
+
+  tree->Branch("genWeight", &genWeight, "genWeight/F");
+  tree->Branch("LHEWeight_originalXWGTUP", &LHEWeight_originalXWGTUP, "LHEWeight_originalXWGTUP/F");
+  tree->Branch("nLHEScaleWeight", &nLHEScaleWeight, "nLHEScaleWeight/i");
+  tree->Branch("LHEScaleWeight", LHEScaleWeight, "LHEScaleWeight[nLHEScaleWeight]/F");
+  tree->Branch("nLHEPdfWeight", &nLHEPdfWeight, "nLHEPdfWeight/i");
+  tree->Branch("LHEPdfWeight", LHEPdfWeight, "LHEPdfWeight[nLHEPdfWeight]/F");
+  tree->Branch("nPSWeight", &nPSWeight, "nPSWeight/i");
+  tree->Branch("PSWeight", PSWeight, "PSWeight[nPSWeight]/F");
+  tree->Branch("Pileup_nTrueInt", &Pileup_nTrueInt, "Pileup_nTrueInt/F");
+  tree->Branch("Pileup_nPU", &Pileup_nPU, "Pileup_nPU/I");
+  tree->Branch("PV_npvs", &PV_npvs, "PV_npvs/I");
+  tree->Branch("PV_npvsGood", &PV_npvsGood, "PV_npvsGood/I");
+  tree->Branch("MET_pt", &MET_pt, "MET_pt/F");
+  tree->Branch("MET_phi", &MET_phi, "MET_phi/F");
+
+  tree->Branch("nElectron", &nElectron, "nElectron/i");
+  tree->Branch("Electron_pt", Electron_pt, "Electron_pt[nElectron]/F");
+  tree->Branch("Electron_eta", Electron_eta, "Electron_eta[nElectron]/F");
+  tree->Branch("Electron_phi", Electron_phi, "Electron_phi[nElectron]/F");
+  tree->Branch("Electron_mass", Electron_mass, "Electron_mass[nElectron]/F");
+  tree->Branch("Electron_charge", Electron_charge, "Electron_charge[nElectron]/I");
+  tree->Branch("Electron_pdgId", Electron_pdgId, "Electron_pdgId[nElectron]/I");
+  tree->Branch("Electron_pfRelIso03_all", Electron_pfRelIso03_all, "Electron_pfRelIso03_all[nElectron]/F");
+  tree->Branch("Electron_deltaEtaSC", Electron_deltaEtaSC, "Electron_deltaEtaSC[nElectron]/F");
+  tree->Branch("Electron_eCorr", Electron_eCorr, "Electron_eCorr[nElectron]/F");
+  // Same ID in the branch names of the 2016 and 2017 NanoAOD
+  for ( auto name : {"cutBased", "cutBased_Sum16", "cutBased_Fall17_V1"} ) {
+    tree->Branch((std::string("Electron_")+name).c_str(), Electron_cutBased, (std::string("Electron_")+name+"[nElectron]/I").c_str());
+  }
+  for ( auto name : {"vidNestedWPBitmap", "vidNestedWPBitmapSum16"} ) {
+    tree->Branch((std::string("Electron_")+name).c_str(), Electron_vidNestedWPBitmap, (std::string("Electron_")+name+"[nElectron]/I").c_str());
+  }
+
+  tree->Branch("nMuon", &nMuon, "nMuon/i");
+  tree->Branch("Muon_pt", Muon_pt, "Muon_pt[nMuon]/F");
+  tree->Branch("Muon_eta", Muon_eta, "Muon_eta[nMuon]/F");
+  tree->Branch("Muon_phi", Muon_phi, "Muon_phi[nMuon]/F");
+  tree->Branch("Muon_mass", Muon_mass, "Muon_mass[nMuon]/F");
+  tree->Branch("Muon_charge", Muon_charge, "Muon_charge[nMuon]/I");
+  tree->Branch("Muon_pdgId", Muon_pdgId, "Muon_pdgId[nMuon]/I");
+  tree->Branch("Muon_pfRelIso04_all", Muon_pfRelIso04_all, "Muon_pfRelIso04_all[nMuon]/F");
+  tree->Branch("Muon_tightId", Muon_tightId, "Muon_tightId[nMuon]/O");
+  tree->Branch("Muon_mediumId", Muon_mediumId, "Muon_mediumId[nMuon]/O");
+  tree->Branch("Muon_looseId", Muon_looseId, "Muon_looseId[nMuon]/O");
+  tree->Branch("Muon_isGlobal", Muon_isGlobal, "Muon_isGlobal[nMuon]/O");
+  tree->Branch("Muon_isPFcand", Muon_isPFcand, "Muon_isPFcand[nMuon]/O");
+  tree->Branch("Muon_isTracker", Muon_isTracker, "Muon_isTracker[nMuon]/O");
+
+  tree->Branch("nJet", &nJet, "nJet/i");
+  tree->Branch("Jet_pt", Jet_pt, "Jet_pt[nJet]/F");
+  tree->Branch("Jet_eta", Jet_eta, "Jet_eta[nJet]/F");
+  tree->Branch("Jet_phi", Jet_phi, "Jet_phi[nJet]/F");
+  tree->Branch("Jet_mass", Jet_mass, "Jet_mass[nJet]/F");
+  tree->Branch("Jet_btagDeepFlavB", Jet_btagDeepFlavB, "Jet_btagDeepFlavB[nJet]/F");
+  tree->Branch("Jet_btagDeepB", Jet_btagDeepB, "Jet_btagDeepB[nJet]/F");
+  tree->Branch("Jet_btagCSVV2", Jet_btagCSVV2, "Jet_btagCSVV2[nJet]/F");
+  tree->Branch("Jet_jetId", Jet_jetId, "Jet_jetId[nJet]/I");
+  tree->Branch("Jet_puId", Jet_puId, "Jet_puId[nJet]/I");
+  tree->Branch("Jet_hadronFlavour", Jet_hadronFlavour, "Jet_hadronFlavour[nJet]/I");
+  tree->Branch("Jet_partonFlavour", Jet_partonFlavour, "Jet_partonFlavour[nJet]/I");
+  Jet_btagSFNames_ = {"Jet_btagSF_deepjet_shape"};
+  for ( auto syst : btagSysts_ ) {
+    for ( auto dir : {"up", "down"} ) Jet_btagSFNames_.push_back(std::string("Jet_btagSF_deepjet_shape_")+dir+"_"+syst);
+  }
+  Jet_btagSF_.clear();
+  for ( auto& name : Jet_btagSFNames_ ) {
+    Jet_btagSF_.emplace_back(new Float_t[maxJet_]);
+    tree->Branch(name.c_str(), Jet_btagSF_.back().get(), (name+"[nJet]/F").c_str());
+  }
+  if ( doJetVariations_ ) {
+    const std::string varNames[] = {"jesTotalUp", "jesTotalDown", "jerUp", "jerDown"};
+    for ( unsigned k=0; k<4; ++k ) {
+      const std::string& v = varNames[k];
+      tree->Branch(("Jet_pt_"+v).c_str(), Jet_ptVar[k], ("Jet_pt_"+v+"[nJet]/F").c_str());
+      tree->Branch(("Jet_mass_"+v).c_str(), Jet_massVar[k], ("Jet_mass_"+v+"[nJet]/F").c_str());
+      tree->Branch(("MET_pt_"+v).c_str(), &MET_ptVar[k], ("MET_pt_"+v+"/F").c_str());
+      tree->Branch(("MET_phi_"+v).c_str(), &MET_phiVar[k], ("MET_phi_"+v+"/F").c_str());
+    }
+  }
+
+  tree->Branch("nGenPart", &nGenPart, "nGenPart/i");
+  tree->Branch("GenPart_pt", GenPart_pt, "GenPart_pt[nGenPart]/F");
+  tree->Branch("GenPart_eta", GenPart_eta, "GenPart_eta[nGenPart]/F");
+  tree->Branch("GenPart_phi", GenPart_phi, "GenPart_phi[nGenPart]/F");
+  tree->Branch("GenPart_mass", GenPart_mass, "GenPart_mass[nGenPart]/F");
+  tree->Branch("GenPart_pdgId", GenPart_pdgId, "GenPart_pdgId[nGenPart]/I");
+  tree->Branch("GenPart_status", GenPart_status, "GenPart_status[nGenPart]/I");
+  tree->Branch("GenPart_statusFlags", GenPart_statusFlags, "GenPart_statusFlags[nGenPart]/I");
+  tree->Branch("GenPart_genPartIdxMother", GenPart_genPartIdxMother, "GenPart_genPartIdxMother[nGenPart]/I");
+
+  for ( auto& bit : bits_ ) tree->Branch(bit.name.c_str(), &bit.value, (bit.name+"/O").c_str());
+}
+
+std::vector<unsigned> SyntheticNanoAOD::ptOrder(const Float_t pt[], const unsigned n) {
+  std::vector<unsigned> order(n);
+  for ( unsigned i=0; i<n; ++i ) order[i] = i;
+  std::stable_sort(order.begin(), order.end(), [&](const unsigned i, const unsigned j){ return pt[i] > pt[j]; });
+  return order;
+}
+
+template<typename T>
+void SyntheticNanoAOD::permute(T column[], const std::vector<unsigned>& order) {
+  const std::vector<T> values(column, column+order.size());
+  for ( unsigned k=0, n=order.size(); k<n; ++k ) column[k] = values[order[k]];
+}
+
+void SyntheticNanoAOD::fillLeptons() {
+  nElectron = std::min<unsigned>(maxLep_, rnd_.Poisson(meanElectron_));
+  nMuon = std::min<unsigned>(maxLep_, rnd_.Poisson(meanMuon_));
+  // Three good leptons in a fraction of the events: a Z pair of one flavour and one more lepton
+  unsigned nGoodEl = 0, nGoodMu = 0;
+  if ( rnd_.Uniform() < triLeptonFraction_ ) {
+    const bool zToMu = rnd_.Uniform() < 0.5, wToMu = rnd_.Uniform() < 0.5;
+    nGoodMu = (zToMu ? 2 : 0) + (wToMu ? 1 : 0);
+    nGoodEl = 3-nGoodMu;
+    nElectron = std::max(nElectron, nGoodEl);
+    nMuon = std::max(nMuon, nGoodMu);
+  }
+
+  for ( unsigned i=0; i<nElectron; ++i ) {
+    const bool isGood = i < nGoodEl;
+    Electron_pt[i] = isGood ? randomPt(25, 30) : randomPt(5, 10);
+    Electron_eta[i] = rnd_.Uniform(-2.5, 2.5);
+    Electron_phi[i] = rnd_.Uniform(-M_PI, M_PI);
+    Electron_mass[i] = 0.000511;
+    // Opposite charges for the first two good leptons
+    Electron_charge[i] = isGood and i < 2 ? (i == 0 ? 1 : -1) : (rnd_.Uniform() < 0.5 ? 1 : -1);
+    Electron_pdgId[i] = -11*Electron_charge[i];
+    Electron_pfRelIso03_all[i] = isGood ? rnd_.Uniform(0, 0.05) : rnd_.Exp(0.3);
+    Electron_deltaEtaSC[i] = rnd_.Gaus(0, 0.01);
+    Electron_eCorr[i] = rnd_.Gaus(1, 0.02);
+    Electron_cutBased[i] = isGood ? 4 : int(rnd_.Uniform(0, 5));
+    // 10 cuts of 3 bits, all tight for the good electrons
+    int bitmap = 0;
+    for ( unsigned k=0; k<10; ++k ) bitmap |= (isGood ? 4 : int(rnd_.Uniform(0, 5))) << (3*k);
+    Electron_vidNestedWPBitmap[i] = bitmap;
+  }
+  // Sort by pt as in the NanoAOD, all the columns together
+  const std::vector<unsigned> elOrder = ptOrder(Electron_pt, nElectron);
+  permute(Electron_pt, elOrder); permute(Electron_eta, elOrder); permute(Electron_phi, elOrder); permute(Electron_mass, elOrder);
+  permute(Electron_charge, elOrder); permute(Electron_pdgId, elOrder);
+  permute(Electron_cutBased, elOrder); permute(Electron_vidNestedWPBitmap, elOrder);
+  permute(Electron_pfRelIso03_all, elOrder); permute(Electron_deltaEtaSC, elOrder); permute(Electron_eCorr, elOrder);
+
+  for ( unsigned i=0; i<nMuon; ++i ) {
+    const bool isGood = i < nGoodMu;
+    Muon_pt[i] = isGood ? randomPt(25, 30) : randomPt(3, 10);
+    Muon_eta[i] = rnd_.Uniform(-2.4, 2.4);
+    Muon_phi[i] = rnd_.Uniform(-M_PI, M_PI);
+    Muon_mass[i] = 0.1057;
+    Muon_charge[i] = isGood and i < 2 ? (i == 0 ? 1 : -1) : (rnd_.Uniform() < 0.5 ? 1 : -1);
+    Muon_pdgId[i] = -13*Muon_charge[i];
+    Muon_pfRelIso04_all[i] = isGood ? rnd_.Uniform(0, 0.1) : rnd_.Exp(0.3);
+    Muon_tightId[i] = isGood or rnd_.Uniform() < 0.5;
+    Muon_mediumId[i] = Muon_tightId[i] or rnd_.Uniform() < 0.5;
+    Muon_looseId[i] = Muon_mediumId[i] or rnd_.Uniform() < 0.5;
+    Muon_isGlobal[i] = isGood or rnd_.Uniform() < 0.7;
+    Muon_isPFcand[i] = isGood or rnd_.Uniform() < 0.9;
+    Muon_isTracker[i] = isGood or rnd_.Uniform() < 0.9;
+  }
+  const std::vector<unsigned> muOrder = ptOrder(Muon_pt, nMuon);
+  permute(Muon_pt, muOrder); permute(Muon_eta, muOrder); permute(Muon_phi, muOrder); permute(Muon_mass, muOrder);
+  permute(Muon_pfRelIso04_all, muOrder); permute(Muon_charge, muOrder); permute(Muon_pdgId, muOrder);
+  permute(Muon_tightId, muOrder); permute(Muon_mediumId, muOrder); permute(Muon_looseId, muOrder);
+  permute(Muon_isGlobal, muOrder); permute(Muon_isPFcand, muOrder); permute(Muon_isTracker, muOrder);
+}
+
+void SyntheticNanoAOD::fillJets() {
+  nJet = std::min<unsigned>(maxJet_, rnd_.Poisson(meanJet_));
+  double sumPx = 0, sumPy = 0;
+  for ( unsigned i=0; i<nJet; ++i ) {
+    Jet_pt[i] = randomPt(15, 40);
+    Jet_eta[i] = rnd_.Uniform(-4.7, 4.7);
+    Jet_phi[i] = rnd_.Uniform(-M_PI, M_PI);
+    Jet_mass[i] = Jet_pt[i]*rnd_.Uniform(0.05, 0.2);
+    const double u = rnd_.Uniform();
+    Jet_hadronFlavour[i] = u < 0.2 ? 5 : (u < 0.3 ? 4 : 0);
+    Jet_partonFlavour[i] = Jet_hadronFlavour[i] == 0 ? 21 : Jet_hadronFlavour[i];
+    Jet_btagDeepFlavB[i] = Jet_hadronFlavour[i] == 5 ? 1-rnd_.Exp(0.1) : rnd_.Exp(0.05);
+    Jet_btagDeepFlavB[i] = std::max(0.f, std::min(1.f, Jet_btagDeepFlavB[i]));
+    Jet_btagDeepB[i] = Jet_btagDeepFlavB[i];
+    Jet_btagCSVV2[i] = Jet_btagDeepFlavB[i];
+    Jet_jetId[i] = rnd_.Uniform() < 0.95 ? 6 : 0;
+    Jet_puId[i] = rnd_.Uniform() < 0.9 ? 7 : 0;
+    for ( unsigned k=0; k<Jet_btagSF_.size(); ++k ) {
+      Jet_btagSF_[k][i] = rnd_.Gaus(1, k == 0 ? 0.05 : 0.1);
+    }
+    sumPx += Jet_pt[i]*std::cos(Jet_phi[i]);
+    sumPy += Jet_pt[i]*std::sin(Jet_phi[i]);
+  }
+  const std::vector<unsigned> jetOrder = ptOrder(Jet_pt, nJet);
+  permute(Jet_pt, jetOrder); permute(Jet_eta, jetOrder); permute(Jet_phi, jetOrder); permute(Jet_mass, jetOrder);
+  permute(Jet_btagDeepFlavB, jetOrder); permute(Jet_btagDeepB, jetOrder); permute(Jet_btagCSVV2, jetOrder);
+  permute(Jet_jetId, jetOrder); permute(Jet_puId, jetOrder); permute(Jet_hadronFlavour, jetOrder); permute(Jet_partonFlavour, jetOrder);
+  for ( auto& sf : Jet_btagSF_ ) permute(sf.get(), jetOrder);
+  MET_pt = std::hypot(sumPx, sumPy)*rnd_.Uniform(0.1, 0.5)+rnd_.Exp(20);
+  MET_phi = rnd_.Uniform(-M_PI, M_PI);
+
+  if ( !doJetVariations_ ) return;
+  // Up and down shifts of a few percent, the jer ones smear the jets
+  const double shifts[] = {+0.03, -0.03, +0.02, -0.02};
+  for ( unsigned k=0; k<4; ++k ) {
+    for ( unsigned i=0; i<nJet; ++i ) {
+      const double scale = 1+(k < 2 ? shifts[k] : shifts[k]*std::abs(rnd_.Gaus(0, 1)));
+      Jet_ptVar[k][i] = Jet_pt[i]*scale;
+      Jet_massVar[k][i] = Jet_mass[i]*scale;
+    }
+    MET_ptVar[k] = MET_pt*(1-shifts[k]);
+    MET_phiVar[k] = MET_phi;
+  }
+}
+
+unsigned SyntheticNanoAOD::addGenParticle(const int pdgId, const int status, const int mother, const double pt, const double mass) {
+  const unsigned i = nGenPart++;
+  GenPart_pdgId[i] = pdgId;
+  GenPart_status[i] = status;
+  GenPart_statusFlags[i] = status == 1 ? 0x2101 : 0x2100; // isPrompt, fromHardProcess, isLastCopy
+  GenPart_genPartIdxMother[i] = mother;
+  GenPart_pt[i] = pt;
+  GenPart_eta[i] = rnd_.Uniform(-3, 3);
+  GenPart_phi[i] = rnd_.Uniform(-M_PI, M_PI);
+  GenPart_mass[i] = mass;
+  return i;
+}
+
+void SyntheticNanoAOD::fillGenParticles() {
+  // ttbar decay chain: t -> W b, W -> l nu or q q'
+  nGenPart = 0;
+  for ( const int sign : {+1, -1} ) {
+    const unsigned t = addGenParticle(6*sign, 62, -1, randomPt(0, 80), 172.5);
+    const unsigned w = addGenParticle(24*sign, 22, t, randomPt(0, 60), 80.4);
+    addGenParticle(5*sign, 23, t, randomPt(20, 50), 4.8);
+    if ( rnd_.Uniform() < 0.33 ) {
+      const int lepId = rnd_.Uniform() < 0.5 ? 11 : 13;
+      addGenParticle(-lepId*sign, 1, w, randomPt(10, 40), lepId == 11 ? 0.000511 : 0.1057);
+      addGenParticle((lepId+1)*sign, 1, w, randomPt(10, 40), 0);
+    }
+    else {
+      addGenParticle(2*sign, 23, w, randomPt(10, 40), 0);
+      addGenParticle(-1*sign, 23, w, randomPt(10, 40), 0);
+    }
+  }
+  // Radiation and the rest of the event, attached to the earlier particles
+  const unsigned nExtra = std::min<unsigned>(maxGen_-nGenPart, rnd_.Poisson(meanGenPart_));
+  const int ids[] = {21, 1, 2, 3, -1, -2, -3, 22, 211, -211, 111, 130};
+  for ( unsigned k=0; k<nExtra; ++k ) {
+    const int mother = int(rnd_.Uniform(0, nGenPart));
+    addGenParticle(ids[int(rnd_.Uniform(0, 12))], rnd_.Uniform() < 0.5 ? 1 : 71, mother, randomPt(0, 5), 0);
+  }
+}
+
+void SyntheticNanoAOD::fillEvent(const unsigned long long iEvent) {
+  run = run_;
+  luminosityBlock = 1+iEvent/1000;
+  event = iEvent+1;
+
+  genWeight = rnd_.Uniform() < 0.05 ? -1 : 1;
+  LHEWeight_originalXWGTUP = genWeight;
+  nLHEScaleWeight = 9;
+  for ( unsigned i=0; i<9; ++i ) LHEScaleWeight[i] = i == 4 ? 1 : rnd_.Gaus(1, 0.1);
+  nLHEPdfWeight = nLHEPdf_;
+  for ( unsigned i=0; i<nLHEPdf_; ++i ) LHEPdfWeight[i] = rnd_.Gaus(1, 0.02);
+  nPSWeight = 4;
+  for ( unsigned i=0; i<4; ++i ) PSWeight[i] = rnd_.Gaus(1, 0.05);
+  Pileup_nTrueInt = rnd_.Uniform(5, 50);
+  Pileup_nPU = rnd_.Poisson(Pileup_nTrueInt);
+  PV_npvs = std::max(1, int(rnd_.Poisson(0.7*Pileup_nTrueInt)));
+  PV_npvsGood = PV_npvs;
+
+  fillLeptons();
+  fillJets();
+  fillGenParticles();
+  for ( auto& bit : bits_ ) bit.value = rnd_.Uniform() < bit.prob;
+}
+
+long long SyntheticNanoAOD::generate(const std::string fileName, const unsigned nEvents, const unsigned seed, const int compression) {
+  rnd_.SetSeed(seed);
+  TFile* f = TFile::Open(fileName.c_str(), "RECREATE", "", compression);
+  if ( !f or f->IsZombie() ) {
+    std::cout << "ERROR! Cannot create " << fileName << std::endl;
+    return 0;
+  }
+  TTree* tree = new TTree("Events", "Events");
+  book(tree);
+  for ( unsigned long long i=0; i<nEvents; ++i ) {
+    fillEvent(i);
+    tree->Fill();
+  }
+  tree->Write();
+  // Empty Runs and LuminosityBlocks trees, which the postprocessor copies to the output
+  TTree runs("Runs", "Runs"), lumis("LuminosityBlocks", "LuminosityBlocks");
+  runs.Branch("run", &run, "run/i");
+  lumis.Branch("run", &run, "run/i");
+  lumis.Branch("luminosityBlock", &luminosityBlock, "luminosityBlock/i");
+  runs.Fill();
+  runs.Write();
+  lumis.Write();
+  const long long nBytes = f->GetBytesWritten();
+  f->Close();
+  return nBytes;
+}
+
+#endif
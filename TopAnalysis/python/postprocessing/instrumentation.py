@@ -0,0 +1,145 @@
+import ROOT
+ROOT.PyConfig.IgnoreCommandLineOptions = True
+
+import os, time, json
+from array import array
+from bisect import bisect_left, bisect_right
+
+## Opt-in performance instrumentation of the postprocessing chains (--perf of tzwi-postproc).
+##
+## The modules are wrapped by TimedModule in the event loop, which measures the wall time
+## and the number of calls of beginFile/analyze/endFile (and analyzeBatch/fillBatch of the
+## batch protocol) and counts the entries rejected by each module. The event loop adds the
+## latency of the per-event phase of each entry, and at the end of the file the bytes read
+## per input branch are estimated from the baskets overlapping the entries reading them.
+##
+## The results go to a JSON sidecar next to the output file (<output>_perf.json), and with
+## the "hist" option also to perf_* histograms in the output file, which are summed by hadd.
+## tzwi-perf-summary sums the sidecars of a submit directory.
+
+## Event latency bins, 10 per decade from 1us to 10s
+latencyEdges = [10**(k/10.-6) for k in range(71)]
+
+def moduleName(i, m):
+    ## The name of the module behind a batch adapter
+    return "%02d_%s" % (i, getattr(m, '_module', m).__class__.__name__)
+
+class TimedModule(object):
+    ## Proxy of a module, the methods below are measured and everything else is taken from the module.
+    ## Only the methods the module has are set, so the checks like hasattr(m, 'analyzeBatch') are kept
+    timedMethods = ('beginFile', 'endFile', 'analyze', 'analyzeBatch', 'fillBatch')
+
+    def __init__(self, module, name):
+        object.__setattr__(self, '_module', module)
+        self.name = name
+        self.calls = dict((x, 0) for x in self.timedMethods if hasattr(module, x))
+        self.times = dict((x, 0.) for x in self.calls)
+        self.processed, self.rejected = 0, 0
+        for method in self.calls:
+            setattr(self, method, self._timed(method, getattr(module, method)))
+    def __getattr__(self, name):
+        if name == '_module': raise AttributeError(name)
+        return getattr(self._module, name)
+    def _timed(self, method, func):
+        def timed(*args):
+            t0 = time.time()
+            ret = func(*args)
+            self.times[method] += time.time()-t0
+            self.calls[method] += 1
+            if method == 'analyze':
+                self.processed += 1
+                if not ret: self.rejected += 1
+            elif method == 'analyzeBatch':
+                self.processed += len(args[0])
+                if ret is not None: self.rejected += sum(1 for keep in ret if not keep)
+            return ret
+        return timed
+
+class PerfStats(object):
+    def __init__(self, options):
+        self.options = options.split(',') if options else ["json"]
+        self.modules = []
+        self.latency = [0]*(len(latencyEdges)+1) ## with the under/overflows
+        self.bytesRead0 = 0
+
+    def instrument(self, modules, prefix=""):
+        timed = [TimedModule(m, prefix+moduleName(len(self.modules)+i, m)) for i, m in enumerate(modules)]
+        self.modules.extend(timed)
+        return timed
+
+    def begin(self, inputFile):
+        self.bytesRead0 = inputFile.GetBytesRead()
+
+    def fillLatency(self, dt):
+        self.latency[bisect_right(latencyEdges, dt)] += 1
+
+    def branchBytes(self, inputTree, filterBranches, eventRange, filterPassed):
+        ## Compressed bytes of the baskets overlapping the entries read by each active branch:
+        ## all the entries for the filter branches, the ones passing the filter phase for the others
+        entries, passed = sorted(eventRange), sorted(filterPassed)
+        if len(filterBranches) == 0: passed = entries
+        result = {}
+        for branch in inputTree.GetListOfBranches():
+            name = branch.GetName()
+            if not inputTree.GetBranchStatus(name): continue
+            read = entries if name in filterBranches else passed
+            nBaskets = branch.GetWriteBasket()
+            basketEntry, basketBytes = branch.GetBasketEntry(), branch.GetBasketBytes()
+            nBytes = 0
+            for i in range(nBaskets):
+                begin = basketEntry[i]
+                end = basketEntry[i+1] if i+1 < nBaskets else branch.GetEntries()
+                k = bisect_left(read, begin)
+                if k < len(read) and read[k] < end: nBytes += basketBytes[i]
+            if nBytes > 0: result[name] = nBytes
+        return result
+
+    def toDict(self, inputFile, outputFile, inputTree, entries, tTot, filterBranches, eventRange, filterPassed):
+        modules = []
+        for m in self.modules:
+            modules.append({"name":m.name, "processed":m.processed, "rejected":m.rejected,
+                            "methods":dict((x, [m.calls[x], m.times[x]]) for x in m.calls)})
+        return {
+            "input":inputFile.GetName(), "output":outputFile.GetName() if outputFile else "",
+            "entries":entries, "wallTime":tTot, "bytesRead":inputFile.GetBytesRead()-self.bytesRead0,
+            "modules":modules,
+            "latency":{"edges":latencyEdges, "counts":self.latency},
+            "branchBytes":self.branchBytes(inputTree, filterBranches, eventRange, filterPassed),
+        }
+
+    def writeHistograms(self, outputFile, stats):
+        ## Bins are labelled by module (and method), so the histograms of the jobs can be summed
+        prevdir = ROOT.gDirectory
+        outputFile.cd()
+        keys = [(m["name"], x) for m in stats["modules"] for x in sorted(m["methods"])]
+        hTime = ROOT.TH1D("perf_moduleTime", "Wall time per module;;seconds", len(keys), 0, len(keys))
+        hCalls = ROOT.TH1D("perf_moduleCalls", "Calls per module;;calls", len(keys), 0, len(keys))
+        for i, (name, method) in enumerate(keys):
+            m = [x for x in stats["modules"] if x["name"] == name][0]
+            for h, value in ((hCalls, m["methods"][method][0]), (hTime, m["methods"][method][1])):
+                h.GetXaxis().SetBinLabel(i+1, "%s::%s" % (name, method))
+                h.SetBinContent(i+1, value)
+        nModules = len(stats["modules"])
+        hRejected = ROOT.TH1D("perf_rejected", "Rejected entries per module;;entries", nModules, 0, nModules)
+        for i, m in enumerate(stats["modules"]):
+            hRejected.GetXaxis().SetBinLabel(i+1, m["name"])
+            hRejected.SetBinContent(i+1, m["rejected"])
+        hLatency = ROOT.TH1D("perf_eventLatency", "Per-event latency;seconds;entries", len(latencyEdges)-1, array('d', latencyEdges))
+        for i, n in enumerate(self.latency): hLatency.SetBinContent(i, n)
+        branches = sorted(stats["branchBytes"])
+        hBytes = ROOT.TH1D("perf_branchBytes", "Bytes read per branch;;bytes", max(1, len(branches)), 0, max(1, len(branches)))
+        for i, name in enumerate(branches):
+            hBytes.GetXaxis().SetBinLabel(i+1, name)
+            hBytes.SetBinContent(i+1, stats["branchBytes"][name])
+        for h in (hTime, hCalls, hRejected, hLatency, hBytes): h.Write()
+        prevdir.cd()
+
+    def write(self, inputFile, outputFile, inputTree, entries, tTot, filterBranches=set(), eventRange=[], filterPassed=[]):
+        stats = self.toDict(inputFile, outputFile, inputTree, entries, tTot, filterBranches, eventRange, filterPassed)
+        if outputFile:
+            fName = outputFile.GetName().replace(".root", "_perf.json")
+        else:
+            fName = os.path.basename(inputFile.GetName()).replace(".root", "_perf.json")
+        with open(fName, "w") as f: json.dump(stats, f, indent=1)
+        if "hist" in self.options and outputFile: self.writeHistograms(outputFile, stats)
+        print "Performance summary written to %s" % fName
@@ -0,0 +1,178 @@
+import ROOT
+ROOT.PyConfig.IgnoreCommandLineOptions = True
+
+import sys, time
+from array import array
+from PhysicsTools.NanoAODTools.postprocessing.framework.datamodel import Event
+from PhysicsTools.NanoAODTools.postprocessing.framework.treeReaderArrayTools import clearExtraBranches
+from TZWi.TopAnalysis.postprocessing.batchEventLoop import wrapPerEntryModules, splitBatchModules, splitFilterModules, runBatchModules, initFilterPhase, reportFilterPhase
+from TZWi.TopAnalysis.postprocessing.outputProfile import tuneBaskets
+
+## Event loop running several channels (e.g. the FCNC modes) in one pass over the input.
+##
+## The head modules (count histograms, flags, HLT, preselection) do not depend on
+## the channel, they run once per entry and their output branches are booked and
+## filled in the output trees of all the channels through MultiOutput.
+## Each channel has its own module chain (selection, cut flow, KinReco...) and its
+## own output file, and runs on the entries passing the head modules.
+## The input branches are read only once per entry since the channels share the readers.
+##
+## The batch protocol of the batchEventLoop is supported: the leading batch modules
+## of the head run block by block, then the leading batch modules of each channel
+## on the survivors, if all the head modules are batch-capable.
+## perf enables the instrumentation as in the batchEventLoop, the channel modules are
+## prefixed by the channel name and the results go next to the output of the first channel.
+
+## Attributes put on the input tree by the modules of a channel for the modules after them,
+## they are switched to the ones of the channel being processed
+channelTreeAttributes = ['b_out', '_fcncTriLepton']
+
+class MultiOutput(object):
+    ## Output branches of the head modules, booked and filled in all the output trees
+    def __init__(self, outputs):
+        self._outputs = outputs
+    def branch(self, *args, **kwargs):
+        for out in self._outputs: out.branch(*args, **kwargs)
+    def fillBranch(self, name, val):
+        for out in self._outputs: out.fillBranch(name, val)
+
+class Channel(object):
+    def __init__(self, name, modules, outputFile, wrappedOutputTree):
+        self.name = name
+        self.modules = modules
+        self.outputFile = outputFile
+        self.out = wrappedOutputTree
+        self.treeAttributes = {}
+        self.nAccepted = 0
+    def saveTreeAttributes(self, tree):
+        self.treeAttributes = dict((name, getattr(tree, name)) for name in channelTreeAttributes if hasattr(tree, name))
+    def restoreTreeAttributes(self, tree):
+        for name, value in self.treeAttributes.iteritems(): setattr(tree, name, value)
+
+def copyNewObjects(fromFile, toFiles, keysBefore):
+    ## Objects written by the head modules in the first output file (e.g. the count histograms)
+    prevdir = ROOT.gDirectory
+    for key in fromFile.GetListOfKeys():
+        if key.GetName() in keysBefore: continue
+        obj = key.ReadObj()
+        for f in toFiles:
+            f.cd()
+            obj.Write(key.GetName())
+    prevdir.cd()
+
+def multiChannelEventLoop(headModules, channels, inputFile, inputTree,
+                          maxEvents=-1, eventRange=None, progress=(10000, sys.stdout),
+                          firstEntry=0, batchSize=1000, perf=None):
+    headModules = wrapPerEntryModules(headModules)
+    stats = None
+    if perf:
+        from TZWi.TopAnalysis.postprocessing.instrumentation import PerfStats
+        stats = PerfStats(perf)
+        stats.begin(inputFile)
+        headModules = stats.instrument(headModules)
+        for c in channels: c.modules = stats.instrument(c.modules, c.name+"/")
+    headBatch, headEvent = splitBatchModules(headModules)
+    if batchSize <= 0: headBatch, headEvent = [], headModules
+
+    ## The head modules write their other outputs in the file of the first channel, copied to the others at the end
+    headOutput = MultiOutput([c.out for c in channels])
+    for m in headModules:
+        m.beginFile(inputFile, channels[0].outputFile, inputTree, headOutput)
+    for c in channels:
+        for m in c.modules:
+            m.beginFile(inputFile, c.outputFile, inputTree, c.out)
+        c.saveTreeAttributes(inputTree)
+        c.batchModules, c.eventModules = splitBatchModules(c.modules)
+        if batchSize <= 0 or len(headEvent) > 0: c.batchModules, c.eventModules = [], c.modules
+    filterModules, otherHeadBatch = splitFilterModules(headBatch)
+    filterBranches = initFilterPhase(inputTree, filterModules)
+
+    if eventRange is None: eventRange = xrange(firstEntry, inputTree.entries)
+    eventRange = list(eventRange)
+    if maxEvents > 0: eventRange = eventRange[:maxEvents]
+    entries = len(eventRange)
+    for c in channels: tuneBaskets(c.out._tree, entries)
+
+    t0 = time.time()
+    tlast, nlast = t0, 0
+    doneEvents = 0
+    filterPassed = array('l')
+    for first in range(0, entries, max(batchSize, 1)):
+        block = eventRange[first:first+max(batchSize, 1)]
+
+        ## Batch phase of the head, then of each channel on the survivors
+        headCalls = []
+        inputTree._ttreereader._isClean = False
+        alive = runBatchModules(filterModules, array('l', block), headCalls)
+        filterPassed.extend(alive)
+        alive = runBatchModules(otherHeadBatch, alive, headCalls)
+        survivors = set()
+        for c in channels:
+            c.restoreTreeAttributes(inputTree)
+            c.calls = []
+            c.alive = set(runBatchModules(c.batchModules, alive, c.calls))
+            c.positions = [dict((e, k) for k, e in enumerate(entries_)) for m, entries_ in c.calls]
+            survivors.update(c.alive)
+        ## The readers were moved behind the back of the python layer, let it know where they are
+        ## so that the readers made later and gotoEntry of the first survivor start from the right entry
+        inputTree.entry = inputTree._ttreereader.GetCurrentEntry()
+
+        ## Per-event phase for the entries surviving in any of the channels
+        doneEvents += len(block)
+        headPositions = [dict((e, k) for k, e in enumerate(entries_)) for m, entries_ in headCalls]
+        for i in sorted(survivors):
+            if stats: tEvent = time.time()
+            e = Event(inputTree, i)
+            clearExtraBranches(inputTree)
+            for (m, entries_), pos in zip(headCalls, headPositions):
+                if hasattr(m, 'fillBatch'): m.fillBatch(e, pos[i])
+            ret = True
+            for m in headEvent:
+                ret = m.analyze(e)
+                if not ret: break
+            if not ret:
+                if stats: stats.fillLatency(time.time()-tEvent)
+                continue
+
+            for c in channels:
+                if i not in c.alive: continue
+                c.restoreTreeAttributes(inputTree)
+                for (m, entries_), pos in zip(c.calls, c.positions):
+                    if hasattr(m, 'fillBatch'): m.fillBatch(e, pos[i])
+                ret = True
+                for m in c.eventModules:
+                    ret = m.analyze(e)
+                    if not ret: break
+                if not ret: continue
+                c.nAccepted += 1
+                c.out.fill()
+            if stats: stats.fillLatency(time.time()-tEvent)
+
+        if progress and doneEvents - nlast >= progress[0]:
+            t1 = time.time()
+            progress[1].write("Processed %8d/%8d entries, %5.2f%% (elapsed time %7.1fs, curr speed %8.3f kHz, avg speed %8.3f kHz), accepted %s\n" % (
+                doneEvents, entries, doneEvents / (0.01 * entries),
+                t1 - t0, (doneEvents - nlast) / (1000. * (t1 - tlast)), doneEvents / (1000. * (t1 - t0)),
+                " ".join("%s:%d" % (c.name, c.nAccepted) for c in channels)))
+            tlast, nlast = t1, doneEvents
+
+    keysBefore = set(key.GetName() for key in channels[0].outputFile.GetListOfKeys())
+    for m in headModules:
+        m.endFile(inputFile, channels[0].outputFile, inputTree, headOutput)
+    copyNewObjects(channels[0].outputFile, [c.outputFile for c in channels[1:]], keysBefore)
+    for c in channels:
+        c.restoreTreeAttributes(inputTree)
+        for m in c.modules:
+            m.endFile(inputFile, c.outputFile, inputTree, c.out)
+
+    tTot = time.time() - t0
+    if progress and tTot > 0:
+        progress[1].write("Multi-channel event loop (batch size %d, %d head modules, %d channels): %d entries in %.1fs, %.1f events/s\n" % (
+            batchSize, len(headModules), len(channels), doneEvents, tTot, doneEvents/tTot))
+        for c in channels:
+            progress[1].write("  %-10s accepted %8d/%8d events\n" % (c.name, c.nAccepted, doneEvents))
+    if progress and len(filterModules) > 0:
+        reportFilterPhase(progress[1], inputTree, filterModules, filterBranches, eventRange, filterPassed)
+    if stats:
+        stats.write(inputFile, channels[0].outputFile, inputTree, doneEvents, tTot, filterBranches, eventRange, filterPassed)
+    return (doneEvents, [c.nAccepted for c in channels], tTot)
@@ -0,0 +1,56 @@
+## Output profiles of the reco ntuples, selected by --profile of tzwi-postproc ($TZWI_OUTPUT_PROFILE).
+##
+## default       the output as before: int/unsigned codes and counters, full floats, LZMA:9 of nano_postproc.py
+## compact       narrow integer types for the codes and counters (pdgId, Z_charge, GoodLeptonCode in Char_t,
+##               nGoodJet, nBjet, KinTop_status, MVAinput_Status, CutStep... in UChar_t), LZ4 compression
+##               for the intermediate ntuples and baskets sized to hold a cluster of entries
+## compactLossy  compact, with the floats of the workers rounded to 12 bits of mantissa (relative precision 1.2e-4)
+##
+## The C++ workers book their outputs through OutputProfile (interface/OutputProfile.h), which copies the
+## values of each entry to the narrow buffers, so the values seen by the next modules are unchanged.
+## The readers of the ntuples should not assume the types of these branches (TTree::Draw and formulas are fine).
+import os
+
+profiles = {
+    "default":      {"narrowInts":False, "floatBits":0,  "compression":None,    "clusterEntries":0},
+    "compact":      {"narrowInts":True,  "floatBits":0,  "compression":"LZ4:4", "clusterEntries":20000},
+    "compactLossy": {"narrowInts":True,  "floatBits":12, "compression":"LZ4:4", "clusterEntries":20000},
+}
+## Typical multiplicity of the variable size arrays, for the basket sizes
+typicalArraySize = 4
+
+def current():
+    name = os.getenv("TZWI_OUTPUT_PROFILE", "default")
+    if name not in profiles:
+        raise KeyError("Unknown output profile %s, choose one of %s" % (name, ", ".join(sorted(profiles))))
+    return profiles[name]
+
+def select(name):
+    ## Set in the environment, so that the worker processes and the modules follow it
+    if name not in profiles:
+        raise KeyError("Unknown output profile %s, choose one of %s" % (name, ", ".join(sorted(profiles))))
+    os.environ["TZWI_OUTPUT_PROFILE"] = name
+    return profiles[name]
+
+def configureWorker(worker):
+    p = current()
+    worker.setOutputProfile(p["narrowInts"], p["floatBits"])
+
+def intType(default, narrow):
+    ## Branch type of the python modules, e.g. self.out.branch("CutStep", intType("i", "b"))
+    return narrow if current()["narrowInts"] else default
+
+def tuneBaskets(tree, nEntries):
+    ## One basket per branch and per cluster of entries, with at most clusterEntries entries per cluster.
+    ## To be called once all the output branches are booked, before the first entry is filled
+    clusterEntries = current()["clusterEntries"]
+    if clusterEntries <= 0 or not tree: return
+    cluster = max(1, min(clusterEntries, nEntries))
+    tree.SetAutoFlush(cluster)
+    for branch in tree.GetListOfBranches():
+        nBytes = 0
+        for leaf in branch.GetListOfLeaves():
+            n = typicalArraySize if leaf.GetLeafCount() else leaf.GetLenStatic()
+            nBytes += leaf.GetLenType()*n
+        ## Between 512 bytes and 1 MB
+        branch.SetBasketSize(max(512, min(nBytes*cluster+100, 1024*1024)))
@@ -0,0 +1,138 @@
+import ROOT
+ROOT.PyConfig.IgnoreCommandLineOptions = True
+
+import sys, os
+from multiprocessing import Pool
+
+## Entry-range parallelism of a postprocessing job.
+##
+## Each input file is split into contiguous entry ranges, which are processed by a pool
+## of worker processes with the usual --first-entry/-N options and a "_partNNN" postfix.
+## The parts are merged back per input file in the entry order, so the merged output
+## does not depend on the scheduling. Histograms (e.g. nEvents, nEventsGenWeighted of
+## the countHistogramsModule) are summed, the other trees (Runs, LuminosityBlocks...)
+## and objects are taken from the first part.
+## The modules carrying values over from the previous entry (the default fcncMVAinput)
+## start each part from scratch, their outputs can differ from a serial run at the
+## beginning of the parts.
+
+## nano_postproc.py options taking values, the others are flags
+valueOptions = {
+    '-s':1, '--postfix':1, '-J':1, '--json':1, '-c':1, '--cut':1,
+    '-b':1, '--branch-selection':1, '--bi':1, '--branch-selection-input':1, '--bo':1, '--branch-selection-output':1,
+    '-I':2, '--import':2, '-z':1, '--compression':1, '-N':1, '--max-entries':1, '--first-entry':1,
+    '--haddFileName':1, '--histFile':1, '--histDirName':1,
+}
+eventTrees = ("Events", "Friends")
+
+def splitArgs(args, valueOptions=valueOptions):
+    ## Split the command line into the options and the positional arguments (output directory, input files)
+    options, positional = [], []
+    args = list(args)
+    while len(args) > 0:
+        a = args.pop(0)
+        if a in valueOptions:
+            options.append(a)
+            for i in range(valueOptions[a]): options.append(args.pop(0))
+        else:
+            (options if a.startswith('-') else positional).append(a)
+    return options, positional
+
+def getOption(options, names, default=None):
+    for i, a in enumerate(options):
+        if a in names: return options[i+1]
+    return default
+
+def removeOption(options, names, valueOptions=valueOptions):
+    result = []
+    i = 0
+    while i < len(options):
+        n = 1+valueOptions.get(options[i], 0)
+        if options[i] not in names: result.extend(options[i:i+n])
+        i += n
+    return result
+
+def preloadModules(options, mode=None):
+    ## Instantiate the -I modules once, so that the C++ workers are compiled and loaded before the fork
+    from importlib import import_module
+    for i, a in enumerate(options):
+        if a not in ('-I', '--import'): continue
+        mod = import_module(options[i+1])
+        for name in options[i+2].split(","):
+            if mode != None: name = name.format(mode=mode)
+            if hasattr(mod, name) and type(getattr(mod, name)) != list: getattr(mod, name)()
+
+def splitEntryRanges(inputFiles, nWorkers):
+    ## [(input file, part index, first entry, number of entries)], ranges of each file are balanced
+    ranges = []
+    for fName in inputFiles:
+        f = ROOT.TFile.Open(fName)
+        if not f or f.IsZombie(): raise IOError("Cannot open %s" % fName)
+        tree = f.Get("Events")
+        if not tree: tree = f.Get("Friends")
+        nEntries = tree.GetEntries()
+        f.Close()
+
+        nParts = max(1, min(nWorkers, nEntries))
+        for k in range(nParts):
+            first, last = nEntries*k/nParts, nEntries*(k+1)/nParts
+            ranges.append((fName, k, first, last-first))
+    return ranges
+
+def partFileName(outDir, inputFile, postfix, k):
+    return os.path.join(outDir, os.path.basename(inputFile).replace(".root", "%s_part%03d.root" % (postfix, k)))
+
+def runParallel(run, jobs, nWorkers):
+    ## run(job) is called in the worker processes, which are forked after the libraries are loaded
+    ## and reused for the next jobs. Returns the list of the return values in the order of the jobs
+    pool = Pool(processes=nWorkers)
+    try:
+        results = pool.map(run, jobs, 1)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+def mergeParts(outFileName, partFileNames):
+    fParts = [ROOT.TFile.Open(x) for x in partFileNames]
+    if any(not f or f.IsZombie() for f in fParts): raise IOError("Missing part of %s" % outFileName)
+
+    fOut = ROOT.TFile.Open(outFileName, "RECREATE", "", fParts[0].GetCompressionSettings())
+    names = set()
+    for key in fParts[0].GetListOfKeys():
+        name = key.GetName()
+        if name in names: continue ## Older cycles of the same object
+        names.add(name)
+        obj = key.ReadObj()
+        fOut.cd()
+        if obj.InheritsFrom("TTree") and name in eventTrees:
+            chain = ROOT.TChain(name)
+            for x in partFileNames: chain.Add(x)
+            tree = chain.CloneTree(-1, "fast")
+            tree.Write()
+        elif obj.InheritsFrom("TTree"):
+            tree = obj.CloneTree(-1, "fast")
+            tree.Write()
+        elif obj.InheritsFrom("TH1"):
+            h = obj.Clone()
+            h.SetDirectory(fOut)
+            for f in fParts[1:]:
+                hPart = f.Get(name)
+                if hPart: h.Add(hPart)
+            h.Write()
+        else:
+            obj.Write(name)
+    fOut.Close()
+    for f in fParts: f.Close()
+
+def mergeAll(outDirs, inputFiles, postfix, ranges):
+    ## Merge the parts of all the input files, and remove the parts
+    nParts = {}
+    for fName, k, first, n in ranges: nParts[fName] = max(nParts.get(fName, 0), k+1)
+    for outDir in outDirs:
+        for fName in inputFiles:
+            parts = [partFileName(outDir, fName, postfix, k) for k in range(nParts[fName])]
+            outFileName = os.path.join(outDir, os.path.basename(fName).replace(".root", postfix+".root"))
+            mergeParts(outFileName, parts)
+            for x in parts: os.remove(x)
+            print "Merged %d parts to %s" % (len(parts), outFileName)
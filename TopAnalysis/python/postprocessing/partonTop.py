@@ -4,6 +4,7 @@ ROOT.PyConfig.IgnoreCommandLineOptions = True
 import os
 from PhysicsTools.NanoAODTools.postprocessing.framework.datamodel import Collection
 from PhysicsTools.NanoAODTools.postprocessing.framework.eventloop import Module
+import TZWi.TopAnalysis.postprocessing.workerLibrary as workerLibrary
 
 class PartonTop(Module, object):
     def __init__(self, *args, **kwargs):
@@ -11,16 +12,7 @@ class PartonTop(Module, object):
         self.mode = kwargs.get("mode")
         self.algo = kwargs.get("algo")
 
-        if "/PartonTop_cc.so" not in  ROOT.gSystem.GetLibraries():
-            print "Load C++ PartonTop worker module"
-            base = os.getenv("NANOAODTOOLS_BASE")
-            if base:
-                ROOT.gROOT.ProcessLine(".L %s/src/PartonTopCppWorker.cc+O" % base)
-            else:
-                base = "%s/src/TZWi/TopAnalysis"%os.getenv("CMSSW_BASE")
-                ROOT.gSystem.Load("libPhysicsToolsNanoAODTools.so")
-                ROOT.gSystem.Load("libTZWiTopAnalysis.so")
-                ROOT.gROOT.ProcessLine(".L %s/interface/PartonTopCppWorker.h" % base)
+        workerLibrary.load("PartonTopCppWorker")
         pass
     def beginJob(self):
         self.worker = ROOT.PartonTopCppWorker()
@@ -0,0 +1,54 @@
+## Scale factor tables merged over the data taking eras (see helpers/SFTable.cc).
+##
+## The merged tables are cached on disk by the hash of the input histogram files,
+## the histogram names and the era weights, so that the merging is done only once.
+## The cache directory is $TZWI_CACHE_DIR/sftables, $CMSSW_BASE/tmp/tzwi/sftables by default.
+## The SFTable class comes with the LeptonEfficiencyCorrector helper, which has to be loaded before.
+import ROOT
+import os
+import hashlib
+import yaml
+
+def cacheDir():
+    base = os.getenv("TZWI_CACHE_DIR")
+    if not base: base = "%s/tmp/tzwi" % os.getenv("CMSSW_BASE")
+    return os.path.join(base, "sftables")
+
+def eraWeights(sfSetName, eraNames):
+    ## Luminosity fractions of the eras, from data/leptonSF/eraLumi.yaml
+    base = "%s/src/TZWi/TopAnalysis"%os.getenv("CMSSW_BASE")
+    lumis = yaml.load(open(base+"/data/leptonSF/eraLumi.yaml"))[sfSetName]
+    lumiSum = sum(lumis[x] for x in eraNames)
+    return [float(lumis[x])/lumiSum for x in eraNames]
+
+def sfTable(eras):
+    """eras: list of (files, histograms, weight), the SF of an era is the product of its histograms"""
+    h = hashlib.sha1("SFTable-v1")
+    for files, histos, weight in eras:
+        for f, hName in zip(files, histos):
+            h.update(hashlib.sha1(open(str(f), 'rb').read()).hexdigest())
+            h.update(str(hName))
+        h.update(repr(float(weight)))
+    cacheFile = os.path.join(cacheDir(), h.hexdigest()+".sft")
+
+    table = ROOT.SFTable()
+    if os.path.exists(cacheFile) and table.load(cacheFile):
+        print "Loaded SF table %s" % cacheFile
+        return table
+
+    for files, histos, weight in eras:
+        vFiles, vHistos = ROOT.std.vector(str)(), ROOT.std.vector(str)()
+        for f, hName in zip(files, histos):
+            vFiles.push_back(str(f))
+            vHistos.push_back(str(hName))
+        table.addEra(vFiles, vHistos, weight)
+    table.build()
+
+    ## Write to a temporary file first, the jobs running together can share the cache
+    if not os.path.exists(cacheDir()):
+        try: os.makedirs(cacheDir())
+        except OSError: pass
+    tmpFile = "%s.%d" % (cacheFile, os.getpid())
+    if table.save(tmpFile): os.rename(tmpFile, cacheFile)
+    print "Built SF table %s" % cacheFile
+    return table
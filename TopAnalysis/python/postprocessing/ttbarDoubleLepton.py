@@ -4,6 +4,8 @@ ROOT.PyConfig.IgnoreCommandLineOptions = True
 import os
 from PhysicsTools.NanoAODTools.postprocessing.framework.datamodel import Collection
 from PhysicsTools.NanoAODTools.postprocessing.framework.eventloop import Module
+import TZWi.TopAnalysis.postprocessing.workerLibrary as workerLibrary
+from TZWi.TopAnalysis.postprocessing.WorkerOutput import WorkerOutput
 
 class TTbarDoubleLepton(Module, object):
     def __init__(self, *args, **kwargs):
@@ -11,16 +13,7 @@ class TTbarDoubleLepton(Module, object):
         self.mode = kwargs.get("mode")
         self.eleIdName = kwargs.get("eleId") if "eleId" in kwargs else "cutBased"
 
-        if "/TTbarDoubleLeptonCppWorker_cc.so" not in  ROOT.gSystem.GetLibraries():
-            print "Load C++ TTbarDoubleLepton worker module"
-            base = os.getenv("NANOAODTOOLS_BASE")
-            if base:
-                ROOT.gROOT.ProcessLine(".L %s/src/TTbarDoubleLeptonCppWorker.cc+O" % base)
-            else:
-                base = "%s/src/TZWi/TopAnalysis"%os.getenv("CMSSW_BASE")
-                ROOT.gSystem.Load("libPhysicsToolsNanoAODTools.so")
-                ROOT.gSystem.Load("libTZWiTopAnalysis.so")
-                ROOT.gROOT.ProcessLine(".L %s/interface/TTbarDoubleLeptonCppWorker.h" % base)
+        workerLibrary.load("TTbarDoubleLeptonCppWorker")
         pass
     def beginJob(self):
         self.worker = ROOT.TTbarDoubleLeptonCppWorker(self.mode)
@@ -29,19 +22,9 @@ class TTbarDoubleLepton(Module, object):
         pass
     def beginFile(self, inputFile, outputFile, inputTree, wrappedOutputTree):
         self.out = wrappedOutputTree
-        for objName in ["Lepton1", "Lepton2", "Z"]:
-            for varName in ["pt", "eta", "phi", "mass"]:
-                self.out.branch("%s_%s" % (objName, varName), "F")
-        self.out.branch("MET_pt", "F")
-        self.out.branch("MET_phi", "F")
-        self.out.branch("Lepton1_pdgId", "I")
-        self.out.branch("Lepton2_pdgId", "I")
-        self.out.branch("Z_charge", "I")
-        #self.out.branch("nGoodJet", "i")
-        self.out.branch("GoodJet_index", "i", lenVar="nGoodJet")
-        for varName in ["pt", "eta", "phi", "mass", "CSVv2"]:
-            self.out.branch("GoodJet_%s" % varName, "F", lenVar="nGoodJet")
-        self.out.branch("nBjet", "i")
+        ## The worker owns the output buffers and fills the branches by itself
+        self.worker.initOutput(self.out._tree)
+        inputTree.b_out = WorkerOutput(self.worker)
 
         self.initReaders(inputTree)
         pass
@@ -87,18 +70,6 @@ class TTbarDoubleLepton(Module, object):
             self.initReaders(event._tree)
         self.worker.analyze()
 
-        for objName in ["Lepton1", "Lepton2", "Z", "GoodJet"]:
-            for varName in ["pt", "eta", "phi", "mass"]:
-                setattr(event._tree, "b_out_%s_%s" % (objName, varName), getattr(self.worker, 'get_%s_%s' % (objName, varName))())
-                self.out.fillBranch("%s_%s" % (objName, varName), getattr(event._tree, 'b_out_%s_%s' % (objName, varName)))
-        for varName in ["MET_pt", "MET_phi", "Lepton1_pdgId", "Lepton2_pdgId", "Z_charge",
-                        #"nGoodJet", ## We skip for this nGoodJet, which have to be done by the framework
-                        "GoodJet_CSVv2", "GoodJet_index", "nBjet"]:
-            setattr(event._tree, "b_out_%s" % (varName), getattr(self.worker, 'get_%s' % (varName))())
-            self.out.fillBranch(varName, getattr(event._tree, "b_out_%s" % varName))
-        ## Special care for nGoodJet, because we still want to use this variable from the next postproc.
-        setattr(event._tree, "b_out_nGoodJet", self.worker.get_nGoodJet())
-
         return True
 
 ttbar_DoubleLepton = lambda : TTbarDoubleLepton(mode="Auto")
@@ -25,16 +25,16 @@ class TTbarDoubleLeptonCutFlow(Module, object):
     def analyze(self, event):
         cutStep = 0
         while True:
-            if event._tree.b_out_Z_charge != 0 or event._tree.b_out_Z_mass < 20 or\
-               event._tree.b_out_Lepton1_pt < 25 or event._tree.b_out_Lepton2_pt < 20: break
+            if event._tree.b_out.Z_charge != 0 or event._tree.b_out.Z_mass < 20 or\
+               event._tree.b_out.Lepton1_pt < 25 or event._tree.b_out.Lepton2_pt < 20: break
             cutStep += 1
-            if self.doZVetoCut and ((76 < event._tree.b_out_Z_mass) and (event._tree.b_out_Z_mass < 106)): break
+            if self.doZVetoCut and ((76 < event._tree.b_out.Z_mass) and (event._tree.b_out.Z_mass < 106)): break
             cutStep += 1
-            if self.doMETCut and event._tree.b_out_MET_pt < 40: break
+            if self.doMETCut and event._tree.b_out.MET_pt < 40: break
             cutStep += 1
-            if event._tree.b_out_nGoodJet < 4: break
+            if event._tree.b_out.nGoodJet < 4: break
             cutStep += 1
-            nBjet = event._tree.b_out_nBjet
+            nBjet = event._tree.b_out.nBjet
             if nBjet < 1: break
             cutStep += 1
             if nBjet < 2: break
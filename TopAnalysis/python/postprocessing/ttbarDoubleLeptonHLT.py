@@ -14,11 +14,14 @@ for channel in ['MuEl', 'MuMu', 'ElEl']:
         for e in "BCDEFG":
             vars()["hlt_Run2016%s_%s" % (e, dataset)] = lambda x=dataset, f=setFile: CombineHLT(fileName=f, hltSet="Run2016BG.%s" % x, doFilter=True)
         vars()["hlt_Run2016H_%s" % dataset] = lambda x=dataset, f=setFile: CombineHLT(fileName=f, hltSet="Run2016H.%s" % x, doFilter=True)
+        ## Any mixture of the eras, the trigger set is chosen by the run number
+        vars()["hlt_Run2016_%s" % dataset] = lambda x=dataset, f=setFile: CombineHLT(fileName=f, hltSet="Run2016.%s" % x, doFilter=True)
 
     for dataset in ['SingleMuon', 'SingleElectron']:
         for e in "BCDEFG":
             vars()["hlt_Run2016%s_%s_%s" % (e, dataset,channel)] = lambda x=dataset, y=channel, f=setFile: CombineHLT(fileName=f, hltSet="Run2016BG.%s.%s" % (x,y), doFilter=True)
         vars()["hlt_Run2016H_%s_%s" % (dataset,channel)] = lambda x=dataset, y=channel, f=setFile: CombineHLT(fileName=f, hltSet="Run2016H.%s.%s" % (x,y), doFilter=True)
+        vars()["hlt_Run2016_%s_%s" % (dataset,channel)] = lambda x=dataset, y=channel, f=setFile: CombineHLT(fileName=f, hltSet="Run2016.%s.%s" % (x,y), doFilter=True)
 
 ### 2017 Logic
 setFile = "ttbarDoubleLepton/2017.yaml"
@@ -27,4 +30,5 @@ for dataset in ['DoubleMuon', 'DoubleEG', 'MuonEG']:
     vars()["hlt_Run2017B_%s" % dataset] = lambda x=dataset, f=setFile: CombineHLT(fileName=f, hltSet="Run2017B.%s" % x, doFilter=True)
     for e in "CDEF":
         vars()["hlt_Run2017%s_%s" % (e, dataset)] = lambda x=dataset, f=setFile: CombineHLT(fileName=f, hltSet="Run2017CF.%s" % x, doFilter=True)
+    vars()["hlt_Run2017_%s" % dataset] = lambda x=dataset, f=setFile: CombineHLT(fileName=f, hltSet="Run2017.%s" % x, doFilter=True)
 
@@ -0,0 +1,128 @@
+## Loading of the C++ workers and helpers from one precompiled library (see scripts/tzwi-build-workers).
+##
+## The sources compiled by ACLiC at run time (the src/ workers with $NANOAODTOOLS_BASE, and the helpers
+## such as LeptonEfficiencyCorrector) are built together into one shared library with its dictionary.
+## The library is kept under $TZWI_CACHE_DIR/workers/<hash> ($CMSSW_BASE/tmp/tzwi by default), keyed by
+## the hash of the source contents and of the ROOT version, so that an existing library is loaded without
+## compilation. A missing one is built in a temporary directory and moved in place, the jobs running
+## together never see a partial library. Without $NANOAODTOOLS_BASE the workers come from libTZWiTopAnalysis.
+import ROOT
+import os, sys
+import hashlib
+import shutil
+import time
+from glob import glob
+
+## Helpers of python/postprocessing/helpers compiled in the library
+helpers = ["LeptonEfficiencyCorrector", "HistogramEngine"]
+## Sources included by the helpers from outside of this package
+externalDeps = ["PhysicsTools/NanoAODTools/src/WeightCalculatorFromHistogram.cc"]
+## Headers of this package included by the helpers
+helperDeps = ["interface/OutputBranch.h"]
+
+_loaded = set()
+_libraryLoaded = False
+
+def cacheDir():
+    base = os.getenv("TZWI_CACHE_DIR")
+    if not base: base = "%s/tmp/tzwi" % os.getenv("CMSSW_BASE")
+    return os.path.join(base, "workers")
+
+def workerBase():
+    ## Sources of the src/ workers, None if they come from the scram library
+    return os.getenv("NANOAODTOOLS_BASE")
+
+def helperBase():
+    return "%s/src/TZWi/TopAnalysis/python/postprocessing/helpers" % os.getenv("CMSSW_BASE")
+
+def sources():
+    ## Sources of the library, and the headers they depend on for the hash
+    srcs, deps = [], []
+    base = workerBase()
+    if base:
+        srcs.extend(sorted(glob("%s/src/*CppWorker.cc" % base)))
+        deps.extend(sorted(glob("%s/interface/*.h" % base)))
+    for name in helpers:
+        srcs.append("%s/%s.cc" % (helperBase(), name))
+    deps.extend(x for x in sorted(glob("%s/*.cc" % helperBase())) if x not in srcs)
+    deps.extend("%s/src/TZWi/TopAnalysis/%s" % (os.getenv("CMSSW_BASE"), x) for x in helperDeps)
+    for dep in externalDeps:
+        for prefix in (os.getenv("CMSSW_BASE"), os.getenv("CMSSW_RELEASE_BASE")):
+            if prefix and os.path.exists("%s/src/%s" % (prefix, dep)):
+                deps.append("%s/src/%s" % (prefix, dep))
+                break
+    return srcs, deps
+
+def sourceHash():
+    srcs, deps = sources()
+    h = hashlib.sha1("TZWiWorkers-v1")
+    h.update(ROOT.gROOT.GetVersion())
+    for f in srcs+deps:
+        h.update(os.path.basename(f))
+        h.update(hashlib.sha1(open(f, 'rb').read()).hexdigest())
+    return h.hexdigest()[:16]
+
+def libraryPath(hashValue=None):
+    if hashValue is None: hashValue = sourceHash()
+    return os.path.join(cacheDir(), hashValue, "TZWiWorkers.so")
+
+def build(hashValue=None):
+    """Compile the library if it is not in the cache yet, returns its path"""
+    if hashValue is None: hashValue = sourceHash()
+    libPath = libraryPath(hashValue)
+    if os.path.exists(libPath): return libPath
+
+    if not os.path.exists(cacheDir()):
+        try: os.makedirs(cacheDir())
+        except OSError: pass
+    ## One source including all the others. It stays next to the libraries, the dictionary refers to it
+    srcs, deps = sources()
+    unityFile = os.path.join(cacheDir(), "TZWiWorkers_%s.cc" % hashValue)
+    if not os.path.exists(unityFile):
+        tmpFile = "%s.%d" % (unityFile, os.getpid())
+        with open(tmpFile, "w") as f:
+            for src in srcs: f.write('#include "%s"\n' % src)
+        os.rename(tmpFile, unityFile)
+
+    tmpDir = os.path.join(cacheDir(), "%s.tmp%d" % (hashValue, os.getpid()))
+    if not os.path.exists(tmpDir): os.makedirs(tmpDir)
+    tmpLib = os.path.join(tmpDir, "TZWiWorkers.so")
+    if not ROOT.gSystem.CompileMacro(unityFile, "kO", tmpLib, tmpDir):
+        shutil.rmtree(tmpDir, ignore_errors=True)
+        raise RuntimeError("Failed to compile the worker library %s" % unityFile)
+    try:
+        os.rename(tmpDir, os.path.dirname(libPath))
+    except OSError:
+        ## Built by another job in the meantime, the loaded copy is removed but stays mapped
+        shutil.rmtree(tmpDir, ignore_errors=True)
+    return libPath
+
+def loadLibrary():
+    global _libraryLoaded
+    if _libraryLoaded: return
+    t0 = time.time()
+    hashValue = sourceHash()
+    libPath = libraryPath(hashValue)
+    if os.path.exists(libPath):
+        if ROOT.gSystem.Load(libPath) < 0:
+            raise RuntimeError("Cannot load the worker library %s, remove it to rebuild" % libPath)
+        print "Loaded worker library %s (%.2f s)" % (libPath, time.time()-t0)
+    else:
+        print "Compile worker library %s" % libPath
+        sys.stdout.flush()
+        build(hashValue) ## Loaded by the compilation
+        print "Built worker library %s (%.2f s)" % (libPath, time.time()-t0)
+    _libraryLoaded = True
+
+def load(name):
+    """name: class of a src/ worker (e.g. FCNCTriLeptonCppWorker) or a helper (e.g. LeptonEfficiencyCorrector)"""
+    if name in _loaded: return
+    print "Load C++ %s" % name
+    if name in helpers or workerBase():
+        loadLibrary()
+    else:
+        base = "%s/src/TZWi/TopAnalysis"%os.getenv("CMSSW_BASE")
+        ROOT.gSystem.Load("libPhysicsToolsNanoAODTools.so")
+        ROOT.gSystem.Load("libTZWiTopAnalysis.so")
+        ROOT.gROOT.ProcessLine(".L %s/interface/%s.h" % (base, name))
+    _loaded.add(name)
@@ -0,0 +1,69 @@
+#include "../interface/BtagWeightCppWorker.h"
+#include <iostream>
+#include <cstring>
+
+using namespace std;
+
+BtagWeightCppWorker::BtagWeightCppWorker(const std::string jetIndexName):
+  jetIndexName_(jetIndexName)
+{
+}
+
+void BtagWeightCppWorker::addSF(const std::string sfName, const std::string outName) {
+  sfNames_.push_back(sfName);
+  outNames_.push_back(outName);
+  out_weights.push_back(1);
+}
+
+void BtagWeightCppWorker::initOutput(TTree* outTree) {
+  _doCppOutput = true;
+
+  // No more addSF() after this, the addresses of out_weights have to be kept
+  for ( unsigned i=0, n=outNames_.size(); i<n; ++i ) {
+    bookOutputBranch(outTree, outNames_[i], &out_weights[i], "/D");
+  }
+}
+
+void BtagWeightCppWorker::initReaders(TTree* outTree) {
+  in_jetIndex = nullptr;
+  if ( !jetIndexName_.empty() ) {
+    in_jetIndex = outTree->GetLeaf(jetIndexName_.c_str());
+    if ( !in_jetIndex ) cerr << "BtagWeight: cannot find " << jetIndexName_ << endl;
+  }
+
+  in_SFs.clear();
+  isFloatSF_.clear();
+  for ( const auto& sfName : sfNames_ ) {
+    TLeaf* leaf = outTree->GetLeaf(sfName.c_str());
+    if ( !leaf ) cerr << "BtagWeight: cannot find " << sfName << endl;
+    in_SFs.push_back(leaf);
+    isFloatSF_.push_back(leaf and std::strcmp(leaf->GetTypeName(), "Float_t") == 0);
+  }
+}
+
+bool BtagWeightCppWorker::analyze() {
+  // Jet indices are read once and shared by all the SF variations
+  jetIdxs_.clear();
+  if ( in_jetIndex ) {
+    for ( int k=0, n=in_jetIndex->GetLen(); k<n; ++k ) jetIdxs_.push_back(unsigned(in_jetIndex->GetValue(k)));
+  }
+  else if ( !in_SFs.empty() and in_SFs[0] ) {
+    for ( int k=0, n=in_SFs[0]->GetLen(); k<n; ++k ) jetIdxs_.push_back(k);
+  }
+
+  for ( unsigned i=0, n=in_SFs.size(); i<n; ++i ) {
+    double weight = 1;
+    const TLeaf* leaf = in_SFs[i];
+    if ( isFloatSF_[i] ) {
+      // The buffer can be moved by the producer when the array grows, so take it for every event
+      const float* sfs = static_cast<const float*>(leaf->GetValuePointer());
+      for ( const unsigned j : jetIdxs_ ) weight *= sfs[j];
+    }
+    else if ( leaf ) {
+      for ( const unsigned j : jetIdxs_ ) weight *= leaf->GetValue(j);
+    }
+    out_weights[i] = weight;
+  }
+
+  return true;
+}
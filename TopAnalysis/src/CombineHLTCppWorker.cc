@@ -1,50 +1,193 @@
 #include "../interface/CombineHLTCppWorker.h"
 #include <iostream>
 #include <cmath>
+#include <algorithm>
+#include <limits>
 
 using namespace std;
 
 CombineHLTCppWorker::CombineHLTCppWorker(const std::string formulaExpr, const std::string outName):
-  nHLT_(0), outName_(outName), formula_(("CombineHLT_"+outName).c_str(), formulaExpr.c_str())
+  outName_(outName)
 {
+  programs_.emplace_back();
+  // Empty for the run-range map, the runs outside of the ranges are rejected
+  valid_ = formulaExpr.empty() or compile(formulaExpr, programs_[0]);
+}
+
+bool CombineHLTCppWorker::addRunRange(const unsigned runMin, const unsigned runMax, const std::string formulaExpr) {
+  if ( runMin > runMax ) {
+    cerr << "CombineHLT_" << outName_ << ": invalid run range " << runMin << "-" << runMax << endl;
+    return false;
+  }
+  for ( const auto& r : runRanges_ ) {
+    if ( runMin <= r.runMax and r.runMin <= runMax ) {
+      cerr << "CombineHLT_" << outName_ << ": run range " << runMin << "-" << runMax
+           << " overlaps with " << r.runMin << "-" << r.runMax << endl;
+      return false;
+    }
+  }
+
+  Program program;
+  if ( !compile(formulaExpr, program) ) return false;
+  programs_.push_back(std::move(program));
+  const RunRange range = {runMin, runMax, programs_.size()-1};
+  runRanges_.insert(std::upper_bound(runRanges_.begin(), runRanges_.end(), range,
+                                     [](const RunRange& a, const RunRange& b){ return a.runMin < b.runMin; }), range);
+  // Invalidate the cache
+  cachedRunMin_ = 1; cachedRunMax_ = 0; cachedProgram_ = 0;
+  return true;
+}
+
+size_t CombineHLTCppWorker::findProgram(const unsigned run) {
+  if ( cachedRunMin_ <= run and run <= cachedRunMax_ ) return cachedProgram_;
+
+  // First range starting after this run, the candidate is the one before it
+  auto next = std::upper_bound(runRanges_.begin(), runRanges_.end(), run,
+                               [](const unsigned r, const RunRange& x){ return r < x.runMin; });
+  if ( next != runRanges_.begin() and run <= (next-1)->runMax ) {
+    cachedRunMin_ = (next-1)->runMin;
+    cachedRunMax_ = (next-1)->runMax;
+    cachedProgram_ = (next-1)->program;
+  }
+  else {
+    // In the gap between the ranges, keep the gap itself as the cached interval
+    cachedRunMin_ = next == runRanges_.begin() ? 0 : (next-1)->runMax+1;
+    cachedRunMax_ = next == runRanges_.end() ? std::numeric_limits<unsigned>::max() : next->runMin-1;
+    cachedProgram_ = 0;
+  }
+  return cachedProgram_;
 }
 
 void CombineHLTCppWorker::reset() {
-  nHLT_ = 0;
   in_HLTFlags.clear();
-  in_HLTFlagsUC.clear();
-  in_HLTFlagsUI.clear();
+  in_run = nullptr;
 }
 
 void CombineHLTCppWorker::addHLT(CombineHLTCppWorker::TRB HLTFlag) {
-  in_HLTFlags[nHLT_++] = HLTFlag;
+  in_HLTFlags.push_back({TYPE::B, HLTFlag});
 }
 
 void CombineHLTCppWorker::addHLT(CombineHLTCppWorker::TRUC HLTFlag) {
-  in_HLTFlagsUC[nHLT_++] = HLTFlag;
+  in_HLTFlags.push_back({TYPE::UC, HLTFlag});
 }
 
 void CombineHLTCppWorker::addHLT(CombineHLTCppWorker::TRUI HLTFlag) {
-  in_HLTFlagsUI[nHLT_++] = HLTFlag;
+  in_HLTFlags.push_back({TYPE::UI, HLTFlag});
 }
 
-bool CombineHLTCppWorker::analyze() {
-  for ( auto key=in_HLTFlags.begin(); key!=in_HLTFlags.end(); ++key ) {
-    const int i = key->first;
-    auto& flag = key->second;
-    formula_.SetParameter(i, static_cast<double>(**flag));
+void CombineHLTCppWorker::addMissingHLT() {
+  in_HLTFlags.push_back({TYPE::MISSING, nullptr});
+}
+
+bool CombineHLTCppWorker::compile(const std::string& expr, CombineHLTCppWorker::Program& program) const {
+  size_t pos = 0;
+  bool ok = compileOr(expr, pos, program);
+  while ( ok and pos < expr.size() and expr[pos] == ' ' ) ++pos;
+  if ( !ok or pos != expr.size() ) {
+    cerr << "CombineHLT_" << outName_ << ": cannot parse \"" << expr << "\" at position " << pos << endl;
+    return false;
   }
-  for ( auto key=in_HLTFlagsUC.begin(); key!=in_HLTFlagsUC.end(); ++key ) {
-    const int i = key->first;
-    auto& flag = key->second;
-    formula_.SetParameter(i, static_cast<double>(**flag));
+  return true;
+}
+
+// Recursive descent: or := and ("||" and)*, and := unary ("&&" unary)*, unary := "!" unary | "(" or ")" | "[" N "]"
+bool CombineHLTCppWorker::compileOr(const std::string& expr, size_t& pos, CombineHLTCppWorker::Program& program) const {
+  std::vector<size_t> jumps;
+  if ( !compileAnd(expr, pos, program) ) return false;
+  while ( true ) {
+    while ( pos < expr.size() and expr[pos] == ' ' ) ++pos;
+    if ( expr.compare(pos, 2, "||") != 0 ) break;
+    pos += 2;
+    jumps.push_back(program.size());
+    program.push_back({OP::JUMP_IF_TRUE, 0});
+    if ( !compileAnd(expr, pos, program) ) return false;
   }
-  for ( auto key=in_HLTFlagsUI.begin(); key!=in_HLTFlagsUI.end(); ++key ) {
-    const int i = key->first;
-    auto& flag = key->second;
-    formula_.SetParameter(i, static_cast<double>(**flag));
+  for ( auto i : jumps ) program[i].arg = program.size();
+  return true;
+}
+
+bool CombineHLTCppWorker::compileAnd(const std::string& expr, size_t& pos, CombineHLTCppWorker::Program& program) const {
+  std::vector<size_t> jumps;
+  if ( !compileUnary(expr, pos, program) ) return false;
+  while ( true ) {
+    while ( pos < expr.size() and expr[pos] == ' ' ) ++pos;
+    if ( expr.compare(pos, 2, "&&") != 0 ) break;
+    pos += 2;
+    jumps.push_back(program.size());
+    program.push_back({OP::JUMP_IF_FALSE, 0});
+    if ( !compileUnary(expr, pos, program) ) return false;
+  }
+  for ( auto i : jumps ) program[i].arg = program.size();
+  return true;
+}
+
+// Returns false at a missing operand, an unbalanced parenthesis or a malformed index, pos is left at the error
+bool CombineHLTCppWorker::compileUnary(const std::string& expr, size_t& pos, CombineHLTCppWorker::Program& program) const {
+  while ( pos < expr.size() and expr[pos] == ' ' ) ++pos;
+  if ( pos >= expr.size() ) return false;
+  if ( expr[pos] == '!' ) {
+    ++pos;
+    if ( !compileUnary(expr, pos, program) ) return false;
+    program.push_back({OP::NOT, 0});
   }
+  else if ( expr[pos] == '(' ) {
+    ++pos;
+    if ( !compileOr(expr, pos, program) ) return false;
+    while ( pos < expr.size() and expr[pos] == ' ' ) ++pos;
+    if ( pos >= expr.size() or expr[pos] != ')' ) return false;
+    ++pos;
+  }
+  else if ( expr[pos] == '[' ) {
+    const size_t end = expr.find(']', pos);
+    if ( end == std::string::npos or end == pos+1 or
+         expr.find_first_not_of("0123456789", pos+1) != end ) return false;
+    program.push_back({OP::LOAD, unsigned(std::stoul(expr.substr(pos+1, end-pos-1)))});
+    pos = end+1;
+  }
+  else return false;
+  return true;
+}
 
-  return formula_.Eval(0);
+template<typename LOADER>
+bool CombineHLTCppWorker::run(const CombineHLTCppWorker::Program& program, LOADER load) const {
+  bool acc = false;
+  for ( size_t pc=0, n=program.size(); pc<n; ++pc ) {
+    const Instruction& ins = program[pc];
+    switch ( ins.op ) {
+      case OP::LOAD: acc = load(ins.arg); break;
+      case OP::NOT: acc = !acc; break;
+      case OP::JUMP_IF_TRUE: if ( acc ) pc = ins.arg-1; break;
+      case OP::JUMP_IF_FALSE: if ( !acc ) pc = ins.arg-1; break;
+    }
+  }
+  return acc;
 }
 
+bool CombineHLTCppWorker::analyze() {
+  // The readers are dereferenced only here, so the branches which are not needed are never read
+  const Program& program = in_run ? programs_[findProgram(**in_run)] : programs_[0];
+  return run(program, [&](const unsigned i) -> bool {
+    const Reader& r = in_HLTFlags[i];
+    switch ( r.type ) {
+      case TYPE::B: return **static_cast<TRB>(r.reader);
+      case TYPE::UC: return **static_cast<TRUC>(r.reader) != 0;
+      case TYPE::UI: return **static_cast<TRUI>(r.reader) != 0;
+      case TYPE::MISSING: return false;
+    }
+    return false;
+  });
+}
+
+bool CombineHLTCppWorker::evaluate(const unsigned char* values, unsigned* nRead) const {
+  return run(programs_[0], [&](const unsigned i) -> bool {
+    if ( nRead ) ++(*nRead);
+    return values[i] != 0;
+  });
+}
+
+void CombineHLTCppWorker::analyzeBatch(TTreeReader* reader, const Long_t* entries, const unsigned n, int* results) {
+  for ( unsigned k=0; k<n; ++k ) {
+    reader->SetEntry(entries[k]);
+    results[k] = analyze();
+  }
+}
@@ -0,0 +1,72 @@
+#include "../interface/CopyBranchCppWorker.h"
+#include <iostream>
+#include <cstring>
+
+using namespace std;
+
+void CopyBranchCppWorker::initOutput(TTree* outTree) {
+  // The output tree can be a new one for each input file (--friend mode), book the known branches on it again
+  outTree_ = outTree;
+  for ( auto& out : outputs_ ) out.branch = bookOutputBranch(outTree_, out.name, out.buffer.data(), out.leafList);
+}
+
+void CopyBranchCppWorker::resetReaders() {
+  for ( auto& out : outputs_ ) out.reader = nullptr;
+}
+
+template<typename T>
+void CopyBranchCppWorker::add(const std::string name, const char leafType, const std::string lenName, void* reader, const bool isArray) {
+  // Already booked with the previous input file, just replace the reader
+  for ( auto& out : outputs_ ) {
+    if ( out.name != name ) continue;
+    out.reader = reader;
+    return;
+  }
+
+  const std::string leafList = (isArray ? "["+lenName+"]/" : "/")+std::string(1, leafType);
+  outputs_.push_back({name, leafList, reader, nullptr, {}, nullptr});
+  Output& out = outputs_.back();
+  if ( isArray ) {
+    out.copy = &CopyBranchCppWorker::copyArray<T>;
+    out.buffer.resize(64*sizeof(T));
+  }
+  else {
+    out.copy = &CopyBranchCppWorker::copyValue<T>;
+    out.buffer.resize(sizeof(T));
+  }
+  if ( !outTree_ ) return;
+
+  out.branch = bookOutputBranch(outTree_, name, out.buffer.data(), leafList);
+}
+
+template<typename T>
+void CopyBranchCppWorker::copyValue(Output& out) {
+  std::memcpy(out.buffer.data(), static_cast<TTreeReaderValue<T>*>(out.reader)->Get(), sizeof(T));
+  nBytesCopied_ += sizeof(T);
+}
+
+template<typename T>
+void CopyBranchCppWorker::copyArray(Output& out) {
+  auto reader = static_cast<TTreeReaderArray<T>*>(out.reader);
+  const size_t n = reader->GetSize();
+  if ( n == 0 ) return;
+
+  if ( out.buffer.size() < n*sizeof(T) ) {
+    out.buffer.resize(2*n*sizeof(T));
+    if ( out.branch ) out.branch->SetAddress(out.buffer.data());
+  }
+
+  T* dest = reinterpret_cast<T*>(out.buffer.data());
+  const T* src = &reader->At(0);
+  // Flat NanoAOD arrays are contiguous in the reader, copy element by element otherwise
+  if ( &reader->At(n-1) == src+n-1 ) std::memcpy(dest, src, n*sizeof(T));
+  else for ( size_t i=0; i<n; ++i ) dest[i] = reader->At(i);
+  nBytesCopied_ += n*sizeof(T);
+}
+
+bool CopyBranchCppWorker::analyze() {
+  for ( auto& out : outputs_ ) {
+    if ( out.reader ) (this->*out.copy)(out);
+  }
+  return true;
+}
@@ -0,0 +1,146 @@
+#include "../interface/FCNCKinematicRecoCppWorker.h"
+#include <iostream>
+#include <cmath>
+#include <algorithm>
+
+using namespace std;
+
+FCNCKinematicRecoCppWorker::FCNCKinematicRecoCppWorker(const bool doNonPromptLepton):
+  doNonPromptLepton_(doNonPromptLepton)
+{
+}
+
+void FCNCKinematicRecoCppWorker::initOutput(TTree* outTree) {
+  _doCppOutput = true;
+
+  bookKinTop(outTree, out_KinTop, "");
+  // One output set per jet/MET variation of the lepton selection worker
+  const unsigned nVariations = leptonWorker_ ? leptonWorker_->nJetOutputs()-1 : 0;
+  while ( out_KinTopVariations.size() < nVariations ) out_KinTopVariations.emplace_back(new KinTopOutput);
+  for ( unsigned k=0; k<nVariations; ++k ) {
+    bookKinTop(outTree, *out_KinTopVariations[k], leptonWorker_->jetOutput(k+1).suffix);
+  }
+}
+
+void FCNCKinematicRecoCppWorker::bookKinTop(TTree* outTree, KinTopOutput& out, const std::string suffix) {
+  const std::string varNames[] = {"pt", "eta", "phi", "mass"};
+  for ( unsigned i=0; i<4; ++i ) {
+    profile_.book(outTree, "KinTopWb_"+varNames[i]+suffix, &out.Wb_p4[i]);
+  }
+  for ( unsigned i=0; i<4; ++i ) {
+    profile_.book(outTree, "KinTopZq_"+varNames[i]+suffix, &out.Zq_p4[i]);
+  }
+  profile_.book(outTree, "KinTop_status"+suffix, &out.status, 'b');
+}
+
+void FCNCKinematicRecoCppWorker::resetValues() {
+  resetKinTop(out_KinTop);
+  for ( auto& out : out_KinTopVariations ) resetKinTop(*out);
+}
+
+void FCNCKinematicRecoCppWorker::resetKinTop(KinTopOutput& out) {
+  for ( unsigned i=0; i<4; ++i ) out.Wb_p4[i] = out.Zq_p4[i] = 0;
+  out.status = 0;
+}
+
+void FCNCKinematicRecoCppWorker::setPxPyPzE(double p[], const double pt, const double eta, const double phi, const double mass) const {
+  p[0] = pt*std::cos(phi);
+  p[1] = pt*std::sin(phi);
+  p[2] = pt*std::sinh(eta);
+  p[3] = std::sqrt(p[0]*p[0]+p[1]*p[1]+p[2]*p[2]+mass*mass);
+}
+
+bool FCNCKinematicRecoCppWorker::solveNeutrinoPz(const double lep[], const double metPx, const double metPy,
+                                                 double& posPz, double& negPz) const {
+  // Massless lepton assumed
+  const double a = 2*(lep[0]*metPx+lep[1]*metPy)+wMass_*wMass_;
+  const double b = 4*lep[3]*lep[3]*(metPx*metPx+metPy*metPy) - a*a;
+  const double aterm = a*lep[2];
+  const double bterm = a*a*lep[2]*lep[2];
+  const double cterm = lep[3]*lep[3] - lep[2]*lep[2];
+  const double det = bterm - b*cterm;
+  if ( det <= 0 ) {
+    posPz = negPz = 0;
+    return false;
+  }
+  posPz = (aterm + std::sqrt(det))/(2*cterm);
+  negPz = (aterm - std::sqrt(det))/(2*cterm);
+  return true;
+}
+
+void FCNCKinematicRecoCppWorker::setPtEtaPhiM(double out[], const double sum[]) const {
+  const double pt = std::sqrt(sum[0]*sum[0]+sum[1]*sum[1]);
+  out[0] = pt;
+  out[1] = std::asinh(sum[2]/pt);
+  out[2] = std::atan2(sum[1], sum[0]);
+  out[3] = std::sqrt(sum[3]*sum[3]-sum[0]*sum[0]-sum[1]*sum[1]-sum[2]*sum[2]);
+}
+
+bool FCNCKinematicRecoCppWorker::isSelected(const FCNCTriLeptonCppWorker& w) const {
+  // Check basic event selection, the lepton part is common to the jet/MET variations
+  if ( doNonPromptLepton_ ) {
+    if ( w.get_nGoodLepton() != 2 and w.get_nVetoLepton() > 0 ) return false;
+  }
+  else if ( w.get_nGoodLepton() != 3 ) return false;
+  if ( w.get_GoodLeptonCode() != 111 ) return false;
+  return true;
+}
+
+bool FCNCKinematicRecoCppWorker::analyze() {
+  resetValues();
+  if ( leptonWorker_ and isSelected(*leptonWorker_) ) {
+    const FCNCTriLeptonCppWorker& w = *leptonWorker_;
+    reconstruct(w.jetOutput(0), out_KinTop);
+    for ( unsigned k=0; k<out_KinTopVariations.size(); ++k ) {
+      reconstruct(w.jetOutput(k+1), *out_KinTopVariations[k]);
+    }
+  }
+
+  profile_.pack();
+  return true;
+}
+
+void FCNCKinematicRecoCppWorker::reconstruct(const FCNCTriLeptonCppWorker::JetOutput& jets, KinTopOutput& out) {
+  const FCNCTriLeptonCppWorker& w = *leptonWorker_;
+  if ( jets.nGoodJet < 2 or jets.nGoodJet > 3 ) return;
+  if ( jets.nBjet < 1 ) return;
+
+  // px, py, pz, E of the objects. Leptons are assumed to be massless
+  double wLep[4], zLep1[4], zLep2[4], bJet[4], qJet[4];
+  setPxPyPzE(wLep, w.get_Lepton1_pt(), w.get_Lepton1_eta(), w.get_Lepton1_phi(), 0);
+  setPxPyPzE(zLep1, w.get_Lepton2_pt(), w.get_Lepton2_eta(), w.get_Lepton2_phi(), 0);
+  setPxPyPzE(zLep2, w.get_Lepton3_pt(), w.get_Lepton3_eta(), w.get_Lepton3_phi(), 0);
+
+  // b jet assign by the b tag discriminator among the two leading jets
+  const float* jetPt = jets.GoodJet_p4[0], * jetEta = jets.GoodJet_p4[1], * jetPhi = jets.GoodJet_p4[2], * jetMass = jets.GoodJet_p4[3];
+  unsigned bIdx = 0, qIdx = 1;
+  if ( jets.GoodJet_DeepFlavB[0] < jets.GoodJet_DeepFlavB[1] ) std::swap(bIdx, qIdx);
+  setPxPyPzE(bJet, jetPt[bIdx], jetEta[bIdx], jetPhi[bIdx], jetMass[bIdx]);
+  setPxPyPzE(qJet, jetPt[qIdx], jetEta[qIdx], jetPhi[qIdx], jetMass[qIdx]);
+
+  // Neutrino pz from the W mass constraint, take the solution closer to the top mass
+  const double metPx = jets.MET_pt*std::cos(jets.MET_phi);
+  const double metPy = jets.MET_pt*std::sin(jets.MET_phi);
+  double posPz = 0, negPz = 0;
+  out.status = solveNeutrinoPz(wLep, metPx, metPy, posPz, negPz) ? 1 : 0;
+
+  double posSum[4], negSum[4];
+  posSum[0] = negSum[0] = bJet[0]+wLep[0]+metPx;
+  posSum[1] = negSum[1] = bJet[1]+wLep[1]+metPy;
+  posSum[2] = bJet[2]+wLep[2]+posPz;
+  negSum[2] = bJet[2]+wLep[2]+negPz;
+  posSum[3] = bJet[3]+wLep[3]+std::sqrt(metPx*metPx+metPy*metPy+posPz*posPz);
+  negSum[3] = bJet[3]+wLep[3]+std::sqrt(metPx*metPx+metPy*metPy+negPz*negPz);
+
+  double posTop[4], negTop[4];
+  setPtEtaPhiM(posTop, posSum);
+  setPtEtaPhiM(negTop, negSum);
+  const double* smTop = std::abs(posTop[3]-topMass_) < std::abs(negTop[3]-topMass_) ? posTop : negTop;
+  for ( unsigned i=0; i<4; ++i ) out.Wb_p4[i] = smTop[i];
+
+  // FCNC top from the Z and the non-b jet
+  double fcncSum[4], fcncTop[4];
+  for ( unsigned i=0; i<4; ++i ) fcncSum[i] = qJet[i]+zLep1[i]+zLep2[i];
+  setPtEtaPhiM(fcncTop, fcncSum);
+  for ( unsigned i=0; i<4; ++i ) out.Zq_p4[i] = fcncTop[i];
+}
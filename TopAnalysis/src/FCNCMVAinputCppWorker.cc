@@ -0,0 +1,158 @@
+#include "../interface/FCNCMVAinputCppWorker.h"
+#include <iostream>
+#include <cmath>
+#include <algorithm>
+
+using namespace std;
+
+typedef FCNCMVAinputCppWorker W;
+
+const char* W::varNames_[] = {
+  "WLZL1_dPhi", "WLZL1_dR", "WLZL2_dPhi", "WLZL2_dR", "ZL1ZL2_dPhi", "ZL1ZL2_dR",
+  "Z_mass", "W_mass", "ZWL_dPhi", "ZWL_dR", "MET", "MET_Phi", "TLepton_mass",
+  "J1_DeepJetB", "J1_pt", "ZL1J1_dPhi", "ZL1J1_dR", "ZL2J1_dPhi", "ZL2J1_dR", "WLJ1_dPhi", "WLJ1_dR",
+  "bJ_DeepJetB", "qJ_DeepJetB", "bJ_pt", "qJ_pt", "bJqJ_dPhi", "bJqJ_dR",
+  "WLbJ_dPhi", "WLbJ_dR", "WLqJ_dPhi", "WLqJ_dR", "ZL1bJ_dPhi", "ZL1bJ_dR", "ZL1qJ_dPhi", "ZL1qJ_dR", "ZL2bJ_dPhi", "ZL2bJ_dR", "ZL2qJ_dPhi", "ZL2qJ_dR",
+};
+
+const W::Pair W::basicPairs_[] = {
+  {WL, ZL1, WLZL1_dPhi}, {WL, ZL2, WLZL2_dPhi}, {ZL1, ZL2, ZL1ZL2_dPhi},
+};
+const W::Pair W::wzcrPairs_[] = {
+  {ZL1, J1, ZL1J1_dPhi}, {ZL2, J1, ZL2J1_dPhi}, {WL, J1, WLJ1_dPhi},
+};
+const W::Pair W::ttcrPairs_[] = {
+  {bJ, qJ, bJqJ_dPhi}, {WL, bJ, WLbJ_dPhi}, {WL, qJ, WLqJ_dPhi},
+  {ZL1, bJ, ZL1bJ_dPhi}, {ZL1, qJ, ZL1qJ_dPhi}, {ZL2, bJ, ZL2bJ_dPhi}, {ZL2, qJ, ZL2qJ_dPhi},
+};
+const unsigned W::nBasicPairs_ = sizeof(W::basicPairs_)/sizeof(W::Pair);
+const unsigned W::nWZCRPairs_ = sizeof(W::wzcrPairs_)/sizeof(W::Pair);
+const unsigned W::nTTCRPairs_ = sizeof(W::ttcrPairs_)/sizeof(W::Pair);
+
+void FCNCMVAinputCppWorker::initOutput(TTree* outTree) {
+  _doCppOutput = true;
+  // The output buffers start from 0 with each file, as the NanoAODTools branches booked in beginFile
+  resetValues();
+
+  bookMVA(outTree, out_MVA, "");
+  // One output set per jet/MET variation of the lepton selection worker
+  const unsigned nVariations = leptonWorker_ ? leptonWorker_->nJetOutputs()-1 : 0;
+  while ( out_MVAVariations.size() < nVariations ) out_MVAVariations.emplace_back(new MVAOutput);
+  for ( unsigned k=0; k<nVariations; ++k ) {
+    bookMVA(outTree, *out_MVAVariations[k], leptonWorker_->jetOutput(k+1).suffix);
+  }
+}
+
+void FCNCMVAinputCppWorker::bookMVA(TTree* outTree, MVAOutput& out, const std::string suffix) {
+  profile_.book(outTree, "MVAinput_Status"+suffix, &out.Status, 'b');
+  profile_.book(outTree, "MVAinput_nGoodJet"+suffix, &out.nGoodJet, 'b');
+  profile_.book(outTree, "MVAinput_nbJet"+suffix, &out.nbJet, 'b');
+  for ( unsigned i=0; i<nVar; ++i ) {
+    profile_.book(outTree, std::string("MVAinput_")+varNames_[i]+suffix, &out.vars[i]);
+  }
+}
+
+void FCNCMVAinputCppWorker::resetValues() {
+  resetMVA(out_MVA);
+  for ( auto& out : out_MVAVariations ) resetMVA(*out);
+}
+
+void FCNCMVAinputCppWorker::resetMVA(MVAOutput& out) {
+  out.Status = STATUS::NoCR;
+  out.nGoodJet = out.nbJet = 0;
+  std::fill(out.vars, out.vars+nVar, 0);
+}
+
+void FCNCMVAinputCppWorker::fillDeltas(float vars[], const Pair pairs[], const unsigned nPairs) {
+  for ( unsigned k=0; k<nPairs; ++k ) {
+    const Pair& p = pairs[k];
+    vars[p.dPhi] = objP4_[p.obj1].DeltaPhi(objP4_[p.obj2]);
+    vars[p.dPhi+1] = objP4_[p.obj1].DeltaR(objP4_[p.obj2]);
+  }
+}
+
+bool FCNCMVAinputCppWorker::analyze() {
+  // The values are kept from the previous event unless they are filled again,
+  // the MVA weights are trained with the inputs of the python module which had this behaviour (except with fixedInputs_)
+  if ( fixedInputs_ ) resetValues();
+  if ( leptonWorker_ ) {
+    const FCNCTriLeptonCppWorker& w = *leptonWorker_;
+
+    // Leptons are common to the jet/MET variations. Both Z leptons are Lepton2 as in the python module
+    objP4_[WL].SetPtEtaPhiM(w.get_Lepton1_pt(), w.get_Lepton1_eta(), w.get_Lepton1_phi(), w.get_Lepton1_mass());
+    objP4_[ZL1].SetPtEtaPhiM(w.get_Lepton2_pt(), w.get_Lepton2_eta(), w.get_Lepton2_phi(), w.get_Lepton2_mass());
+    if ( fixedInputs_ ) objP4_[ZL2].SetPtEtaPhiM(w.get_Lepton3_pt(), w.get_Lepton3_eta(), w.get_Lepton3_phi(), w.get_Lepton3_mass());
+    else objP4_[ZL2].SetPtEtaPhiM(w.get_Lepton2_pt(), w.get_Lepton2_eta(), w.get_Lepton2_phi(), w.get_Lepton2_mass());
+    constZ_.SetPtEtaPhiM(w.get_Z_pt(), w.get_Z_eta(), w.get_Z_phi(), w.get_Z_mass());
+
+    evaluate(w.jetOutput(0), out_MVA);
+    for ( unsigned k=0; k<out_MVAVariations.size(); ++k ) {
+      evaluate(w.jetOutput(k+1), *out_MVAVariations[k]);
+    }
+  }
+
+  profile_.pack();
+  return true;
+}
+
+void FCNCMVAinputCppWorker::evaluate(const FCNCTriLeptonCppWorker::JetOutput& jets, MVAOutput& out) {
+  const FCNCTriLeptonCppWorker& w = *leptonWorker_;
+  float* vars = out.vars;
+
+  // Just copy from the lepton selection, kept for all events
+  out.nGoodJet = jets.nGoodJet;
+  out.nbJet = jets.nBjet;
+  vars[Z_mass] = w.get_Z_mass();
+  vars[W_mass] = jets.W_MT;
+  vars[ZWL_dPhi] = w.get_TriLepton_WleptonZdPhi();
+  vars[ZWL_dR] = w.get_TriLepton_WleptonZdR();
+  vars[MET] = jets.MET_pt;
+  vars[MET_Phi] = jets.MET_phi;
+  vars[TLepton_mass] = w.get_TriLepton_mass();
+
+  // Basic event selection for WZCR/TTCR
+  if ( w.get_GoodLeptonCode() != 111 or w.get_nGoodLepton() > 3 or jets.W_MT > 300 ) {
+    // Zeros for the rejected events, except WLqJ_dPhi which the python module did not reset
+    const float WLqJ_dPhiLast = vars[WLqJ_dPhi];
+    out.Status = STATUS::NoCR;
+    std::fill(vars+WLZL1_dPhi, vars+ZL1ZL2_dR+1, 0);
+    std::fill(vars+J1_DeepJetB, vars+nVar, 0);
+    vars[WLqJ_dPhi] = WLqJ_dPhiLast;
+    return;
+  }
+
+  fillDeltas(vars, basicPairs_, nBasicPairs_);
+  // ZL1 with itself, as in the python module
+  if ( !fixedInputs_ ) vars[ZL1ZL2_dR] = objP4_[ZL1].DeltaR(objP4_[ZL1]);
+
+  const unsigned nJet = jets.nGoodJet, nBjet = jets.nBjet;
+  const float* jetBDiscr = jets.GoodJet_DeepFlavB;
+  const double dZmass = std::abs(constZ_.M()-91.2);
+  const bool isBaseCR = w.get_LeadingLepton_pt() > 25 and w.get_Z_charge() == 0;
+
+  if ( dZmass < 7.5 and nJet >= 1 and nBjet == 0 and isBaseCR ) {
+    out.Status = STATUS::WZCR;
+    setJet(jets, J1, 0);
+    vars[J1_DeepJetB] = jetBDiscr[0];
+    vars[J1_pt] = objP4_[J1].Pt();
+    fillDeltas(vars, wzcrPairs_, nWZCRPairs_);
+  }
+  else if ( not (20 < dZmass and dZmass < 60) and nJet >= 2 and nJet <= 3 and nBjet >= 1 and isBaseCR ) {
+    // The status is not set for TTCR, it keeps the previous value as in the python module
+    if ( fixedInputs_ ) out.Status = STATUS::TTCR;
+    // b jet assign by the b tag discriminator among the two leading jets, the discriminators are swapped only with fixedInputs_
+    unsigned bIdx = 0, qIdx = 1;
+    if ( jetBDiscr[0] < jetBDiscr[1] ) std::swap(bIdx, qIdx);
+    setJet(jets, bJ, bIdx);
+    setJet(jets, qJ, qIdx);
+    vars[bJ_DeepJetB] = jetBDiscr[fixedInputs_ ? bIdx : 0];
+    vars[qJ_DeepJetB] = jetBDiscr[fixedInputs_ ? qIdx : 1];
+    vars[bJ_pt] = objP4_[bJ].Pt();
+    vars[qJ_pt] = objP4_[qJ].Pt();
+    fillDeltas(vars, ttcrPairs_, nTTCRPairs_);
+  }
+}
+
+void FCNCMVAinputCppWorker::setJet(const FCNCTriLeptonCppWorker::JetOutput& jets, const OBJ obj, const unsigned i) {
+  objP4_[obj].SetPtEtaPhiM(jets.GoodJet_p4[0][i], jets.GoodJet_p4[1][i], jets.GoodJet_p4[2][i], jets.GoodJet_p4[3][i]);
+}
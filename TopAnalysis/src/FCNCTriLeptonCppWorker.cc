@@ -23,6 +23,7 @@ FCNCTriLeptonCppWorker::FCNCTriLeptonCppWorker(const std::string modeName, const
 typedef FCNCTriLeptonCppWorker::TRAF TRAF;
 typedef FCNCTriLeptonCppWorker::TRAI TRAI;
 typedef FCNCTriLeptonCppWorker::TRAB TRAB;
+typedef FCNCTriLeptonCppWorker::TRVF TRVF;
 
 void FCNCTriLeptonCppWorker::setElectrons(TRAF pt, TRAF eta, TRAF phi, TRAF mass, TRAI charge,
                                           TRAF relIso, TRAI id, TRAF dEtaSC, TRAF eCorr, TRAI vidBitmap) {
@@ -60,11 +61,80 @@ void FCNCTriLeptonCppWorker::setJets(TRAF pt, TRAF eta, TRAF phi, TRAF mass,
   in_Jet_p4[3] = mass;
   in_Jet_DeepFlavB = DeepFlavB;
   in_Jet_id = id;
+  out_Jets.in_pt = pt;
+  out_Jets.in_mass = mass;
 }
 
-void FCNCTriLeptonCppWorker::setMET(TTreeReaderValue<float>* pt, TTreeReaderValue<float>* phi) {
-  in_MET_pt = pt;
-  in_MET_phi = phi;
+void FCNCTriLeptonCppWorker::setMET(TRVF pt, TRVF phi) {
+  out_Jets.in_MET_pt = pt;
+  out_Jets.in_MET_phi = phi;
+}
+
+unsigned FCNCTriLeptonCppWorker::addJetVariation(const std::string name) {
+  out_JetVariations.emplace_back(new JetOutput);
+  out_JetVariations.back()->suffix = "_"+name;
+  return out_JetVariations.size();
+}
+
+void FCNCTriLeptonCppWorker::setJetVariation(const unsigned k, TRAF pt, TRAF mass, TRVF metPt, TRVF metPhi) {
+  if ( k == 0 or k > out_JetVariations.size() ) {
+    cerr << "Jet variation " << k << " is not booked" << endl;
+    return;
+  }
+  JetOutput& jets = *out_JetVariations[k-1];
+  jets.in_pt = pt;
+  jets.in_mass = mass;
+  jets.in_MET_pt = metPt;
+  jets.in_MET_phi = metPhi;
+}
+
+void FCNCTriLeptonCppWorker::initOutput(TTree* outTree) {
+  _doCppOutput = true;
+
+  const std::string varNames[] = {"pt", "eta", "phi", "mass"};
+  for ( unsigned i=0; i<4; ++i ) {
+    const std::string varName = "_"+varNames[i];
+    profile_.book(outTree, "Lepton1"+varName, &out_Lepton1_p4[i]);
+    profile_.book(outTree, "Lepton2"+varName, &out_Lepton2_p4[i]);
+    profile_.book(outTree, "Lepton3"+varName, &out_Lepton3_p4[i]);
+    profile_.book(outTree, "Z"+varName, &out_Z_p4[i]);
+    profile_.book(outTree, "LeadingElectron"+varName, &out_LeadingElectron_p4[i]);
+    profile_.book(outTree, "LeadingMuon"+varName, &out_LeadingMuon_p4[i]);
+  }
+  // Narrow types of the compact profile: pdgId, charge and the lepton code (|code| <= 111) in Char_t, counters in UChar_t
+  profile_.book(outTree, "Lepton1_pdgId", &out_Lepton1_pdgId, 'B');
+  profile_.book(outTree, "Lepton2_pdgId", &out_Lepton2_pdgId, 'B');
+  profile_.book(outTree, "Lepton3_pdgId", &out_Lepton3_pdgId, 'B');
+  profile_.book(outTree, "LeadingLepton_pt", &out_LeadingLepton_pt);
+  profile_.book(outTree, "TriLepton_mass", &out_TriLepton_mass);
+  profile_.book(outTree, "TriLepton_pt", &out_TriLepton_pt);
+  profile_.book(outTree, "TriLepton_WleptonZdPhi", &out_TriLepton_WleptonZdPhi);
+  profile_.book(outTree, "TriLepton_WleptonZdR", &out_TriLepton_WleptonZdR);
+  profile_.book(outTree, "Z_charge", &out_Z_charge, 'B');
+  profile_.book(outTree, "nVetoLepton", &out_nVetoLepton, 'b');
+  profile_.book(outTree, "nGoodLepton", &out_nGoodLepton, 'b');
+  profile_.book(outTree, "GoodLeptonCode", &out_GoodLeptonCode, 'B');
+  profile_.book(outTree, "nGoodElectron", &out_nGoodElectron, 'b');
+  profile_.book(outTree, "nGoodMuon", &out_nGoodMuon, 'b');
+  bookJetOutput(outTree, out_Jets);
+  for ( auto& jets : out_JetVariations ) bookJetOutput(outTree, *jets);
+}
+
+void FCNCTriLeptonCppWorker::bookJetOutput(TTree* outTree, JetOutput& jets) {
+  const std::string varNames[] = {"pt", "eta", "phi", "mass"};
+  const std::string& sfx = jets.suffix;
+  const std::string nJet = "nGoodJet"+sfx;
+  profile_.book(outTree, "MET_pt"+sfx, &jets.MET_pt);
+  profile_.book(outTree, "MET_phi"+sfx, &jets.MET_phi);
+  // The counter branch has to be booked before the arrays using it
+  profile_.book(outTree, nJet, &jets.nGoodJet, 'b');
+  profile_.book(outTree, "GoodJet_index"+sfx, jets.GoodJet_index, 'b', &jets.nGoodJet, maxNGoodJet_, nJet);
+  for ( unsigned i=0; i<4; ++i ) {
+    profile_.book(outTree, "GoodJet_"+varNames[i]+sfx, jets.GoodJet_p4[i], &jets.nGoodJet, maxNGoodJet_, nJet);
+  }
+  profile_.book(outTree, "GoodJet_DeepFlavB"+sfx, jets.GoodJet_DeepFlavB, &jets.nGoodJet, maxNGoodJet_, nJet);
+  profile_.book(outTree, "nBjet"+sfx, &jets.nBjet, 'b');
+  profile_.book(outTree, "W_MT"+sfx, &jets.W_MT);
 }
 
 void FCNCTriLeptonCppWorker::resetValues() {
@@ -77,16 +147,18 @@ void FCNCTriLeptonCppWorker::resetValues() {
   out_TriLepton_mass = out_TriLepton_pt = 0;
   out_TriLepton_WleptonZdPhi = out_TriLepton_WleptonZdR = 0;
   out_Z_charge = 0;
-  out_MET_pt = out_MET_phi = 0;
-  out_W_MT = 0;
   out_GoodLeptonCode = 0;
-  out_nGoodElectron = out_nGoodMuon = 0;
-  out_nVetoElectron = out_nVetoMuon = 0;
-  out_nGoodJet = out_nBjet = 0;
-  for ( int i=0; i<4; ++i ) out_GoodJet_p4[i].clear();
-  out_GoodJet_DeepFlavB.clear();
-  out_GoodJet_index.clear();
+  out_LeadingLepton_pt = 0;
+  out_nGoodLepton = out_nGoodElectron = out_nGoodMuon = 0;
+  out_nVetoLepton = out_nVetoElectron = out_nVetoMuon = 0;
+  resetJetOutput(out_Jets);
+  for ( auto& jets : out_JetVariations ) resetJetOutput(*jets);
+}
 
+void FCNCTriLeptonCppWorker::resetJetOutput(JetOutput& jets) {
+  jets.MET_pt = jets.MET_phi = 0;
+  jets.W_MT = 0;
+  jets.nGoodJet = jets.nBjet = 0;
 }
 //signal muons
 bool FCNCTriLeptonCppWorker::isGoodMuon(const unsigned i) const {
@@ -165,8 +237,8 @@ bool FCNCTriLeptonCppWorker::isNPElectron(const unsigned i) const {
   return true;
 }
 
-bool FCNCTriLeptonCppWorker::isGoodJet(const unsigned i) const {
-  const double pt = in_Jet_p4[0]->At(i);
+bool FCNCTriLeptonCppWorker::isGoodJet(const unsigned i, const TRAF jetPt) const {
+  const double pt = jetPt->At(i);
   const double eta = in_Jet_p4[1]->At(i);
   if ( pt < minJetPt_ or std::abs(eta) > maxJetEta_ ) return false;
   if ( in_Jet_id->At(i) == 0 ) return false;
@@ -206,10 +278,6 @@ double FCNCTriLeptonCppWorker::computeMT(const TLorentzVector& lepP4, const doub
 bool FCNCTriLeptonCppWorker::analyze() {
   resetValues();
 
-  // Start from trivial stuffs
-  out_MET_pt = **in_MET_pt;
-  out_MET_phi = **in_MET_phi;
-
   // Select leptons
   std::vector<unsigned> muonIdxs;
   std::vector<unsigned> electronIdxs;
@@ -502,35 +570,154 @@ bool FCNCTriLeptonCppWorker::analyze() {
     out_TriLepton_WleptonZdR   = lepton1P4.DeltaR(zP4);
   }
 
+  // Jets, MET and W_MT for the nominal and for each variation, with the same leptons
+  const TLorentzVector lepP4s[] = {lepton1P4, lepton2P4, lepton3P4};
+  analyzeJets(out_Jets, lepP4s);
+  for ( auto& jets : out_JetVariations ) analyzeJets(*jets, lepP4s);
+
+  // Summary counters, kept as separate buffers to be bound to the output branches
+  out_LeadingLepton_pt = std::max(out_LeadingMuon_p4[0], out_LeadingElectron_p4[0]);
+  out_nGoodLepton = out_nGoodElectron + out_nGoodMuon;
+  out_nVetoLepton = out_nVetoElectron + out_nVetoMuon;
+
+  profile_.pack();
+  return true;
+}
+
+void FCNCTriLeptonCppWorker::analyzeJets(JetOutput& jets, const TLorentzVector lepP4s[]) {
+  jets.MET_pt = **jets.in_MET_pt;
+  jets.MET_phi = **jets.in_MET_phi;
+
   // Transeverse mass of the W boson
   //Lepton comes from W which has high pT
   if ( std::abs(out_GoodLeptonCode) >= 100 ) {
-    out_W_MT = computeMT(lepton1P4, out_MET_pt, out_MET_phi);
+    jets.W_MT = computeMT(lepP4s[0], jets.MET_pt, jets.MET_phi);
   }
 
-  // Continue to the Jets
+  // Continue to the Jets, eta/phi/id/b-tag are common to the variations
+  const TRAF jetP4Arr[] = {jets.in_pt, in_Jet_p4[1], in_Jet_p4[2], jets.in_mass};
   std::vector<unsigned short> jetIdxs;
   jetIdxs.reserve(in_Jet_DeepFlavB->GetSize());
   for ( unsigned i=0, n=in_Jet_DeepFlavB->GetSize(); i<n; ++i ) {
-    if ( !isGoodJet(i) ) continue;
-    TLorentzVector jetP4 = buildP4(in_Jet_p4, i);
-    if ( lepton1P4.Pt() > 0 and lepton1P4.DeltaR(jetP4) < 0.35 ) continue;
-    if ( lepton2P4.Pt() > 0 and lepton2P4.DeltaR(jetP4) < 0.35 ) continue;
-    if ( lepton3P4.Pt() > 0 and lepton3P4.DeltaR(jetP4) < 0.35 ) continue;
+    if ( !isGoodJet(i, jets.in_pt) ) continue;
+    TLorentzVector jetP4 = buildP4(jetP4Arr, i);
+    if ( lepP4s[0].Pt() > 0 and lepP4s[0].DeltaR(jetP4) < 0.35 ) continue;
+    if ( lepP4s[1].Pt() > 0 and lepP4s[1].DeltaR(jetP4) < 0.35 ) continue;
+    if ( lepP4s[2].Pt() > 0 and lepP4s[2].DeltaR(jetP4) < 0.35 ) continue;
     jetIdxs.push_back(i);
-    if ( in_Jet_DeepFlavB->At(i) > minBjetBDiscr_ ) ++out_nBjet;
+    if ( in_Jet_DeepFlavB->At(i) > minBjetBDiscr_ ) ++jets.nBjet;
   }
-  out_nGoodJet = jetIdxs.size();
   // Sort jets by pt
   std::sort(jetIdxs.begin(), jetIdxs.end(),
-            [&](const unsigned short i, const unsigned short j){ return in_Jet_p4[0]->At(i) > in_Jet_p4[0]->At(j); });
-  for ( unsigned k=0, n=out_nGoodJet; k<n; ++k ) {
+            [&](const unsigned short i, const unsigned short j){ return jets.in_pt->At(i) > jets.in_pt->At(j); });
+  if ( jetIdxs.size() > maxNGoodJet_ ) jetIdxs.resize(maxNGoodJet_);
+  jets.nGoodJet = jetIdxs.size();
+  for ( unsigned k=0, n=jets.nGoodJet; k<n; ++k ) {
     const unsigned kk = jetIdxs.at(k);
-    for ( int i=0; i<4; ++i ) out_GoodJet_p4[i].push_back(in_Jet_p4[i]->At(kk));
-    out_GoodJet_DeepFlavB.push_back(in_Jet_DeepFlavB->At(kk));
-    out_GoodJet_index.push_back(kk);
+    for ( int i=0; i<4; ++i ) jets.GoodJet_p4[i][k] = jetP4Arr[i]->At(kk);
+    jets.GoodJet_DeepFlavB[k] = in_Jet_DeepFlavB->At(kk);
+    jets.GoodJet_index[k] = kk;
   }
+}
 
-  return true;
+void FCNCTriLeptonCppWorker::analyzeBatch(TTreeReader* reader, const Long_t* entries, const unsigned n) {
+  batch_GoodLeptonCode.resize(n);
+  batch_nGoodLepton.resize(n);
+  batch_nVetoLepton.resize(n);
+  batch_Z_mass.resize(n);
+  batch_nGoodJet.resize(n);
+  batch_W_MT.resize(n);
+  batch_nBjet.resize(n);
+  batch_Leptons.resize(n);
+  batch_Jets.resize(n*(1+out_JetVariations.size()));
+  for ( auto& v : batch_Jet_p4 ) v.clear();
+  batch_Jet_DeepFlavB.clear();
+  batch_Jet_index.clear();
+
+  for ( unsigned k=0; k<n; ++k ) {
+    reader->SetEntry(entries[k]);
+    analyze();
+    saveBatch(k);
+
+    batch_GoodLeptonCode[k] = get_GoodLeptonCode();
+    batch_nGoodLepton[k] = get_nGoodLepton();
+    batch_nVetoLepton[k] = get_nVetoLepton();
+    batch_Z_mass[k] = get_Z_mass();
+    batch_nGoodJet[k] = get_nGoodJet();
+    batch_W_MT[k] = get_W_MT();
+    batch_nBjet[k] = get_nBjet();
+  }
+}
+
+void FCNCTriLeptonCppWorker::saveBatch(const unsigned k) {
+  BatchLeptons& b = batch_Leptons[k];
+  float* const p4s[] = {out_Lepton1_p4, out_Lepton2_p4, out_Lepton3_p4, out_Z_p4, out_LeadingMuon_p4, out_LeadingElectron_p4};
+  for ( unsigned i=0; i<6; ++i ) std::copy(p4s[i], p4s[i]+4, b.p4[i]);
+  b.pdgId[0] = out_Lepton1_pdgId; b.pdgId[1] = out_Lepton2_pdgId; b.pdgId[2] = out_Lepton3_pdgId;
+  b.Z_charge = out_Z_charge;
+  b.LeadingLepton_pt = out_LeadingLepton_pt;
+  b.TriLepton_mass = out_TriLepton_mass;
+  b.TriLepton_pt = out_TriLepton_pt;
+  b.TriLepton_WleptonZdPhi = out_TriLepton_WleptonZdPhi;
+  b.TriLepton_WleptonZdR = out_TriLepton_WleptonZdR;
+  b.nGoodElectron = out_nGoodElectron; b.nGoodMuon = out_nGoodMuon;
+  b.nVetoElectron = out_nVetoElectron; b.nVetoMuon = out_nVetoMuon;
+  b.jetOffset = batch_Jet_index.size();
+
+  const unsigned nJetSets = 1+out_JetVariations.size();
+  saveBatchJets(out_Jets, batch_Jets[k*nJetSets]);
+  for ( unsigned j=1; j<nJetSets; ++j ) saveBatchJets(*out_JetVariations[j-1], batch_Jets[k*nJetSets+j]);
 }
 
+void FCNCTriLeptonCppWorker::saveBatchJets(const JetOutput& jets, BatchJets& out) {
+  out.MET_pt = jets.MET_pt;
+  out.MET_phi = jets.MET_phi;
+  out.W_MT = jets.W_MT;
+  out.nGoodJet = jets.nGoodJet;
+  out.nBjet = jets.nBjet;
+  // Only the selected jets are kept, not the full buffers
+  for ( unsigned i=0; i<4; ++i ) {
+    batch_Jet_p4[i].insert(batch_Jet_p4[i].end(), jets.GoodJet_p4[i], jets.GoodJet_p4[i]+jets.nGoodJet);
+  }
+  batch_Jet_DeepFlavB.insert(batch_Jet_DeepFlavB.end(), jets.GoodJet_DeepFlavB, jets.GoodJet_DeepFlavB+jets.nGoodJet);
+  batch_Jet_index.insert(batch_Jet_index.end(), jets.GoodJet_index, jets.GoodJet_index+jets.nGoodJet);
+}
+
+void FCNCTriLeptonCppWorker::restoreBatch(const unsigned k) {
+  const BatchLeptons& b = batch_Leptons.at(k);
+  float* const p4s[] = {out_Lepton1_p4, out_Lepton2_p4, out_Lepton3_p4, out_Z_p4, out_LeadingMuon_p4, out_LeadingElectron_p4};
+  for ( unsigned i=0; i<6; ++i ) std::copy(b.p4[i], b.p4[i]+4, p4s[i]);
+  out_Lepton1_pdgId = b.pdgId[0]; out_Lepton2_pdgId = b.pdgId[1]; out_Lepton3_pdgId = b.pdgId[2];
+  out_Z_charge = b.Z_charge;
+  out_LeadingLepton_pt = b.LeadingLepton_pt;
+  out_TriLepton_mass = b.TriLepton_mass;
+  out_TriLepton_pt = b.TriLepton_pt;
+  out_TriLepton_WleptonZdPhi = b.TriLepton_WleptonZdPhi;
+  out_TriLepton_WleptonZdR = b.TriLepton_WleptonZdR;
+  out_GoodLeptonCode = batch_GoodLeptonCode[k];
+  out_nGoodLepton = batch_nGoodLepton[k];
+  out_nVetoLepton = batch_nVetoLepton[k];
+  out_nGoodElectron = b.nGoodElectron; out_nGoodMuon = b.nGoodMuon;
+  out_nVetoElectron = b.nVetoElectron; out_nVetoMuon = b.nVetoMuon;
+
+  const unsigned nJetSets = 1+out_JetVariations.size();
+  unsigned offset = b.jetOffset;
+  restoreBatchJets(out_Jets, batch_Jets[k*nJetSets], offset);
+  for ( unsigned j=1; j<nJetSets; ++j ) restoreBatchJets(*out_JetVariations[j-1], batch_Jets[k*nJetSets+j], offset);
+  // The narrow branches of the output profile still hold the last entry packed by analyze()
+  profile_.pack();
+}
+
+void FCNCTriLeptonCppWorker::restoreBatchJets(JetOutput& jets, const BatchJets& in, unsigned& offset) {
+  jets.MET_pt = in.MET_pt;
+  jets.MET_phi = in.MET_phi;
+  jets.W_MT = in.W_MT;
+  jets.nGoodJet = in.nGoodJet;
+  jets.nBjet = in.nBjet;
+  for ( unsigned i=0; i<4; ++i ) {
+    std::copy(batch_Jet_p4[i].begin()+offset, batch_Jet_p4[i].begin()+offset+in.nGoodJet, jets.GoodJet_p4[i]);
+  }
+  std::copy(batch_Jet_DeepFlavB.begin()+offset, batch_Jet_DeepFlavB.begin()+offset+in.nGoodJet, jets.GoodJet_DeepFlavB);
+  std::copy(batch_Jet_index.begin()+offset, batch_Jet_index.begin()+offset+in.nGoodJet, jets.GoodJet_index);
+  offset += in.nGoodJet;
+}
@@ -62,16 +62,37 @@ void FCNHSingleLeptonCppWorker::setMET(TTreeReaderValue<float>* pt, TTreeReaderV
   in_MET_phi = phi;
 }
 
+void FCNHSingleLeptonCppWorker::initOutput(TTree* outTree) {
+  _doCppOutput = true;
+
+  const std::string varNames[] = {"pt", "eta", "phi", "mass"};
+  for ( unsigned i=0; i<4; ++i ) {
+    bookOutputBranch(outTree, "Lepton1_"+varNames[i], &out_Lepton1_p4[i], "/F");
+  }
+  bookOutputBranch(outTree, "MET_pt", &out_MET_pt, "/F");
+  bookOutputBranch(outTree, "MET_phi", &out_MET_phi, "/F");
+  bookOutputBranch(outTree, "Lepton1_pdgId", &out_Lepton1_pdgId, "/I");
+  bookOutputBranch(outTree, "W_MT", &out_W_MT, "/F");
+  bookOutputBranch(outTree, "nVetoLepton", &out_nVetoLepton, "/i");
+  // The counter branch has to be booked before the arrays using it
+  bookOutputBranch(outTree, "nGoodJet", &out_nGoodJet, "/i");
+  bookOutputBranch(outTree, "GoodJet_index", out_GoodJet_index, "[nGoodJet]/i");
+  for ( unsigned i=0; i<4; ++i ) {
+    bookOutputBranch(outTree, "GoodJet_"+varNames[i], out_GoodJet_p4[i], "[nGoodJet]/F");
+  }
+  bookOutputBranch(outTree, "GoodJet_DeepCSV", out_GoodJet_DeepCSV, "[nGoodJet]/F");
+  bookOutputBranch(outTree, "nBjet", &out_nBjet, "/i");
+}
+
 void FCNHSingleLeptonCppWorker::resetValues() {
   for ( unsigned i=0; i<4; ++i ) {
     out_Lepton1_p4[i] = 0;
   }
   out_Lepton1_pdgId = 0;
   out_MET_pt = out_MET_phi = 0;
+  out_W_MT = 0;
+  out_nVetoLepton = 0;
   out_nGoodJet = out_nBjet = 0;
-  for ( int i=0; i<4; ++i ) out_GoodJet_p4[i].clear();
-  out_GoodJet_DeepCSV.clear();
-  out_GoodJet_index.clear();
 
 }
 //signal muons
@@ -204,15 +225,16 @@ bool FCNHSingleLeptonCppWorker::analyze() {
     jetIdxs.push_back(i);
     if ( in_Jet_DeepCSV->At(i) > minBjetBDiscr_ ) ++out_nBjet;
   }
-  out_nGoodJet = jetIdxs.size();
   // Sort jets by pt
   std::sort(jetIdxs.begin(), jetIdxs.end(),
             [&](const unsigned short i, const unsigned short j){ return in_Jet_p4[0]->At(i) > in_Jet_p4[0]->At(j); });
+  if ( jetIdxs.size() > maxNGoodJet_ ) jetIdxs.resize(maxNGoodJet_);
+  out_nGoodJet = jetIdxs.size();
   for ( unsigned k=0, n=out_nGoodJet; k<n; ++k ) {
     const unsigned kk = jetIdxs.at(k);
-    for ( int i=0; i<4; ++i ) out_GoodJet_p4[i].push_back(in_Jet_p4[i]->At(kk));
-    out_GoodJet_DeepCSV.push_back(in_Jet_DeepCSV->At(kk));
-    out_GoodJet_index.push_back(kk);
+    for ( int i=0; i<4; ++i ) out_GoodJet_p4[i][k] = in_Jet_p4[i]->At(kk);
+    out_GoodJet_DeepCSV[k] = in_Jet_DeepCSV->At(kk);
+    out_GoodJet_index[k] = kk;
   }
 
   return true;
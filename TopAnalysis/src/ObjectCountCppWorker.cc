@@ -0,0 +1,40 @@
+#include "../interface/ObjectCountCppWorker.h"
+#include <iostream>
+
+using namespace std;
+
+void ObjectCountCppWorker::reset() {
+  for ( auto& cut : cuts_ ) cut.counts.clear();
+}
+
+void ObjectCountCppWorker::addCut(const unsigned minimum) {
+  cuts_.push_back({minimum, {}});
+}
+
+void ObjectCountCppWorker::addCount(const unsigned cut, TRUI count) {
+  if ( cut >= cuts_.size() ) {
+    cout << "ObjectCountCppWorker: cut index " << cut << " is out of range, call addCut() first" << endl;
+    return;
+  }
+  cuts_[cut].counts.push_back(count);
+}
+
+bool ObjectCountCppWorker::analyze() {
+  for ( const auto& cut : cuts_ ) {
+    unsigned n = 0;
+    // Stop reading the counters as soon as the minimum is reached
+    for ( auto count : cut.counts ) {
+      n += **count;
+      if ( n >= cut.minimum ) break;
+    }
+    if ( n < cut.minimum ) return false;
+  }
+  return true;
+}
+
+void ObjectCountCppWorker::analyzeBatch(TTreeReader* reader, const Long_t* entries, const unsigned n, int* results) {
+  for ( unsigned k=0; k<n; ++k ) {
+    reader->SetEntry(entries[k]);
+    results[k] = analyze();
+  }
+}
@@ -16,22 +16,36 @@ void PartonTopCppWorker::setGenParticles(TTreeReaderValue<unsigned> *nGenPart,
   in_GenPart_genPartIdxMother = GenPart_genPartIdxMother;
 }
 
-bool PartonTopCppWorker::hasSpecificAncestor(const unsigned i, const unsigned ancIdx) const {
-  const int motherIdx = in_GenPart_genPartIdxMother->At(i);
-  if ( motherIdx < 0 ) return false; // leached up to the root
-  if ( motherIdx == int(ancIdx) ) return true;
+void PartonTopCppWorker::resolveAncestry(const unsigned nGenPart) {
+  firstCopy_.assign(nGenPart, -1);
+  fromBoson_.assign(nGenPart, ANCESTOR::UNKNOWN);
 
-  return hasSpecificAncestor(motherIdx, ancIdx);
+  // First copy: go up while the mother is the same particle, then assign the result
+  // to every particle on the way so that no chain is walked twice
+  for ( unsigned i=0; i<nGenPart; ++i ) {
+    if ( firstCopy_[i] >= 0 ) continue;
+    chain_.clear();
+    int j = i, first = i;
+    while ( chain_.size() <= nGenPart ) { // chain size check against the broken mother links
+      if ( firstCopy_[j] >= 0 ) { first = firstCopy_[j]; break; }
+      chain_.push_back(j);
+      const int motherIdx = in_GenPart_genPartIdxMother->At(j);
+      if ( motherIdx < 0 or in_GenPart_pdgId->At(motherIdx) != in_GenPart_pdgId->At(j) ) { first = j; break; }
+      j = motherIdx;
+    }
+    for ( const unsigned k : chain_ ) firstCopy_[k] = first;
+  }
 }
 
-int PartonTopCppWorker::findFirst(const int i) const {
-  if ( i < 0 ) return -1; // for safety check
-  const int motherIdx = in_GenPart_genPartIdxMother->At(i);
-  if ( motherIdx < 0 ) return i; // already the first particle
-  const int motherId = in_GenPart_pdgId->At(motherIdx);
-  if ( motherId != in_GenPart_pdgId->At(i) ) return i;
-
-  return findFirst(motherIdx);
+void PartonTopCppWorker::addParton(const unsigned i, const int mother) {
+  // mother is the GenPart index of the mother's first copy, -1 if it is not in the output (yet)
+  out_pts.push_back(in_GenPart_pt->At(i));
+  out_etas.push_back(in_GenPart_eta->At(i));
+  out_phis.push_back(in_GenPart_phi->At(i));
+  out_masses.push_back(in_GenPart_mass->At(i));
+  out_pdgIds.push_back(in_GenPart_pdgId->At(i));
+  out_mothers.push_back(mother >= 0 ? partonIdx_[mother] : -1);
+  partonIdx_[i] = out_pts.size()-1;
 }
 
 void PartonTopCppWorker::resetValues() {
@@ -47,134 +61,55 @@ bool PartonTopCppWorker::genEvent(){
   using namespace std;
 
   resetValues();
-  int nPartons = 0;
   const unsigned int nGenPart = **in_nGenPart;
+  resolveAncestry(nGenPart);
 
-  // Find top quarks
-  std::set<unsigned> tQuarks, bosons;
-  std::set<unsigned> leptons, taus, neutrinos, quarks;
+  // Categorize the first copies
+  category_.assign(nGenPart, CATEGORY::NONE);
   for ( unsigned i=0; i<nGenPart; ++i ) {
     const int aid = abs(in_GenPart_pdgId->At(i));
     if ( aid > 25 ) continue;
-    const unsigned ii = findFirst(i);
+    const unsigned ii = firstCopy_[i];
 
     if ( std::abs(in_GenPart_eta->At(ii)) > 20 ) continue;
 
-    if      ( aid == 6 ) tQuarks.insert(ii);
-    else if ( aid >= 23 and aid <= 25 ) bosons.insert(ii);
-    else if ( aid == 11 or aid == 13 ) leptons.insert(ii);
-    else if ( aid == 15 ) taus.insert(ii);
-    else if ( aid == 12 or aid == 14 or aid == 16 ) neutrinos.insert(ii);
-    else if ( aid >= 1  and aid <= 5  ) quarks.insert(ii);
-  }
-
-  // Fill top quarks first
-  std::map<unsigned, int> indexMap;
-  for ( unsigned i : tQuarks ) {
-    out_pts.push_back(in_GenPart_pt->At(i));
-    out_etas.push_back(in_GenPart_eta->At(i));
-    out_phis.push_back(in_GenPart_phi->At(i));
-    out_masses.push_back(in_GenPart_mass->At(i));
-    out_pdgIds.push_back(in_GenPart_pdgId->At(i));
-    out_mothers.push_back(-1);
-    indexMap[i] = nPartons;
-    ++nPartons;
-  }
-
-  // Continue to bosons. This might not be slow, but OK with just one or two top quarks in the event
-  for ( unsigned i : bosons ) {
-    int motherIdx = findFirst(in_GenPart_genPartIdxMother->At(i));
-    if ( motherIdx >= 0 ) {
-      auto match = indexMap.find(motherIdx);
-      motherIdx = (match == indexMap.end()) ? -1 : match->second;
-    }
-
-    out_pts.push_back(in_GenPart_pt->At(i));
-    out_etas.push_back(in_GenPart_eta->At(i));
-    out_phis.push_back(in_GenPart_phi->At(i));
-    out_masses.push_back(in_GenPart_mass->At(i));
-    out_pdgIds.push_back(in_GenPart_pdgId->At(i));
-    out_mothers.push_back(motherIdx);
-    indexMap[i] = nPartons;
-    ++nPartons;
-  }
-
-  for ( unsigned i : quarks ) {
-    int motherIdx = findFirst(in_GenPart_genPartIdxMother->At(i));
-    if ( motherIdx >= 0 ) {
-      auto match = indexMap.find(motherIdx);
-      motherIdx = (match == indexMap.end()) ? -1 : match->second;
-    }
-
-    out_pts.push_back(in_GenPart_pt->At(i));
-    out_etas.push_back(in_GenPart_eta->At(i));
-    out_phis.push_back(in_GenPart_phi->At(i));
-    out_masses.push_back(in_GenPart_mass->At(i));
-    out_pdgIds.push_back(in_GenPart_pdgId->At(i));
-    out_mothers.push_back(motherIdx);
-    indexMap[i] = nPartons;
-    ++nPartons;
+    if      ( aid == 6 ) category_[ii] = CATEGORY::TOP;
+    else if ( aid >= 23 and aid <= 25 ) category_[ii] = CATEGORY::BOSON;
+    else if ( aid == 11 or aid == 13 ) category_[ii] = CATEGORY::LEPTON;
+    else if ( aid == 15 ) category_[ii] = CATEGORY::TAU;
+    else if ( aid == 12 or aid == 14 or aid == 16 ) category_[ii] = CATEGORY::NEUTRINO;
+    else if ( aid >= 1  and aid <= 5  ) category_[ii] = CATEGORY::QUARK;
   }
 
+  // Any of the selected bosons among the ancestors, memoized along the mother chain
   auto isFromBosons = [&](const unsigned i) {
-    for ( unsigned j : bosons ) if ( hasSpecificAncestor(i, j) ) return true;
-    return false;
-  };
-
-  for ( unsigned i : taus ) {
-    if ( !isFromBosons(i) ) continue;
-    int motherIdx = findFirst(in_GenPart_genPartIdxMother->At(i));
-    if ( motherIdx >= 0 ) {
-      auto match = indexMap.find(motherIdx);
-      motherIdx = (match == indexMap.end()) ? -1 : match->second;
-    }
-
-    out_pts.push_back(in_GenPart_pt->At(i));
-    out_etas.push_back(in_GenPart_eta->At(i));
-    out_phis.push_back(in_GenPart_phi->At(i));
-    out_masses.push_back(in_GenPart_mass->At(i));
-    out_pdgIds.push_back(in_GenPart_pdgId->At(i));
-    out_mothers.push_back(motherIdx);
-    indexMap[i] = nPartons;
-    ++nPartons;
-  }
-
-  for ( unsigned i : leptons ) {
-    if ( !isFromBosons(i) ) continue;
-    int motherIdx = findFirst(in_GenPart_genPartIdxMother->At(i));
-    if ( motherIdx >= 0 ) {
-      auto match = indexMap.find(motherIdx);
-      motherIdx = (match == indexMap.end()) ? -1 : match->second;
+    chain_.clear();
+    int j = i;
+    char result = ANCESTOR::NOT_FROM_BOSON;
+    while ( chain_.size() <= nGenPart ) {
+      const int motherIdx = in_GenPart_genPartIdxMother->At(j);
+      if ( motherIdx < 0 ) break;
+      if ( category_[motherIdx] == CATEGORY::BOSON ) { result = ANCESTOR::FROM_BOSON; break; }
+      if ( fromBoson_[motherIdx] != ANCESTOR::UNKNOWN ) { result = fromBoson_[motherIdx]; break; }
+      chain_.push_back(motherIdx);
+      j = motherIdx;
     }
+    fromBoson_[i] = result;
+    for ( const unsigned k : chain_ ) fromBoson_[k] = result;
+    return result == ANCESTOR::FROM_BOSON;
+  };
 
-    out_pts.push_back(in_GenPart_pt->At(i));
-    out_etas.push_back(in_GenPart_eta->At(i));
-    out_phis.push_back(in_GenPart_phi->At(i));
-    out_masses.push_back(in_GenPart_mass->At(i));
-    out_pdgIds.push_back(in_GenPart_pdgId->At(i));
-    out_mothers.push_back(motherIdx);
-    indexMap[i] = nPartons;
-    ++nPartons;
-  }
-
-  for ( unsigned i : neutrinos ) {
-    if ( !isFromBosons(i) ) continue;
-    int motherIdx = findFirst(in_GenPart_genPartIdxMother->At(i));
-    if ( motherIdx >= 0 ) {
-      auto match = indexMap.find(motherIdx);
-      motherIdx = (match == indexMap.end()) ? -1 : match->second;
+  // Fill top quarks first, then bosons, quarks, and the leptons from the bosons.
+  // The mother is linked only if it is already in the output, so the order matters.
+  partonIdx_.assign(nGenPart, -1);
+  for ( const char cat : {CATEGORY::TOP, CATEGORY::BOSON, CATEGORY::QUARK, CATEGORY::TAU, CATEGORY::LEPTON, CATEGORY::NEUTRINO} ) {
+    const bool checkBoson = (cat == CATEGORY::TAU or cat == CATEGORY::LEPTON or cat == CATEGORY::NEUTRINO);
+    for ( unsigned i=0; i<nGenPart; ++i ) {
+      if ( category_[i] != cat ) continue;
+      if ( checkBoson and !isFromBosons(i) ) continue;
+      addParton(i, cat == CATEGORY::TOP ? -1 : findFirst(in_GenPart_genPartIdxMother->At(i)));
     }
-
-    out_pts.push_back(in_GenPart_pt->At(i));
-    out_etas.push_back(in_GenPart_eta->At(i));
-    out_phis.push_back(in_GenPart_phi->At(i));
-    out_masses.push_back(in_GenPart_mass->At(i));
-    out_pdgIds.push_back(in_GenPart_pdgId->At(i));
-    out_mothers.push_back(motherIdx);
-    indexMap[i] = nPartons;
-    ++nPartons;
   }
 
   return true;
 }
-
@@ -63,6 +63,31 @@ void TTbarDoubleLeptonCppWorker::setMET(TTreeReaderValue<float>* pt, TTreeReader
   in_MET_phi = phi;
 }
 
+void TTbarDoubleLeptonCppWorker::initOutput(TTree* outTree) {
+  _doCppOutput = true;
+
+  const std::string varNames[] = {"pt", "eta", "phi", "mass"};
+  for ( unsigned i=0; i<4; ++i ) {
+    const std::string varName = "_"+varNames[i];
+    bookOutputBranch(outTree, "Lepton1"+varName, &out_Lepton1_p4[i], "/F");
+    bookOutputBranch(outTree, "Lepton2"+varName, &out_Lepton2_p4[i], "/F");
+    bookOutputBranch(outTree, "Z"+varName, &out_Z_p4[i], "/F");
+  }
+  bookOutputBranch(outTree, "MET_pt", &out_MET_pt, "/F");
+  bookOutputBranch(outTree, "MET_phi", &out_MET_phi, "/F");
+  bookOutputBranch(outTree, "Lepton1_pdgId", &out_Lepton1_pdgId, "/I");
+  bookOutputBranch(outTree, "Lepton2_pdgId", &out_Lepton2_pdgId, "/I");
+  bookOutputBranch(outTree, "Z_charge", &out_Z_charge, "/I");
+  // The counter branch has to be booked before the arrays using it
+  bookOutputBranch(outTree, "nGoodJet", &out_nGoodJet, "/i");
+  bookOutputBranch(outTree, "GoodJet_index", out_GoodJet_index, "[nGoodJet]/i");
+  for ( unsigned i=0; i<4; ++i ) {
+    bookOutputBranch(outTree, "GoodJet_"+varNames[i], out_GoodJet_p4[i], "[nGoodJet]/F");
+  }
+  bookOutputBranch(outTree, "GoodJet_CSVv2", out_GoodJet_CSVv2, "[nGoodJet]/F");
+  bookOutputBranch(outTree, "nBjet", &out_nBjet, "/i");
+}
+
 void TTbarDoubleLeptonCppWorker::resetValues() {
   for ( unsigned i=0; i<4; ++i ) {
     out_Lepton1_p4[i] = out_Lepton2_p4[i] = 0;
@@ -72,9 +97,6 @@ void TTbarDoubleLeptonCppWorker::resetValues() {
   out_Z_charge = 0;
   out_MET_pt = out_MET_phi = 0;
   out_nGoodJet = out_nBjet = 0;
-  for ( unsigned i=0; i<4; ++i ) out_GoodJet_p4[i].clear();
-  out_GoodJet_CSVv2.clear();
-  out_GoodJet_index.clear();
 }
 
 bool TTbarDoubleLeptonCppWorker::isGoodMuon(const unsigned i) const {
@@ -209,6 +231,7 @@ bool TTbarDoubleLeptonCppWorker::analyze() {
     jetIdxsByBDiscr.push_back(i);
     if ( in_Jet_CSVv2->At(i) > minBjetBDiscr_ ) ++out_nBjet;
   }
+  if ( jetIdxsByPt.size() > maxNGoodJet_ ) jetIdxsByPt.resize(maxNGoodJet_);
   out_nGoodJet = jetIdxsByPt.size();
 
   // Sort jets by CSVv2iminator
@@ -218,9 +241,9 @@ bool TTbarDoubleLeptonCppWorker::analyze() {
             [&](const unsigned short i, const unsigned short j){ return in_Jet_CSVv2->At(i) > in_Jet_CSVv2->At(j); });
   for ( unsigned k=0, n=out_nGoodJet; k<n; ++k ) {
     const unsigned kk = jetIdxsByBDiscr.at(k);
-    for ( unsigned i=0; i<4; ++i ) out_GoodJet_p4[i].push_back(in_Jet_p4[i]->At(kk));
-    out_GoodJet_CSVv2.push_back(in_Jet_CSVv2->At(kk));
-    out_GoodJet_index.push_back(kk);
+    for ( unsigned i=0; i<4; ++i ) out_GoodJet_p4[i][k] = in_Jet_p4[i]->At(kk);
+    out_GoodJet_CSVv2[k] = in_Jet_CSVv2->At(kk);
+    out_GoodJet_index[k] = kk;
   }
 
   return true;
@@ -2,21 +2,47 @@
 import yaml
 import sys, os
 import subprocess
+import shutil
+import time
+import hashlib, json
 from glob import glob
 from multiprocessing import Pool, cpu_count
 
-def runCmd(cmd):
-    os.system(cmd)
+def runCmd(cmd, logFile):
+    ## Exit code and wall time of the command, with its output in the log file
+    t0 = time.time()
+    with open(logFile, "w") as log:
+        status = subprocess.call(cmd, shell=True, stdout=log, stderr=subprocess.STDOUT)
+    return status, time.time()-t0
+
+def fileStamps(din):
+    ## Name, size and modification time of the input ntuples, to see their changes without reading them
+    return [[os.path.basename(f), os.path.getsize(f), int(os.path.getmtime(f))] for f in sorted(glob(din+"/*_Skim.root"))]
+
+def contentHash(*objs):
+    return hashlib.sha1(json.dumps(objs, sort_keys=True)).hexdigest()
 
 if __name__ == '__main__':
-    pool = Pool(processes=min(cpu_count, 20))
+    ## Number of jobs running together, NJOBS or the number of CPUs up to 20
+    nJobs = int(os.environ.get("NJOBS", min(cpu_count(), 20)))
+    ## The ntuple directories larger than CHUNKSIZE MB are split into chunks of files, merged back per output
+    chunkSize = float(os.environ.get("CHUNKSIZE", 2000))*1e6
 
     ## Load all information
     histSetFile = "config/histogramming.yaml"
     datasetConfig = {}
     for f in glob("config/datasets/*.yaml"): datasetConfig.update(yaml.load(open(f))['dataset'])
     procInfo = yaml.load(open("config/grouping.yaml"))["processes"]
-    #systConfig = yaml.load(open("config/systematics.yaml"))["systematics"] ## FIXME: To be implemented later
+    ## The weight variations of the systematics are filled with the nominal histograms (hZ_mass__pileup_up...).
+    ## By default only the ones with a few variations, the arrays of variations (PDF, ~100 histograms for each one)
+    ## are added with SYSTS=all. Set SYSTS=name1,name2 to fill only these ones, or SYSTS=none to skip them
+    systOpt = ""
+    systs = os.environ.get("SYSTS", "")
+    if os.path.exists("config/systematics.yaml") and systs != "none":
+        if systs == "":
+            systInfo = yaml.load(open("config/systematics.yaml"))['systematics']
+            systs = ",".join(sorted(x for x, y in systInfo.iteritems() if y['type'] == 'weight' and 'nVariation' not in y))
+        if systs != "": systOpt = "-s config/systematics.yaml" + ("" if systs == "all" else ":"+systs)
 
     ## Build CMS official dataset full name to process group mapping
     dsetfullname2procs = {}
@@ -27,15 +53,34 @@ if __name__ == '__main__':
                 if dsetfullname not in dsetfullname2procs: dsetfullname2procs[dsetfullname] = []
                 dsetfullname2procs[dsetfullname].append(proc)
 
-    if os.path.exists("raw_hist"):
+    ## The outputs are rebuilt only if their inputs changed, the manifest keeps what each of them was built from:
+    ## the files of the ntuple directory, the histogramming config, the cut and weight of the process and the systematics.
+    ## Set REBUILD=1 to start from scratch
+    manifestFile = "raw_hist/manifest.yaml"
+    manifest = {}
+    if os.environ.get("REBUILD") != "1" and os.path.exists(manifestFile):
+        manifest = yaml.load(open(manifestFile))["outputs"]
+    elif os.path.exists("raw_hist"):
       path = "raw_hist"
       subprocess.call(["rm", "-rf", path])
-    ress = []
+    histSet = yaml.load(open(histSetFile))
+    histSetHash = contentHash(histSet)
+    systHash = contentHash(systOpt, yaml.load(open("config/systematics.yaml")) if systOpt else None)
+
+    ## Histograms of a target, with the weight one of each step
+    nHists = sum(1+len(step['hists'] if 'hists' in step else []) for step in histSet['steps'])
+
+    newManifest = {}
+    nUpToDate = 0
+    jobs = [] ## (ntuple directory, targets, outputs, chunks of (file name, size))
     for din in glob("ntuple/*/*/*"):
         mode, dataset = din.split('/')[2:]
         dataset = '/'+dataset.replace('.', '/')
         if dataset not in dsetfullname2procs: continue
 
+        ## All the processes made from this ntuple directory are filled in one pass, one target each
+        targets, fOuts = [], []
+        stamps = fileStamps(din)
         for proc in dsetfullname2procs[dataset]:
             config = procInfo[proc]
             if 'modes' in config and mode not in config['modes']: continue
@@ -45,8 +90,80 @@ if __name__ == '__main__':
             cut = config['cut'] if 'cut' in config else '1'
             weight = config['weight'] if 'weight' in config else '1'
 
+            fOut = "%s/%s.root" % (dout, os.path.basename(din))
+            newManifest[fOut] = {'hash':contentHash(stamps, histSetHash, systHash, cut, weight),
+                                 'ntuples':din, 'files':stamps[:], 'cut':cut, 'weight':weight,
+                                 'histogramming':histSetHash, 'systematics':systOpt}
+            if fOut in manifest and manifest[fOut]['hash'] == newManifest[fOut]['hash'] and os.path.exists(fOut):
+                nUpToDate += 1
+                continue
+            if os.path.exists(fOut): os.remove(fOut)
+            if os.path.exists(fOut[:-5]+"_chunks"): shutil.rmtree(fOut[:-5]+"_chunks")
+
+            targets.append("-t '%s' '%s' %s" % (cut, weight, dout))
+            fOuts.append(fOut)
+        if len(targets) == 0: continue
+
+        chunks = [[]]
+        for fName, size in [(x[0], x[1]) for x in stamps]:
+            if len(chunks[-1]) > 0 and sum(x[1] for x in chunks[-1])+size > chunkSize: chunks.append([])
+            chunks[-1].append((fName, size))
+        jobs.append((din, targets, fOuts, chunks))
+
+    ## The outputs no longer made, e.g. of a process removed from grouping.yaml
+    nRemoved = 0
+    for fOut in manifest:
+        if fOut in newManifest or not os.path.exists(fOut): continue
+        os.remove(fOut)
+        nRemoved += 1
+    print "%d outputs up to date, %d to rebuild, %d removed" % (nUpToDate, sum(len(x[2]) for x in jobs), nRemoved)
+
+    ## One task per chunk, the most expensive ones first (bytes x histograms) not to be left at the end
+    ## The logs are kept out of raw_hist, where every directory is taken as a channel by 03_scalemerge.py
+    if not os.path.exists("raw_hist_logs"): os.makedirs("raw_hist_logs")
+    tasks = []
+    for din, targets, fOuts, chunks in jobs:
+        for k, chunk in enumerate(chunks):
             #os.system("NPROC=$(nproc) tzwi-makehistograms %s %s %s %s" % (cut, weight, histSetFile, d))
-            res = pool.apply_async(os.system, ("tzwi-makehistograms '%s' '%s' %s %s %s" % (cut, weight, histSetFile, din, dout),))
-            ress.append(res)
+            cmd = "tzwi-makehistograms %s %s %s %s" % (systOpt, histSetFile, din, " ".join(targets))
+            if len(chunks) > 1: cmd += " -c %d:%s" % (k, ",".join(x[0] for x in chunk))
+            logFile = "raw_hist_logs/%s.%s.%d.log" % (din.split('/')[2], os.path.basename(din), k)
+            cost = sum(x[1] for x in chunk)*len(targets)*nHists
+            tasks.append((cost, din, k, cmd, logFile))
+    tasks.sort(key=lambda x: -x[0])
+
+    pool = Pool(processes=nJobs)
+    results = {}
+    for cost, din, k, cmd, logFile in tasks:
+        results[(din, k)] = (pool.apply_async(runCmd, (cmd, logFile)), logFile)
+    pool.close()
+    for i, (cost, din, k, cmd, logFile) in enumerate(tasks):
+        status, dt = results[(din, k)][0].get()
+        results[(din, k)] = (status, logFile)
+        print "[%d/%d] %s chunk %d: %s in %.0f s" % (i+1, len(tasks), din, k, "done" if status == 0 else "FAILED", dt)
+    pool.join()
+
+    ## Merge the chunks of each output, the outputs of the failed chunks are made again by the next run
+    for din, targets, fOuts, chunks in jobs:
+        failed = [k for k in range(len(chunks)) if results[(din, k)][0] != 0]
+        for k in failed:
+            print "Failed %s chunk %d (exit code %d), see %s" % (din, k, results[(din, k)][0], results[(din, k)][1])
+        for fOut in fOuts:
+            chunkDir = fOut[:-5]+"_chunks"
+            if len(failed) == 0 and len(chunks) > 1:
+                chunkFiles = ["%s/%d.root" % (chunkDir, k) for k in range(len(chunks))]
+                if subprocess.call(["hadd", "-f", fOut]+chunkFiles, stdout=open(os.devnull, "w")) != 0:
+                    print "Failed to merge the chunks of %s" % fOut
+                    if os.path.exists(fOut): os.remove(fOut)
+            if os.path.exists(chunkDir): shutil.rmtree(chunkDir)
+            if len(failed) == 0 and os.path.exists(fOut): continue
+            print "Failed to make %s, to be rebuilt by the next run" % fOut
+            ## A partial output of a failed task would be merged by 03_scalemerge.py
+            if os.path.exists(fOut): os.remove(fOut)
+            del newManifest[fOut]
 
-    for r in ress: r.get()
+    ## raw_hist is not there if no ntuple directory matched after the cleanup
+    if not os.path.exists("raw_hist"): os.makedirs("raw_hist")
+    tmpFile = "%s.%d" % (manifestFile, os.getpid())
+    with open(tmpFile, "w") as f: yaml.dump({"outputs":newManifest}, f)
+    os.rename(tmpFile, manifestFile)
@@ -5,7 +5,8 @@ from glob import *
 from ROOT import *
 import os
 
-modes = [os.path.basename(x) for x in glob("raw_hist/*")]
+## The channels, skipping the logs of the former 02_make_histograms.py
+modes = [os.path.basename(x) for x in glob("raw_hist/*") if os.path.isdir(x) and os.path.basename(x) != "logs"]
 odName = "hist"
 
 ## Load configurations
@@ -41,6 +42,18 @@ for mode in modes:
         fin = TFile(f)
         fins[f.split('/',1)[-1]] = fin
 
+    ## Weight variations of the histograms, filled by tzwi-makehistograms as S1/hZ_mass__pileup_up...
+    variations = {}
+    for fin in fins.values():
+        for stepInfo in info['steps']:
+            d = fin.GetDirectory(stepInfo['name'])
+            if d == None: continue
+            for key in d.GetListOfKeys():
+                if '__' not in key.GetName(): continue
+                hName, varName = key.GetName().split('__', 1)
+                if "%s/%s" % (stepInfo['name'], hName) not in variations: variations["%s/%s" % (stepInfo['name'], hName)] = set()
+                variations["%s/%s" % (stepInfo['name'], hName)].add(varName)
+
     ## Loop over steps x histograms
     print "@@ Collecting source histograms...", mode
     for stepInfo in info['steps']:
@@ -50,44 +63,54 @@ for mode in modes:
             hinPath = "%s/h%s" % (stepInfo['name'], hName)
             print hName,
 
-            ## open raw_hist root files
-            for proc, procInfo in info['processes'].iteritems():
-                title = procInfo['title']
-                longTitle = procInfo['longTitle'] if 'longTitle' in procInfo else title
-
-                houtPath = "%s/%s" % (hinPath, title)
-                if houtPath not in houts: houts[houtPath] = []
-
-                for datasetGroup in procInfo['datasets']:
-                    if datasetGroup not in info['dataset']: continue
-                    physProcName = datasetGroup.split('.')[1]
-
-                    xsec = 1.0
-                    if physProcName in info['crosssection']:
-                        xsec = info['crosssection'][physProcName]
-                    elif title != "Data":
-                        print "Could not find", physProcName, "in the cross section list. setting it to be 1.0"
-
-                    hout = None
-                    nEvents = 0.
-                    for ds in info['dataset'][datasetGroup].keys():
-                        fName = "%s/%s/%s.root" % (mode, proc, ds[1:].replace('/', '.'))
-                        if fName not in fins: continue
-                        fin = fins[fName]
-                        hin = fin.Get(hinPath)
-                        if hin == None: continue
-
-                        nEvents += fin.Get("hCutFlow").GetBinContent(1)
-
-                        if hout == None:
-                            hout = hin.Clone()
-                            hout.SetTitle(longTitle)
-                            hout.Reset()
-                        hout.Add(hin)
-                    if hout == None: continue
-                    if nEvents != 0.: hout.Scale(xsec/nEvents)
-
-                    houts[houtPath].append(hout)
+            ## The nominal, then the variations with the same scaling and merging
+            for varName in [None]+sorted(variations.get(hinPath, [])):
+                hvarPath = hinPath if varName == None else "%s__%s" % (hinPath, varName)
+
+                ## open raw_hist root files
+                for proc, procInfo in info['processes'].iteritems():
+                    title = procInfo['title']
+                    longTitle = procInfo['longTitle'] if 'longTitle' in procInfo else title
+
+                    houtPath = "%s/%s" % (hvarPath, title)
+                    if houtPath not in houts: houts[houtPath] = []
+
+                    ## The datasets without the variation (e.g. without the weight branch) enter with the nominal,
+                    ## as well as the processes without it in any of their datasets, not to lose them in the varied totals.
+                    ## Data is not varied, it is kept in the nominal only
+                    procHists, isKept = [], varName == None or title != "Data"
+                    for datasetGroup in procInfo['datasets']:
+                        if datasetGroup not in info['dataset']: continue
+                        physProcName = datasetGroup.split('.')[1]
+
+                        xsec = 1.0
+                        if physProcName in info['crosssection']:
+                            xsec = info['crosssection'][physProcName]
+                        elif title != "Data" and varName == None:
+                            print "Could not find", physProcName, "in the cross section list. setting it to be 1.0"
+
+                        hout = None
+                        nEvents = 0.
+                        for ds in info['dataset'][datasetGroup].keys():
+                            fName = "%s/%s/%s.root" % (mode, proc, ds[1:].replace('/', '.'))
+                            if fName not in fins: continue
+                            fin = fins[fName]
+                            hin = fin.Get(hvarPath)
+                            if hin == None and varName != None: hin = fin.Get(hinPath)
+                            if hin == None: continue
+
+                            nEvents += fin.Get("hCutFlow").GetBinContent(1)
+
+                            if hout == None:
+                                hout = hin.Clone()
+                                hout.SetTitle(longTitle)
+                                hout.Reset()
+                            hout.Add(hin)
+                        if hout == None: continue
+                        if nEvents != 0.: hout.Scale(xsec/nEvents)
+
+                        procHists.append(hout)
+                    if isKept: houts[houtPath].extend(procHists)
         print ""
 
     print "Writing output..."
@@ -5,7 +5,16 @@ baseDir = "NanoAOD/2016"
 #baseDir = "NanoAOD/2017"
 
 nFilePerJob = int(os.environ["NFILE"]) if "NFILE" in os.environ else 5
+## Worker processes per job splitting the input by entry ranges, for the multi-core batch slots
+nWorkers = int(os.environ["NWORKERS"]) if "NWORKERS" in os.environ else 1
+envPrefix = "env NWORKERS=%d " % nWorkers if nWorkers > 1 else ""
+## PERF=1 writes the performance sidecars in the outputs, summed by tzwi-perf-summary on the submit directory
+if os.environ.get("PERF", "0") == "1": envPrefix = (envPrefix if envPrefix else "env ")+"PERF=1 "
+## PROFILE=compact or compactLossy selects the output profile of the ntuples
+if os.environ.get("PROFILE"): envPrefix = (envPrefix if envPrefix else "env ")+"PROFILE=%s " % os.environ["PROFILE"]
 if not os.path.exists("submit_2016"): os.mkdir("submit_2016")
+## Compile the C++ workers once here, the jobs load the library from the cache (see tzwi-build-workers)
+if os.system("tzwi-build-workers") != 0: raise SystemExit("Failed to build the worker library")
 
 import yaml
 from glob import glob
@@ -28,13 +37,21 @@ for proc in procInfo:
                 toSubmit[fList].extend(procInfo[proc]['modes'] if 'modes' in procInfo[proc] else modes)
 for v in toSubmit.values(): v = set(v)
 
+## All the modes of a file list are processed in one job reading the input once,
+## set SPLITMODES=1 to submit one job per mode as before
+splitModes = os.environ.get("SPLITMODES", "0") == "1"
+
 from math import ceil
-for fList, modes in toSubmit.iteritems():
-    for mode in modes:
+for fList, fModes in toSubmit.iteritems():
+    fModes = [m for m in modes if m in fModes] + sorted(set(m for m in fModes if m not in modes))
+    modeGroups = [[m] for m in fModes] if splitModes else [fModes]
+    for modeGroup in modeGroups:
         nFiles = len([x for x in open(fList).readlines() if len(x) != 0 and x[0] != '#'])
         nJobs = ceil(1.*nFiles/nFilePerJob)
 
-        jobName = "%s.%s" % (mode, os.path.basename(fList)[:-4])
-        cmd = "cd submit_2016; create-batch bash ../01_prod_ntuple.sh %s ../%s %d --jobName %s -T --nJobs %d" % (mode, fList, nFilePerJob, jobName, nJobs)
+        mode = ",".join(modeGroup)
+        modeName = modeGroup[0] if len(modeGroup) == 1 else ("AllModes" if modeGroup == modes else "-".join(modeGroup))
+        jobName = "%s.%s" % (modeName, os.path.basename(fList)[:-4])
+        cmd = "cd submit_2016; create-batch %sbash ../01_prod_ntuple.sh %s ../%s %d --jobName %s -T --nJobs %d" % (envPrefix, mode, fList, nFilePerJob, jobName, nJobs)
         os.system(cmd)
 
@@ -5,24 +5,31 @@ if [ $# != 4 ]; then
     echo "Usage: $0 MuElEl MC2016.WW.txt 10 5 ## process WW sample assuming muee channel, split by 10 files and run 5th section"
     echo "Usage: $0 ElElEl MC2017.TT_powheg.txt 1 0 ## process TTbar sample assuming eee channel, one file per each section and run 0th one."
     echo "Usage: $0 MuMuMu Run2016B.DoubleMuon.txt 1 0"
+    echo "Usage: $0 ElElEl,MuElEl,ElMuMu,MuMuMu MC2016.WW.txt 10 5 ## several channels from one pass over the input"
     exit 1
 fi
 
 eval `scram runtime -sh`
 
-CHANNEL=$1
+CHANNELS=
+for CHANNEL in $(echo $1 | tr ',' ' '); do
+  case $CHANNEL in
+    ElElMu|ElMuEl)
+      CHANNEL=MuElEl
+      ;;
+    MuMuEl|MuElMu)
+      CHANNEL=ElMuMu
+      ;;
+  esac
+  CHANNELS="$CHANNELS,$CHANNEL"
+done
+CHANNELS=${CHANNELS:1}
 FILELIST=$2
 MAXFILES=$3
 JOBNUMBER=$4
-
-case $CHANNEL in
-  ElElMu|ElMuEl)
-    CHANNEL=MuElEl
-    ;;
-  MuMuEl|MuElMu)
-    CHANNEL=ElMuMu
-    ;;
-esac
+## With several channels, the channel dependent modules and output paths are filled by tzwi-postproc-multichannel
+CHANNEL=$CHANNELS
+[ $CHANNELS != ${CHANNELS/,/} ] && CHANNEL="{mode}"
 
 DATASET0=`basename $FILELIST | sed -e 's;.txt;;g'`
 DATASET='/'`echo $DATASET0 | sed -e 's;\.;/;g'`
@@ -31,7 +38,7 @@ ERA=$(echo $DATASET0 | cut -d. -f2 | cut -d- -f1 | sed -e 's;NanoAOD;;g')
 DATATYPE=$(basename $(dirname $FILELIST) | cut -d. -f1)
 YEAR=${DATATYPE:(-4)}
 if [ ${DATATYPE::3} == "Run" ]; then
-  HLTMODULE=${ERA::8}_$(echo $DATASET | cut -d/ -f2)
+  HLTMODULE=${ERA::7}_$(echo $DATASET | cut -d/ -f2)
 else
   HLTMODULE=$(echo $DATATYPE | cut -d_ -f1)
 fi
@@ -41,19 +48,46 @@ FILENAMES=$(cat $FILELIST | xargs -n$MAXFILES | sed -n "$(($JOBNUMBER+1)) p" | s
 ARGS=""
 ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.flags flags_${DATATYPE}"
 ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.fcncTriLeptonHLT hlt_${HLTMODULE}"
-ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.fcncTriLepton fcnc_${CHANNEL}_${YEAR}"
+## Preselection on the lepton multiplicity, the lepton branches are read only for the events passing it
+ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.ObjectCountFilter presel_TriLepton"
+## Set JETVAR=1 to write the JES/JER variations of the jet outputs (nGoodJet_jesUp, KinTopWb_mass_jerDown...)
+## in the same pass, the MC input has to carry the jetmetUncertainties columns (Jet_pt_jesTotalUp...)
+FCNCMODULE=fcnc
+[ _$JETVAR == _1 -a ${DATATYPE::2} == "MC" ] && FCNCMODULE=fcncJetVar
+ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.fcncTriLepton ${FCNCMODULE}_${CHANNEL}_${YEAR}"
 ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.fcncTriLeptonCutFlow cutFlow_${CHANNEL}"
-ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.fcncKinematicReco fcncKinReco_${CHANNEL}"
-ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.fcncMVAinput fcncMVAinput"
+## Set KINRECOCHECK=1 to compare the C++ kinematic reconstruction with the python one event by event
+KINRECO=fcncKinReco
+[ _$KINRECOCHECK == _1 ] && KINRECO=fcncKinRecoCheck
+ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.fcncKinematicReco ${KINRECO}_${CHANNEL}"
+## Set MVAINPUTFIX=1 for the corrected MVA input definitions, the BDT has to be trained again with them
+MVAINPUT=fcncMVAinput
+[ _$MVAINPUTFIX == _1 ] && MVAINPUT=fcncMVAinputFixed
+## The default MVA inputs carry values over from the previous event, the parts of NWORKERS>1 start from zeros
+[ _$NWORKERS != _ -a _$NWORKERS != _1 -a $MVAINPUT == fcncMVAinput ] && \
+    echo "WARNING: MVAinput_* of the rejected events differ from NWORKERS=1 at the start of each part, set MVAINPUTFIX=1 to avoid it"
+ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.fcncMVAinput ${MVAINPUT}"
 
 #CMD="nano_postproc.py --friend"
 #ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.CopyBranch copyBranch"
 BRANCHSEL="$CMSSW_BASE/src/TZWi/NanoAODProduction/data/branchsel.txt"
 CMD="nano_postproc.py --bo $BRANCHSEL"
+## Batched event loop, set BATCHSIZE=0 to use the per-event loop of nano_postproc.py
+[ _$BATCHSIZE == _ ] && BATCHSIZE=1000
+## Number of processes splitting the input by entry ranges, set NWORKERS to the number of cores of the batch slot
+[ _$NWORKERS == _ ] && NWORKERS=1
+## Set PERF=1 to write the time per module, event latency and bytes read per branch to *_perf.json (see tzwi-perf-summary)
+PERFOPT=
+[ _$PERF == _1 ] && PERFOPT="--perf json,hist"
+## Set PROFILE=compact (or compactLossy) for the narrow integer types, LZ4 and tuned baskets of the output (see outputProfile.py)
+PROFILEOPT=
+[ _$PROFILE != _ ] && PROFILEOPT="--profile $PROFILE"
+[ $BATCHSIZE -gt 0 -o $NWORKERS -gt 1 -o _$PERF == _1 -o _$PROFILE != _ ] && CMD="tzwi-postproc --batch $BATCHSIZE --workers $NWORKERS $PERFOPT $PROFILEOPT --bo $BRANCHSEL"
+[ $CHANNEL == "{mode}" ] && CMD="tzwi-postproc-multichannel --modes $CHANNELS --batch $BATCHSIZE --workers $NWORKERS $PERFOPT $PROFILEOPT --bo $BRANCHSEL"
 
 #OUTPATH=ntuple/reco/$CHANNEL/$DATASET0
 OUTPATH=ntuple_$YEAR/reco/$CHANNEL/$DATASET0
-[ ! -d $OUTPATH ] && mkdir -p $OUTPATH
+[ $CHANNEL != "{mode}" -a ! -d $OUTPATH ] && mkdir -p $OUTPATH
 if [ ${DATATYPE::2} == "MC" ]; then
     ARGS="-I PhysicsTools.NanoAODTools.postprocessing.modules.common.countHistogramsModule countHistogramsModule $ARGS"
     #ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.CopyBranch copyMCBranch"
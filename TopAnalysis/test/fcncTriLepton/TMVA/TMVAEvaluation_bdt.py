@@ -38,6 +38,36 @@ for f in glob(rootDir+"config/datasets/*16*.yaml"):
 
 #for mc syst name
 syst = ["origin", "jesUp", "jesDown", "jerUp", "jerDown"]
+#jes/jer variations from the suffixed branches of the nominal ntuple (JETVAR=1 in 01_prod_ntuple.sh),
+#or from the separate FCNC_2016_jes*/jer* ntuples. None to take the suffixed branches if the nominal ntuples have them
+inSituJetSyst = None
+#branches depending on the jets and MET, which have the "_jesUp" etc. suffix for the variations
+def isJetDependent(branchName):
+    return branchName in ["nGoodJet", "nBjet", "W_MT", "MET_pt", "MET_phi"] or \
+           branchName.startswith("KinTop") or branchName.startswith("MVAinput_")
+def hasJetVariations(dName):
+    #the MC ntuples made with JETVAR=1 have nGoodJet_jesUp etc., never the data ones. The first file of each MC dataset is checked
+    found = []
+    for dsName in sorted(glob(dName+"/reco/%s/MC*" % mode)):
+        fNames = sorted(glob(dsName+"/*.root"))
+        if len(fNames) == 0: continue
+        f = TFile.Open(fNames[0])
+        tree = f.Get("Events") if f else None
+        found.append(tree != None and all(tree.GetBranch("nGoodJet_"+x) != None for x in syst if x != "origin"))
+        if f: f.Close()
+    if len(set(found)) > 1:
+        print "Only some of the MC ntuples in %s have the jes/jer variations, set inSituJetSyst" % dName
+        sys.exit(1)
+    return len(found) > 0 and found[0]
+if inSituJetSyst == None:
+    inSituJetSyst = hasJetVariations(rootDir+ntupleDir)
+    print "jes/jer variations from", ("the suffixed branches of "+ntupleDir) if inSituJetSyst else "the separate ntuples"
+def setAddress(tree, name, buf):
+    #a missing branch would leave the -999 of the buffer in the inputs
+    if tree.GetBranch(name) == None:
+        print "Cannot find the branch %s in the input ntuples" % name
+        sys.exit(1)
+    tree.SetBranchAddress(name, buf)
 syst_forWeight = ["genWeight", "Electron_SF", "Electron_SFerr", "MuonID_SF", "MuonID_SFerr", "MuonISO_SF", "MuonISO_SFerr", "Trigger_SF", "puWeight", "puWeightUp", "puWeightDown", "BtagWeight"]
 #weight from origin: "LHEScaleWeight[4]*genWeight/abs(genWeight)*puWeight*BtagWeight*Trigger_SF*Electron_SF*MuonID_SF*MuonISO_SF
 #ElSF up/down -> up/down: Electron_SF +- Electron_SFerr
@@ -59,7 +89,12 @@ elif channel == "STZct" or channel == "STZut":
 #for each_bkg in bkg_others:
 #channel = sys.argv[1], mode = sys.argv[2]
 for systjet in syst:
-    if systjet == "jesUp":
+    #name of the branch to read for this variation
+    sfx = "_"+systjet if inSituJetSyst and systjet != "origin" else ""
+    branchFor = lambda name: name+sfx if isJetDependent(name) else name
+    if sfx != "":
+        dName = rootDir + ntupleDir
+    elif systjet == "jesUp":
         ntupleDir = 'FCNC_2016_jesTotalUp'
         dName = kisti_store + ntupleDir
         #ntupleDir = 'ntuple_2016_jesTotalUp'
@@ -100,7 +135,7 @@ for systjet in syst:
             else: continue
             out_tree = TTree("Events", "Events")
             fLists_input = []
-            if systjet == "origin":
+            if systjet == "origin" or inSituJetSyst:
                 for datasetName in datasetInfo['dataset'][datasetGroup].keys():
                     fLists_input.append(glob(dName+"/reco/%s/%s" % (mode, datasetName[1:].replace('/','.'))))
             else:
@@ -124,16 +159,16 @@ for systjet in syst:
                 if branchName in input_features:
                     branches[branchName] = array('f', [-999])
                     reader.AddVariable(branchName, branches[branchName])
-                    input_tree.SetBranchAddress(branchName, branches[branchName])
+                    setAddress(input_tree, branchFor(branchName), branches[branchName])
                 if branchName in ["LeadingLepton_pt", "Z_charge", "nGoodLepton", "GoodLeptonCode", "MVAinput_Status"]:
                     branches[branchName] = array('f', [-999])
                     reader.AddSpectator(branchName, branches[branchName])
                 if branchName in ["HLT", "nGoodJet", "nBjet"]:
                     branches[branchName] = array('f', [-999])
-                    input_tree.SetBranchAddress(branchName, branches[branchName])
+                    setAddress(input_tree, branchFor(branchName), branches[branchName])
                 if branchName in syst_forWeight:
                     branches[branchName] = array('f', [-999])
-                    input_tree.SetBranchAddress(branchName, branches[branchName])
+                    setAddress(input_tree, branchName, branches[branchName])
 
             #if channel == "TTZct" or channel == "TTZut":
             #    reader.BookMVA('BDTG_TT', TString(os.path.join(rootDir,weightDir,'TMVAClassification_BDTG_TT.weights.xml')))
@@ -194,19 +229,20 @@ for systjet in syst:
             out_tree.Branch('nGoodLepton', nGoodLepton, 'nGoodLepton/I')
             out_tree.Branch('MVAinput_Status', MVAinput_Status, 'MVAinput_Status/i')
 
+            nGoodJetName, nBjetName, W_MTName, statusName = [branchFor(x) for x in ["nGoodJet", "nBjet", "W_MT", "MVAinput_Status"]]
             print totevent
             for i in xrange(totevent):
                 input_tree.GetEntry(i)
                 if channel == "TTZct" or channel == "TTZut":
                     #TTSR
-                    if not(input_tree.HLT == 1 and abs(input_tree.Z_mass-91.2) < 7.5 and input_tree.nGoodJet > 1 and input_tree.nGoodJet <= 3 and input_tree.nBjet >= 1 and abs(input_tree.GoodLeptonCode) == 111 and input_tree.nGoodLepton == 3 and input_tree.LeadingLepton_pt > 25 and input_tree.Z_charge == 0 and input_tree.W_MT <= 300): continue
+                    if not(input_tree.HLT == 1 and abs(input_tree.Z_mass-91.2) < 7.5 and getattr(input_tree, nGoodJetName) > 1 and getattr(input_tree, nGoodJetName) <= 3 and getattr(input_tree, nBjetName) >= 1 and abs(input_tree.GoodLeptonCode) == 111 and input_tree.nGoodLepton == 3 and input_tree.LeadingLepton_pt > 25 and input_tree.Z_charge == 0 and getattr(input_tree, W_MTName) <= 300): continue
                     #score[0] = reader.EvaluateMVA('BDTG_TT')
                     score[0] = reader.EvaluateMVA('BDTG')
                     nEvent[0] = input_tree.event
                     nGoodLepton[0] = input_tree.nGoodLepton
                     LeadingLepton_pt[0] = input_tree.LeadingLepton_pt
                     Z_charge[0] = input_tree.Z_charge
-                    MVAinput_Status[0] = input_tree.MVAinput_Status
+                    MVAinput_Status[0] = getattr(input_tree, statusName)
                     if "Data" not in procInfo[proc]['title']:
                     #MuR up / down -> LHEScaleWeight[7] / [1]
                     #MuF up/down -> LHEScaleWeight[5] / [3]
@@ -234,14 +270,14 @@ for systjet in syst:
                     out_tree.Fill()
                 elif channel == "STZct" or channel == "STZut":
                     #STSR
-                    if not(input_tree.HLT == 1 and abs(input_tree.Z_mass-91.2) < 7.5 and input_tree.nGoodJet == 1 and input_tree.nBjet == 1 and abs(input_tree.GoodLeptonCode) == 111 and input_tree.nGoodLepton == 3 and input_tree.LeadingLepton_pt > 25 and input_tree.Z_charge == 0 and input_tree.W_MT <= 300): continue
+                    if not(input_tree.HLT == 1 and abs(input_tree.Z_mass-91.2) < 7.5 and getattr(input_tree, nGoodJetName) == 1 and getattr(input_tree, nBjetName) == 1 and abs(input_tree.GoodLeptonCode) == 111 and input_tree.nGoodLepton == 3 and input_tree.LeadingLepton_pt > 25 and input_tree.Z_charge == 0 and getattr(input_tree, W_MTName) <= 300): continue
                     #score[0] = reader.EvaluateMVA('BDTG_ST')
                     score[0] = reader.EvaluateMVA('BDTG')
                     nEvent[0] = input_tree.event
                     nGoodLepton[0] = input_tree.nGoodLepton
                     LeadingLepton_pt[0] = input_tree.LeadingLepton_pt
                     Z_charge[0] = input_tree.Z_charge
-                    MVAinput_Status[0] = input_tree.MVAinput_Status
+                    MVAinput_Status[0] = getattr(input_tree, statusName)
                     if "Data" not in procInfo[proc]['title']:
                         if not input_tree.LHEScaleWeight:
                             LHEScaleWeight[0] = LHEScaleWeight_MuRUp[0] = LHEScaleWeight_MuRDown[0] = LHEScaleWeight_MuFUp[0] = LHEScaleWeight_MuFDown[0] = 0
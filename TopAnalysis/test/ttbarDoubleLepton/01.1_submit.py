@@ -4,6 +4,11 @@ modes = ["ElEl", "MuEl", "MuMu"]
 baseDir = "NanoAOD/2016"
 
 nFilePerJob = int(os.environ["NFILE"]) if "NFILE" in os.environ else 5
+## Worker processes per job splitting the input by entry ranges, for the multi-core batch slots
+nWorkers = int(os.environ["NWORKERS"]) if "NWORKERS" in os.environ else 1
+envPrefix = "env NWORKERS=%d " % nWorkers if nWorkers > 1 else ""
+## PERF=1 writes the performance sidecars in the outputs, summed by tzwi-perf-summary on the submit directory
+if os.environ.get("PERF", "0") == "1": envPrefix = (envPrefix if envPrefix else "env ")+"PERF=1 "
 if not os.path.exists("submit"): os.mkdir("submit")
 
 import yaml
@@ -33,6 +38,6 @@ for fList, modes in toSubmit.iteritems():
         nJobs = ceil(1.*nFiles/nFilePerJob)
 
         jobName = "%s.%s" % (mode, os.path.basename(fList)[:-4])
-        cmd = "cd submit; create-batch bash ../01_prod_ntuple.sh %s ../%s %d --jobName %s -T --nJobs %d" % (mode, fList, nFilePerJob, jobName, nJobs)
+        cmd = "cd submit; create-batch %sbash ../01_prod_ntuple.sh %s ../%s %d --jobName %s -T --nJobs %d" % (envPrefix, mode, fList, nFilePerJob, jobName, nJobs)
         os.system(cmd)
 
@@ -24,7 +24,7 @@ ERA=$(echo $DATASET0 | cut -d. -f2 | cut -d- -f1 | sed -e 's;NanoAOD;;g')
 DATATYPE=$(basename $(dirname $FILELIST) | cut -d. -f1)
 YEAR=${DATATYPE:(-4)}
 if [ ${DATATYPE::3} == "Run" ]; then
-  HLTMODULE=${ERA::8}_$(echo $DATASET | cut -d/ -f2)_${CHANNEL}
+  HLTMODULE=${ERA::7}_$(echo $DATASET | cut -d/ -f2)_${CHANNEL}
 else
   HLTMODULE=$(echo $DATATYPE | cut -d_ -f1)
 fi
@@ -41,6 +41,12 @@ ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.ttbarDoubleLeptonCutFlow cutFlow_
 #ARGS="$ARGS -I TZWi.TopAnalysis.postprocessing.CopyBranch copyBranch"
 BRANCHSEL="$CMSSW_BASE/src/TZWi/NanoAODProduction/data/branchsel.txt"
 CMD="nano_postproc.py --bo $BRANCHSEL"
+## Number of processes splitting the input by entry ranges, set NWORKERS to the number of cores of the batch slot
+[ _$NWORKERS == _ ] && NWORKERS=1
+## Set PERF=1 to write the time per module, event latency and bytes read per branch to *_perf.json (see tzwi-perf-summary)
+PERFOPT=
+[ _$PERF == _1 ] && PERFOPT="--perf json,hist"
+[ $NWORKERS -gt 1 -o _$PERF == _1 ] && CMD="tzwi-postproc --batch 0 --workers $NWORKERS $PERFOPT --bo $BRANCHSEL"
 
 OUTPATH=ntuple/reco/$CHANNEL/$DATASET0
 [ ! -d $OUTPATH ] && mkdir -p $OUTPATH